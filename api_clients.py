@@ -0,0 +1,82 @@
+# === 모듈: api_clients.py ===
+# Gemini / OpenAI 클라이언트 공용 관리
+# - (provider, api_key, base_url) 당 클라이언트 1개만 생성해서 모든 스레드가 공유
+# - OpenAI: httpx 연결 풀(keep-alive)을 재사용해 영수증마다 TLS 핸드셰이크가 반복되지 않도록 함
+# - Gemini: SDK 공개 설정(http_options)으로 제한시간만 지정 (SDK 내부 메서드는 교체하지 않음)
+import os
+import weakref
+import asyncio
+import threading
+
+POOL_SIZE = 16  # provider/key 당 유지할 최대 연결 수 (워커 스레드 수 이상)
+REQUEST_TIMEOUT_SEC = float(os.getenv("RECEIPTS_REQUEST_TIMEOUT_SEC", "120"))  # API 요청 1회 제한시간
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # 이벤트 루프별 비동기 클라이언트
+_lock = threading.Lock()
+
+
+def get_gemini_client(api_key, base_url=None):
+    """api_key 별 공유 genai.Client
+    SDK 공개 설정(http_options)만 사용: base_url, 요청 제한시간(REQUEST_TIMEOUT_SEC).
+    재시도는 SDK 가 아니라 async_engine(RETRY_POLICIES)이 담당하므로 SDK 쪽에는 설정하지 않음"""
+    key = ("gemini", api_key, base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from google import genai
+
+            http_options = {"timeout": REQUEST_TIMEOUT_SEC}
+            if base_url:
+                http_options["base_url"] = base_url
+            client = genai.Client(api_key=api_key, http_options=http_options)
+            _clients[key] = client
+        return client
+
+
+def get_openai_client(api_key, base_url=None):
+    """api_key 별 공유 OpenAI 클라이언트 (httpx 연결 풀 사용, 스레드 안전)"""
+    key = ("openai", api_key, base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            from openai import OpenAI, DefaultHttpxClient
+
+            http_client = DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+            )
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            _clients[key] = client
+        return client
+
+
+def get_async_openai_client(api_key, base_url=None):
+    """현재 이벤트 루프에서 쓸 AsyncOpenAI 클라이언트
+    (httpx 비동기 연결 풀은 이벤트 루프에 묶이므로 루프마다 1개씩 생성)"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get((api_key, base_url))
+        if client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+            )
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            clients[(api_key, base_url)] = client
+        return client
+
+
+def close_all():
+    """공유 클라이언트 및 연결 정리 (프로그램 종료 시)"""
+    with _lock:
+        for (provider, _, _), client in _clients.items():
+            try:
+                if provider == "openai":
+                    client.close()
+            except Exception:
+                pass
+        _clients.clear()
@@ -0,0 +1,268 @@
+# === 모듈: api_metrics.py ===
+# API 호출별 토큰·지연시간 기록
+# - generate_content / chat.completions.create 를 감싸서 호출마다 입력·출력·이미지 토큰, 지연시간, 재시도, 모델 기록
+# - 호출 기록은 ~/.receipts-auto/api_metrics.jsonl 에 한 줄씩 추가 (배치가 끝나도 남음)
+# - 배치 요약(p50/p95 지연시간, 영수증당 토큰, 예상 비용)은 GUI 완료 화면과 엑셀 'API 사용량' 시트에 표시
+# - 응답 JSON 파싱 결과(정상/복구/실패)도 record_parse() 로 같은 파일에 {"event": "parse"} 줄로 기록 → 파싱 실패율
+import os
+import sys
+import json
+import time
+import threading
+
+import async_engine
+
+DEFAULT_METRICS_PATH = os.getenv(
+    "RECEIPTS_API_METRICS",
+    os.path.join(os.path.expanduser("~"), ".receipts-auto", "api_metrics.jsonl"),
+)
+
+# 모델별 1M 토큰당 가격 (USD, 입력/출력, 2025-07 공개 가격 기준 — 예상 비용 계산용)
+PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# 응답 JSON 파싱 결과 (receipt_schema 가 기록)
+PARSE_OK = "ok"              # json.loads 그대로 성공
+PARSE_REPAIRED = "repaired"  # json_repair 로 복구해서 사용
+PARSE_FAILED = "failed"      # JSON 을 찾지 못함 → 재시도
+PARSE_INVALID = "invalid"    # JSON 이지만 필드가 맞지 않거나 잘림 → 재시도
+
+SUMMARY_HEADER = ["항목", "값"]
+CALLS_HEADER = ["영수증", "단계", "모델", "입력 토큰", "이미지 토큰", "출력 토큰", "지연시간(초)", "재시도", "오류"]
+
+
+def estimate_cost(model, input_tokens, output_tokens):
+    """예상 비용(USD). 가격표에 없는 모델은 0"""
+    price_in, price_out = PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+
+def _gemini_usage(response):
+    """Gemini usage_metadata → (입력, 출력, 이미지) 토큰. SDK 버전에 따라 없는 필드는 0"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0, 0
+    image_tokens = 0
+    for detail in getattr(usage, "prompt_tokens_details", None) or ():
+        if "IMAGE" in str(getattr(detail, "modality", "")):
+            image_tokens += detail.token_count or 0
+    return usage.prompt_token_count or 0, usage.candidates_token_count or 0, image_tokens
+
+
+def _openai_usage(response):
+    """OpenAI usage → (입력, 출력, 이미지) 토큰. 이미지 토큰은 입력에 포함되어 따로 보고되지 않음"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0, 0
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, 0
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class APIMetrics:
+    """배치 단위 API 호출 기록 (스레드 안전). 호출마다 record() → 메모리 + JSONL 파일"""
+
+    def __init__(self, path=DEFAULT_METRICS_PATH):
+        self.path = None if path.lower() in ("off", "0", "none") else path
+        self._lock = threading.Lock()
+        self._file = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = []
+            self.parses = []
+
+    def record(self, model, stage, latency, usage=(0, 0, 0), error=None):
+        """호출 1건 기록. 영수증/재시도 횟수는 async_engine 이 작업마다 설정한 값 사용"""
+        input_tokens, output_tokens, image_tokens = usage
+        item = async_engine.current_item.get()
+        call = {
+            "ts": round(time.time(), 3),
+            "file": os.path.basename(str(item)) if item is not None else "",
+            "stage": stage,
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "image_tokens": image_tokens,
+            "latency": round(latency, 3),
+            "retry": async_engine.current_attempt.get(),
+            "error": error,
+        }
+        with self._lock:
+            self.calls.append(call)
+            self._write(call)
+
+    def record_parse(self, stage, outcome):
+        """응답 1건의 JSON 파싱 결과 기록 (PARSE_OK/REPAIRED/FAILED/INVALID)"""
+        item = async_engine.current_item.get()
+        parse = {
+            "ts": round(time.time(), 3),
+            "event": "parse",
+            "file": os.path.basename(str(item)) if item is not None else "",
+            "stage": stage,
+            "outcome": outcome,
+        }
+        with self._lock:
+            self.parses.append(parse)
+            self._write(parse)
+
+    def _write(self, call):
+        if self.path is None:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(call, ensure_ascii=False) + "\n")
+            self._file.flush()
+        except OSError as e:  # 기록 실패로 OCR 을 멈추지 않음
+            print(f"API 사용량 파일 기록 실패 (메모리에만 기록): {e}")
+            self.path = None
+
+    def summary(self):
+        """배치 요약 dict (호출이 없으면 None)"""
+        with self._lock:
+            calls = list(self.calls)
+            outcomes = [p["outcome"] for p in self.parses]
+        if not calls:
+            return None
+        ok = [c for c in calls if c["error"] is None]
+        latencies = sorted(c["latency"] for c in ok)
+        receipts = len({c["file"] for c in ok}) or 1
+        input_tokens = sum(c["input_tokens"] for c in ok)
+        output_tokens = sum(c["output_tokens"] for c in ok)
+        return {
+            "calls": len(calls),
+            "errors": len(calls) - len(ok),
+            "retries": sum(1 for c in calls if c["retry"]),
+            "receipts": receipts,
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "image_tokens": sum(c["image_tokens"] for c in ok),
+            "tokens_per_receipt": (input_tokens + output_tokens) / receipts,
+            "cost": sum(estimate_cost(c["model"], c["input_tokens"], c["output_tokens"]) for c in ok),
+            "parses": len(outcomes),
+            "parse_repaired": outcomes.count(PARSE_REPAIRED),
+            "parse_failed": outcomes.count(PARSE_FAILED) + outcomes.count(PARSE_INVALID),
+            "parse_failure_rate": ((outcomes.count(PARSE_FAILED) + outcomes.count(PARSE_INVALID)) / len(outcomes)
+                                   if outcomes else 0.0),
+        }
+
+    def summary_text(self):
+        """한 줄 요약 (콘솔/GUI 완료 화면)"""
+        s = self.summary()
+        if s is None:
+            return "API 사용량: 호출 없음 (모두 캐시/저널 사용)"
+        text = (
+            f"API 사용량: {s['calls']}회 호출, 지연시간 p50 {s['p50']:.1f}초 / p95 {s['p95']:.1f}초, "
+            f"영수증당 {s['tokens_per_receipt']:,.0f}토큰, 예상 비용 ${s['cost']:.3f}"
+        )
+        if s["parse_repaired"] or s["parse_failed"]:
+            text += (f", JSON 복구 {s['parse_repaired']}건 / 파싱 실패 {s['parse_failed']}건"
+                     f" ({s['parse_failure_rate']:.1%})")
+        return text
+
+    def sheet_sections(self):
+        """엑셀 'API 사용량' 시트용 [(제목, 헤더, 행 목록)] (호출이 없으면 빈 목록)"""
+        s = self.summary()
+        if s is None:
+            return []
+        with self._lock:
+            calls = list(self.calls)
+        summary_rows = [
+            ("API 호출", s["calls"]),
+            ("오류", s["errors"]),
+            ("재시도", s["retries"]),
+            ("영수증", s["receipts"]),
+            ("지연시간 p50(초)", round(s["p50"], 2)),
+            ("지연시간 p95(초)", round(s["p95"], 2)),
+            ("입력 토큰", s["input_tokens"]),
+            ("이미지 토큰", s["image_tokens"]),
+            ("출력 토큰", s["output_tokens"]),
+            ("영수증당 토큰", round(s["tokens_per_receipt"])),
+            ("예상 비용(USD)", round(s["cost"], 4)),
+            ("JSON 응답", s["parses"]),
+            ("JSON 복구", s["parse_repaired"]),
+            ("JSON 파싱 실패", s["parse_failed"]),
+            ("파싱 실패율(%)", round(s["parse_failure_rate"] * 100, 1)),
+        ]
+        call_rows = [
+            (c["file"], c["stage"], c["model"], c["input_tokens"], c["image_tokens"], c["output_tokens"],
+             c["latency"], c["retry"], c["error"] or "")
+            for c in calls
+        ]
+        return [("배치 요약", SUMMARY_HEADER, summary_rows), ("호출별 기록", CALLS_HEADER, call_rows)]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+batch = APIMetrics()
+
+
+def _timed(model, stage, call, usage_of):
+    start = time.perf_counter()
+    try:
+        response = call()
+    except Exception as e:
+        batch.record(model, stage, time.perf_counter() - start, error=type(e).__name__)
+        raise
+    batch.record(model, stage, time.perf_counter() - start, usage_of(response))
+    return response
+
+
+async def _timed_async(model, stage, call, usage_of):
+    start = time.perf_counter()
+    try:
+        response = await call()
+    except Exception as e:
+        batch.record(model, stage, time.perf_counter() - start, error=type(e).__name__)
+        raise
+    batch.record(model, stage, time.perf_counter() - start, usage_of(response))
+    return response
+
+
+def generate_content(client, stage, **request):
+    """client.models.generate_content + 기록"""
+    return _timed(request["model"], stage, lambda: client.models.generate_content(**request), _gemini_usage)
+
+
+async def generate_content_async(client, stage, **request):
+    """client.aio.models.generate_content + 기록"""
+    return await _timed_async(request["model"], stage, lambda: client.aio.models.generate_content(**request),
+                              _gemini_usage)
+
+
+def chat_completion(client, stage, **request):
+    """OpenAI client.chat.completions.create + 기록"""
+    return _timed(request["model"], stage, lambda: client.chat.completions.create(**request), _openai_usage)
+
+
+async def chat_completion_async(client, stage, **request):
+    """AsyncOpenAI client.chat.completions.create + 기록"""
+    return await _timed_async(request["model"], stage, lambda: client.chat.completions.create(**request),
+                              _openai_usage)
+
+
+if __name__ == "__main__":
+    # python api_metrics.py [metrics.jsonl]  → 파일 전체를 한 배치로 요약
+    metrics = APIMetrics("off")
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_METRICS_PATH
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    metrics.calls = [line for line in lines if "event" not in line]
+    metrics.parses = [line for line in lines if line.get("event") == "parse"]
+    print(metrics.summary_text())
@@ -0,0 +1,641 @@
+# === 모듈: async_engine.py ===
+# asyncio 기반 영수증 일괄 처리 엔진
+# - TokenBucket          : 분당 요청수(RPM) / 분당 토큰수(TPM) 제한
+# - AdaptiveConcurrency  : 지연시간·429 응답을 보고 동시 실행 수를 자동으로 늘리거나 줄임 (AIMD)
+# - CircuitBreaker       : 오류 비율이 급증하면 잠시 모든 호출을 멈춤
+# - run / run_batch      : 작업 목록을 위 제한 안에서 동시에 처리
+#                          (오류 종류별 재시도·지터 백오프, 영수증당 제한시간, 실패분은 마지막에 한 번 더 처리)
+# - run_pipeline         : 읽기 → 전처리 → API → 정리 → 기록 단계를 크기 제한 대기열로 연결해 겹쳐서 처리
+# - BatchControl         : 실행 중인 배치 중지·일시정지 (GUI 스레드 등에서 호출)
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from typing import NamedTuple
+
+import progress_events
+
+DEFAULT_RPM = int(os.getenv("RECEIPTS_RPM", "120"))
+DEFAULT_TPM = int(os.getenv("RECEIPTS_TPM", "0"))  # 0 = 토큰 제한 없음
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = int(os.getenv("RECEIPTS_MAX_CONCURRENCY", "16"))
+RECEIPT_DEADLINE_SEC = float(os.getenv("RECEIPTS_DEADLINE_SEC", "180"))  # 영수증 1장 재시도 포함 제한시간
+CANCEL_GRACE_SEC = float(os.getenv("RECEIPTS_CANCEL_GRACE_SEC", "10"))  # 중지 후 호출 중인 API 를 기다리는 시간
+
+# 작업(task)마다 따로 유지되는 현재 항목 / 재시도 횟수 (api_metrics 가 호출 기록에 사용)
+current_item = contextvars.ContextVar("current_item", default=None)
+current_attempt = contextvars.ContextVar("current_attempt", default=0)
+
+# 오류 종류
+RATE_LIMIT = "rate_limit"   # 429 / RESOURCE_EXHAUSTED
+SERVER = "server"           # 5xx, 시간 초과, 연결 오류
+PARSE = "parse"             # 응답 JSON 파싱 실패 (모델 출력 문제 → 다시 호출하면 대부분 성공)
+CLIENT = "client"           # 400/401/403/404 (잘못된 키·요청 → 재시도해도 같은 결과)
+OTHER = "other"             # 그 밖의 오류
+FAILOVER = "failover"       # 키 1개만 막힘, 다른 키로 바로 재시도 (key_pool, 서킷 브레이커·동시 실행 수에 반영 안 함)
+
+
+class RetryPolicy(NamedTuple):
+    """오류 종류별 재시도 정책 (대기시간 = base_delay * 2^n, 최대 max_delay, 지터 적용)"""
+    max_retries: int
+    base_delay: float
+    max_delay: float
+    requeue: bool       # 재시도를 다 써도 실패하면 배치 마지막 재시도 대기열에 넣을지
+
+
+RETRY_POLICIES = {
+    RATE_LIMIT: RetryPolicy(5, 1.0, 60.0, True),
+    SERVER: RetryPolicy(3, 1.0, 30.0, True),
+    PARSE: RetryPolicy(2, 0.0, 0.0, True),
+    CLIENT: RetryPolicy(0, 0.0, 0.0, False),
+    OTHER: RetryPolicy(0, 0.0, 0.0, True),
+    FAILOVER: RetryPolicy(5, 0.0, 0.0, True),
+}
+
+
+def is_rate_limit_error(exc):
+    """Gemini(ClientError.code) / OpenAI(RateLimitError.status_code) 429 여부"""
+    if getattr(exc, "code", None) == 429 or getattr(exc, "status_code", None) == 429:
+        return True
+    return "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def classify_error(exc):
+    """예외 → 오류 종류 (RETRY_POLICIES 의 키)"""
+    if getattr(exc, "failover", False):
+        return FAILOVER
+    if is_rate_limit_error(exc):
+        return RATE_LIMIT
+    if isinstance(exc, json.JSONDecodeError):
+        return PARSE
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if isinstance(status, int):
+        if status >= 500 or status == 408:
+            return SERVER
+        if 400 <= status < 500:
+            return CLIENT
+    # SDK 마다 예외 클래스가 달라 이름으로 판별 (httpx.ConnectError, openai.APITimeoutError, requests.ConnectionError 등)
+    name = type(exc).__name__
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)) or "Timeout" in name or "Connection" in name:
+        return SERVER
+    if "UNAVAILABLE" in str(exc) or "INTERNAL" in str(exc):
+        return SERVER
+    return OTHER
+
+
+def backoff_delay(policy, retry):
+    """retry번째 재시도 전 대기시간 (절반은 고정, 절반은 무작위 → 동시에 실패한 작업들이 한꺼번에 재시도하지 않음)"""
+    delay = min(policy.max_delay, policy.base_delay * 2 ** retry)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    """분당 요청수 / 분당 토큰수 토큰버킷. 모든 API 호출 직전에 acquire()"""
+
+    def __init__(self, requests_per_min=DEFAULT_RPM, tokens_per_min=DEFAULT_TPM):
+        self.requests_per_min = requests_per_min
+        self.tokens_per_min = tokens_per_min
+        self._requests = float(requests_per_min)
+        self._tokens = float(tokens_per_min)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = None
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_min, self._requests + elapsed * self.requests_per_min / 60)
+        if self.tokens_per_min:
+            self._tokens = min(self.tokens_per_min, self._tokens + elapsed * self.tokens_per_min / 60)
+
+    def _wait_time(self, requests, tokens):
+        """지금 바로 가져갈 수 있으면 0, 아니면 기다려야 할 초"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        tokens = min(tokens, self.tokens_per_min) if self.tokens_per_min else 0
+        missing_requests = requests - self._requests
+        missing_tokens = tokens - self._tokens if self.tokens_per_min else 0
+        if missing_requests <= 0 and missing_tokens <= 0:
+            self._requests -= requests
+            if self.tokens_per_min:
+                self._tokens -= tokens
+            return 0.0
+        wait = missing_requests * 60 / self.requests_per_min if missing_requests > 0 else 0.0
+        if missing_tokens > 0:
+            wait = max(wait, missing_tokens * 60 / self.tokens_per_min)
+        return wait
+
+    def ready_in(self, requests=1):
+        """지금 요청하면 기다려야 할 초 (가져가지는 않음 → 여러 키 중 고를 때 사용)"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        missing = requests - self._requests
+        return missing * 60 / self.requests_per_min if missing > 0 else 0.0
+
+    async def acquire(self, requests=1, tokens=0):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:  # 대기 순서대로(FIFO) 통과
+            while True:
+                wait = self._wait_time(requests, tokens)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """429 응답 후 일정 시간 모든 요청 중단"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """AIMD 방식 동시 실행 수 조절
+    - 지연시간이 기준(가장 빠른 평균)의 latency_factor 배 이내로 limit건 연속 성공 → +1
+    - 지연시간이 기준의 latency_factor 배 초과 → -1
+    - 429 → 절반으로"""
+
+    def __init__(self, initial=DEFAULT_CONCURRENCY, minimum=1, maximum=MAX_CONCURRENCY, latency_factor=2.0):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self._avg_latency = None
+        self._baseline = None
+        self._streak = 0
+        self._cond = None
+
+    async def acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self, latency=None, rate_limited=False):
+        async with self._cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self._on_rate_limit()
+            elif latency is not None:
+                self._on_success(latency)
+            self._cond.notify_all()
+
+    def _on_success(self, latency):
+        self._avg_latency = latency if self._avg_latency is None else 0.8 * self._avg_latency + 0.2 * latency
+        if self._baseline is None or self._avg_latency < self._baseline:
+            self._baseline = self._avg_latency
+        if self._avg_latency > self._baseline * self.latency_factor:
+            self.limit = max(self.minimum, self.limit - 1)
+            self._streak = 0
+            return
+        self._streak += 1
+        if self._streak >= self.limit:
+            self.limit = min(self.maximum, self.limit + 1)
+            self._streak = 0
+
+    def _on_rate_limit(self):
+        self.limit = max(self.minimum, self.limit // 2)
+        self._streak = 0
+
+
+class CircuitBreaker:
+    """최근 window건 중 오류 비율이 threshold 이상이면 cooldown초 동안 새 호출을 모두 멈춤 (open)
+    cooldown 이 지나면 1건만 시험 호출 (half-open) → 성공하면 정상, 실패하면 cooldown 을 2배로 늘려 다시 멈춤"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window=20, threshold=0.5, min_calls=8, cooldown=15.0, max_cooldown=240.0):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._probing = False
+
+    async def wait(self):
+        """호출 전에 대기. 시험 호출로 통과했으면 True (결과를 record(..., probe=True)로 알려야 함)"""
+        while True:
+            if self.state == self.CLOSED:
+                return False
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self._open_until:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            await asyncio.sleep(max(0.2, self._open_until - now))
+
+    def record(self, ok, probe=False):
+        if probe:
+            self._probing = False
+            if ok:
+                self.state = self.CLOSED
+                self._cooldown = self.base_cooldown
+                self._outcomes.clear()
+                print("API 응답 정상화, 처리 재개")
+            else:
+                self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+                self._open(time.monotonic())
+            return
+        if self.state != self.CLOSED:
+            return  # 멈추기 전에 시작된 호출의 결과는 판단에 쓰지 않음
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+            self._open(time.monotonic())
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._open_until = now + self._cooldown
+        print(f"API 오류가 많아 {self._cooldown:.0f}초 동안 요청을 멈춥니다")
+
+
+class BatchControl:
+    """실행 중인 배치의 중지·일시정지 (다른 스레드에서 호출해도 안전)
+    - pause() : 새 작업 시작을 멈춤 (API 호출 중인 것은 끝까지 진행), resume() 으로 재개
+    - cancel(): 아직 시작하지 않은 작업은 버리고, API 호출 중인 것은 CANCEL_GRACE_SEC 안에 끝나지 않으면 끊음
+      이미 끝난 결과는 그대로 기록 (저널에 없는 영수증은 다음 실행에서 이어서 처리)"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._on_cancel = []
+
+    def on_cancel(self, callback):
+        """중지할 때 바로 호출할 함수 등록 (저널 fsync 등, cancel() 을 부른 스레드에서 실행)"""
+        self._on_cancel.append(callback)
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # 일시정지 중이던 작업도 깨워서 정리
+        for callback in self._on_cancel:
+            try:
+                callback()
+            except Exception as e:  # 중지는 계속 진행
+                print(f"중지 처리 오류: {e}")
+
+    def pause(self):
+        if not self._cancelled.is_set():
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    async def proceed(self):
+        """일시정지 중이면 재개·중지될 때까지 기다림 → 계속 진행해도 되면 True, 중지됐으면 False"""
+        while not self._running.is_set():
+            await asyncio.sleep(0.2)
+        return not self._cancelled.is_set()
+
+
+# ===== 단계별 파이프라인 =====
+# 항목 → [앞 단계: 읽기·전처리 등] → API 단계(재시도·동시 실행 조절) → [뒤 단계: 정리 등] → 기록(1개)
+# 단계 사이는 크기가 정해진 대기열 → 뒤 단계가 밀리면 앞 단계가 기다림 (1만 장이어도 메모리 일정)
+PIPELINE_QUEUE = int(os.getenv("RECEIPTS_PIPELINE_QUEUE", "32"))  # 단계별 대기열 크기
+READ_WORKERS = int(os.getenv("RECEIPTS_READ_WORKERS", "4"))        # 디스크 읽기 단계 작업 수
+_END = object()  # 대기열 종료 표시
+
+
+class Stage(NamedTuple):
+    """파이프라인 단계: workers개의 작업이 func(item, value) 코루틴으로 앞 단계 결과를 처리
+    func 가 Skip(result)를 돌려주면 남은 단계(API 호출 포함)를 건너뛰고 바로 기록 (캐시 적중 등)"""
+    name: str
+    func: object
+    workers: int = 1
+
+
+class Skip(NamedTuple):
+    result: object
+
+
+class StageStats:
+    """단계 1개의 처리 수, 실패 수, 작업 시간 합계, 입력 대기열 깊이"""
+
+    def __init__(self, name, workers, queue):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.max_depth = 0
+
+    def observe(self):
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+
+class PipelineStats:
+    """단계별 대기열 깊이·처리량 (튜닝용). snapshot() 은 실행 중에도 호출 가능"""
+
+    def __init__(self):
+        self.stages = []
+        self.started = None
+        self.finished = None
+
+    def add(self, name, workers, queue_size):
+        stage = StageStats(name, workers, asyncio.Queue(queue_size))
+        self.stages.append(stage)
+        return stage
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def snapshot(self):
+        elapsed = self.elapsed() or 1e-9
+        return [{
+            "stage": s.name,
+            "workers": s.workers,
+            "processed": s.processed,
+            "failed": s.failed,
+            "queue": s.queue.qsize(),
+            "max_queue": s.max_depth,
+            "queue_size": s.queue.maxsize,
+            "per_sec": s.processed / elapsed,
+            "avg_sec": s.busy / s.processed if s.processed else 0.0,
+        } for s in self.stages]
+
+    def summary_text(self):
+        """단계별 한 줄 요약 (대기열이 자주 가득 차는 단계의 다음 단계가 병목)"""
+        lines = ["파이프라인 단계별 처리량:"]
+        for s in self.snapshot():
+            lines.append(f"  {s['stage']:<6} 작업 {s['workers']:>2}개, {s['processed']}건 ({s['per_sec']:.1f}건/초, "
+                         f"건당 {s['avg_sec']:.2f}초), 실패 {s['failed']}, "
+                         f"대기열 최대 {s['max_queue']}/{s['queue_size']}")
+        return "\n".join(lines)
+
+
+async def _pipeline(items, worker, stages, post_stages, limiter, concurrency, breaker, deadline, progress_callback,
+                    sink, stats, queue_size, tracker, control):
+    limiter = limiter or TokenBucket()
+    control = control or BatchControl()
+    tracker = tracker or progress_events.ProgressTracker()
+    concurrency = concurrency or AdaptiveConcurrency()
+    breaker = breaker or CircuitBreaker()
+    stats = stats if stats is not None else PipelineStats()
+    retry_queue = []
+    failed = []
+    dropped = []  # 중지로 처리하지 않은 항목
+    calls = set()  # API 호출 중인 작업 (중지 후 유예 시간이 지나면 끊음)
+    total = len(items)
+    attempts = [0] * total
+    done = 0
+
+    pre = [(stage.func, stats.add(stage.name, stage.workers, queue_size)) for stage in stages]
+    api = stats.add("API", concurrency.maximum, queue_size)
+    post = [(stage.func, stats.add(stage.name, stage.workers, queue_size)) for stage in post_stages]
+    writer = stats.add("기록", 1, queue_size)
+    steps = pre + [(None, api)] + post  # (func, StageStats), API 단계는 func 대신 handle
+    chain = [own for _, own in steps] + [writer]
+    gated = [own for _, own in pre]  # 중지하면 API 전 단계의 항목은 버림 (API 후 단계는 결과를 살려 기록)
+    stats.started = time.monotonic()
+
+    def finish(item, ok=True):
+        nonlocal done
+        done += 1
+        tracker.done(item, ok)
+        if progress_callback:
+            progress_callback(done, total)
+
+    def fail(item, reason):
+        print(f"영수증 처리 오류 {os.path.basename(str(item))}: {reason}")
+        failed.append(item)
+        finish(item, ok=False)
+
+    async def put(target, index, item, value):
+        if isinstance(value, Skip):
+            target, value = writer, value.result
+        await target.queue.put((index, item, value))
+        target.observe()
+
+    async def feed():
+        for index, item in enumerate(items):
+            if not await control.proceed():
+                dropped.extend(items[index:])
+                break
+            await put(chain[0], index, item, None)
+        await chain[0].queue.put(_END)
+
+    async def stage_loop(func, own, target):
+        while True:
+            entry = await own.queue.get()
+            if entry is _END:
+                own.queue.put_nowait(_END)  # 같은 단계의 다른 작업도 끝나도록
+                return
+            index, item, value = entry
+            if own in gated and not await control.proceed():
+                dropped.append(item)
+                continue
+            current_item.set(item)
+            start = time.monotonic()
+            try:
+                value = await func(item, value)
+            except Exception as e:  # 읽기·전처리·정리 오류는 재시도하지 않음 (저널에 없으므로 다음 실행에서 다시 처리)
+                own.failed += 1
+                fail(item, str(e) or type(e).__name__)
+                continue
+            finally:
+                own.busy += time.monotonic() - start
+            own.processed += 1
+            await put(target, index, item, value)
+
+    async def handle(index, item, value, target, final=False):
+        current_item.set(item)
+        name = os.path.basename(str(item))
+        until = time.monotonic() + deadline
+        retries = {}  # 오류 종류별 재시도 횟수
+        while True:
+            if not await control.proceed():
+                dropped.append(item)
+                return
+            current_attempt.set(attempts[index])
+            attempts[index] += 1
+            probe = await breaker.wait()
+            await concurrency.acquire()
+            if control.cancelled:  # 자리를 기다리는 동안 중지됨
+                breaker.record(True, probe)
+                await concurrency.release()
+                dropped.append(item)
+                return
+            tracker.set_in_flight(concurrency.in_flight)
+            start = time.monotonic()
+            call = asyncio.ensure_future(asyncio.wait_for(worker(item, value, limiter), max(0.001, until - start)))
+            calls.add(call)
+            try:
+                result = await call
+            except asyncio.CancelledError:
+                if not (control.cancelled and call.cancelled()):
+                    raise
+                # 중지 후 유예 시간 안에 끝나지 않아 끊은 호출
+                breaker.record(True, probe)
+                await concurrency.release()
+                tracker.set_in_flight(concurrency.in_flight)
+                print(f"중지로 API 호출 취소: {name}")
+                dropped.append(item)
+                return
+            except Exception as e:
+                kind = classify_error(e)
+                reason = str(e) or type(e).__name__  # 시간 초과 등은 메시지가 비어 있음
+                breaker.record(kind in (PARSE, FAILOVER), probe)  # 파싱 실패는 API 자체는 정상 응답
+                await concurrency.release(rate_limited=kind == RATE_LIMIT)
+                tracker.error()
+                tracker.set_in_flight(concurrency.in_flight)
+                policy = RETRY_POLICIES[kind]
+                retry = retries.get(kind, 0)
+                delay = backoff_delay(policy, retry)
+                if retry < policy.max_retries and time.monotonic() + delay < until:
+                    retries[kind] = retry + 1
+                    print(f"{kind} 오류, {delay:.1f}초 후 재시도 {retry + 1}/{policy.max_retries} "
+                          f"(동시 실행 {concurrency.limit}개): {name}: {reason}")
+                    if kind == RATE_LIMIT:
+                        limiter.pause(delay)
+                    else:
+                        await asyncio.sleep(delay)
+                    continue
+                if policy.requeue and not final:
+                    print(f"재시도 대기열에 추가 ({kind}): {name}: {reason}")
+                    retry_queue.append((index, item, value))
+                    return
+                api.failed += 1
+                fail(item, reason)
+                return
+            finally:
+                calls.discard(call)
+            latency = time.monotonic() - start
+            breaker.record(True, probe)
+            await concurrency.release(latency=latency)
+            tracker.set_in_flight(concurrency.in_flight)
+            api.processed += 1
+            api.busy += latency
+            await put(target, index, item, result)
+            return
+
+    async def api_loop(target):
+        while True:
+            entry = await api.queue.get()
+            if entry is _END:
+                api.queue.put_nowait(_END)
+                return
+            await handle(*entry, target)
+
+    async def run_stage(func, own, target):
+        if own is api:
+            await asyncio.gather(*(api_loop(target) for _ in range(own.workers)))
+            if retry_queue and control.cancelled:
+                dropped.extend(item for _, item, _ in retry_queue)
+            elif retry_queue:
+                print(f"재시도 대기열 {len(retry_queue)}장 다시 처리")
+                entries = sorted(retry_queue, key=lambda entry: entry[0])
+                retry_queue.clear()
+                await asyncio.gather(*(handle(*entry, target, final=True) for entry in entries))
+        else:
+            await asyncio.gather(*(stage_loop(func, own, target) for _ in range(own.workers)))
+        await target.queue.put(_END)  # 마지막 단계가 끝나야 기록 단계도 끝남 (건너뛴 항목 포함)
+
+    async def write_loop():
+        while True:
+            entry = await writer.queue.get()
+            if entry is _END:
+                return
+            index, item, result = entry
+            start = time.monotonic()
+            sink(index, item, result)
+            writer.busy += time.monotonic() - start
+            writer.processed += 1
+            finish(item)
+
+    async def watchdog():
+        while not control.cancelled:
+            await asyncio.sleep(0.2)
+        print(f"중지 요청: 대기 중인 영수증은 건너뛰고, 호출 중인 API 는 최대 {CANCEL_GRACE_SEC:.0f}초 기다립니다")
+        await asyncio.sleep(CANCEL_GRACE_SEC)
+        for call in list(calls):
+            call.cancel()
+
+    guard = asyncio.ensure_future(watchdog())
+    try:
+        await asyncio.gather(feed(), *(run_stage(func, own, chain[i + 1]) for i, (func, own) in enumerate(steps)),
+                             write_loop())
+    finally:
+        guard.cancel()
+    stats.finished = time.monotonic()
+    tracker.flush()
+    if dropped:
+        print(f"중지: {sum(progress_events.units(item) for item in dropped)}장은 처리하지 않음 "
+              f"(같은 폴더로 다시 실행하면 이어서 처리)")
+    if failed:
+        print(f"처리 실패 {len(failed)}장 (다음 실행에서 다시 처리): "
+              + ", ".join(os.path.basename(str(item)) for item in failed))
+    return stats
+
+
+async def run_pipeline_batch(items, worker, stages=(), post_stages=(), limiter=None, concurrency=None,
+                             progress_callback=None, on_result=None, breaker=None, deadline=RECEIPT_DEADLINE_SEC,
+                             stats=None, queue_size=PIPELINE_QUEUE, tracker=None, control=None):
+    """items → stages → API 단계 worker(item, value, limiter) → post_stages → on_result(item, result)
+    - 각 단계는 Stage.workers 개의 작업으로 동시에 처리, 단계 사이 대기열은 queue_size 까지 (역압)
+    - API 단계만 run_batch 와 같은 재시도·동시 실행 조절·서킷 브레이커·제한시간 적용
+    - 기록(on_result)은 작업 1개가 완료 순서대로 호출 (저널·색인 쓰기가 겹치지 않음)
+    - 결과는 모아 두지 않음 (on_result 가 받아서 저장) → PipelineStats 반환
+    - tracker(progress_events.ProgressTracker): 완료·처리 중·API 오류를 진행 이벤트로 전달
+    - control(BatchControl): 중지·일시정지 (중지해도 이미 끝난 결과는 on_result 로 기록)"""
+    return await _pipeline(items, worker, stages, post_stages, limiter, concurrency, breaker, deadline,
+                           progress_callback, lambda index, item, result: on_result and on_result(item, result),
+                           stats, queue_size, tracker, control)
+
+
+async def run_batch(items, worker, limiter=None, concurrency=None, progress_callback=None, on_result=None,
+                    breaker=None, deadline=RECEIPT_DEADLINE_SEC, stats=None, tracker=None, control=None):
+    """items 각각에 대해 worker(item, limiter) 코루틴 실행 → items 순서대로 결과 리스트 반환
+    - 오류는 종류별 RETRY_POLICIES 에 따라 백오프 후 재시도 (429는 동시 실행 수도 줄임)
+    - 영수증 1장은 재시도 포함 deadline 초 안에 끝내야 함
+    - 재시도를 다 쓴 영수증은 재시도 대기열에 넣었다가 배치 마지막에 한 번 더 처리
+    - 그래도 실패하면 출력 후 None (저널에 없으므로 다음 실행에서 다시 처리)
+    - progress_callback(완료수, 전체수)
+    - on_result(item, result): 성공한 항목이 끝날 때마다 바로 호출 (저널 기록 등)
+    단계를 나누지 않은 run_pipeline_batch (API 단계 + 기록)"""
+    results = [None] * len(items)
+
+    def sink(index, item, result):
+        results[index] = result
+        if on_result:
+            on_result(item, result)
+
+    await _pipeline(items, lambda item, _, limiter: worker(item, limiter), (), (), limiter, concurrency, breaker,
+                    deadline, progress_callback, sink, stats, PIPELINE_QUEUE, tracker, control)
+    return results
+
+
+def run(items, worker, limiter=None, concurrency=None, progress_callback=None, on_result=None, breaker=None,
+        deadline=RECEIPT_DEADLINE_SEC, stats=None, tracker=None, control=None):
+    """동기 코드(QThread 등)에서 호출하는 run_batch 래퍼"""
+    return asyncio.run(run_batch(items, worker, limiter, concurrency, progress_callback, on_result, breaker, deadline,
+                                 stats, tracker, control))
+
+
+def run_pipeline(items, worker, stages=(), post_stages=(), progress_callback=None, on_result=None, stats=None,
+                 **kwargs):
+    """동기 코드에서 호출하는 run_pipeline_batch 래퍼"""
+    return asyncio.run(run_pipeline_batch(items, worker, stages, post_stages, progress_callback=progress_callback,
+                                          on_result=on_result, stats=stats, **kwargs))
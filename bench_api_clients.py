@@ -0,0 +1,103 @@
+# === 벤치마크: 클라이언트 재사용 효과 ===
+# 로컬 스텁 HTTP 서버에 대해
+#   (1) 요청마다 새 클라이언트 생성 (기존 방식)
+#   (2) api_clients 공유 클라이언트 (연결 재사용)
+# 의 요청당 오버헤드와 새로 열린 TCP 연결 수를 비교
+# 실행: python bench_api_clients.py [요청수] [스레드수]
+# ※ 스텁은 평문 HTTP라 TLS 핸드셰이크 비용은 빠져 있음. 실제 API에서는 차이가 더 큼.
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import api_clients
+
+GEMINI_RESPONSE = json.dumps({
+    "candidates": [{"content": {"role": "model", "parts": [{"text": '{"a": "2025-07-22 15:06"}'}]}}],
+}).encode()
+OPENAI_RESPONSE = json.dumps({
+    "id": "stub", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "거래일시: 2025-07-22 15:06"}}],
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive 허용
+    disable_nagle_algorithm = True  # 헤더/본문 분할 전송 시 지연 ACK로 인한 왜곡 방지
+    connections = 0
+    counter_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler.counter_lock:
+            StubHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = OPENAI_RESPONSE if "chat/completions" in self.path else GEMINI_RESPONSE
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label, call, n_requests, n_threads):
+    StubHandler.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        list(executor.map(lambda _: call(), range(n_requests)))
+    elapsed = time.perf_counter() - start
+    per_req = elapsed / n_requests * 1000
+    print(f"{label:<28} {elapsed:7.2f}s  {per_req:7.2f} ms/req  새 연결 {StubHandler.connections}개")
+    return per_req
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    api_key = "AIza-bench"
+
+    from google import genai
+    from openai import OpenAI
+
+    def gemini_fresh():
+        client = genai.Client(api_key=api_key, http_options={"base_url": base_url})
+        client.models.generate_content(model="gemini-2.5-flash", contents=["ping"])
+
+    def gemini_shared():
+        client = api_clients.get_gemini_client(api_key, base_url=base_url)
+        client.models.generate_content(model="gemini-2.5-flash", contents=["ping"])
+
+    def openai_fresh():
+        with OpenAI(api_key="sk-bench", base_url=base_url + "v1") as client:
+            client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "ping"}])
+
+    def openai_shared():
+        client = api_clients.get_openai_client("sk-bench", base_url=base_url + "v1")
+        client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "ping"}])
+
+    print(f"요청 {n_requests}회, 스레드 {n_threads}개")
+    fresh = run("Gemini  요청마다 새 Client", gemini_fresh, n_requests, n_threads)
+    shared = run("Gemini  공유 Client", gemini_shared, n_requests, n_threads)
+    print(f"  → 요청당 {fresh - shared:.2f} ms 절약")
+    fresh = run("OpenAI  요청마다 새 Client", openai_fresh, n_requests, n_threads)
+    shared = run("OpenAI  공유 Client", openai_shared, n_requests, n_threads)
+    print(f"  → 요청당 {fresh - shared:.2f} ms 절약")
+
+    api_clients.close_all()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# === 벤치마크: 중복 사진 검출 (dHash 크기·반경) ===
+# 합성 영수증 N장 + 그중 40장을 축소·밝기 변경·JPEG 재압축한 재저장본으로
+#   - 해시 크기별: 서로 다른 영수증 사이 거리 vs 같은 사진(재저장본) 거리
+#   - 크기별 기본 반경(비트 수의 1/32)에서 재저장본 검출 수, BK-tree 검색당 비교 수·시간 vs 전체 비교
+# 실행: python bench_duplicate_images.py [장수]   (기본 300)
+import io
+import sys
+import time
+import random
+import statistics
+import tempfile
+import os
+
+from PIL import Image, ImageDraw
+
+import duplicate_images
+
+HASH_SIZES = (8, 16, 32)
+RESAVED = 40
+
+
+def synthetic_receipt(seed):
+    """어두운 배경 위 흰 종이 + 글자 줄 (실제 영수증처럼 대부분이 흰 여백)"""
+    r = random.Random(seed)
+    img = Image.new("L", (900, 1400), r.randint(60, 120))
+    draw = ImageDraw.Draw(img)
+    x0, y0 = r.randint(80, 200), r.randint(60, 200)
+    w, h = r.randint(450, 600), r.randint(800, 1100)
+    draw.rectangle([x0, y0, x0 + w, y0 + h], fill=r.randint(225, 250))
+    y = y0 + 30
+    while y < y0 + h - 30:
+        for i in range(r.randint(5, 35)):
+            cx = x0 + 20 + i * 14
+            if cx > x0 + w - 20:
+                break
+            if r.random() < 0.8:
+                draw.rectangle([cx, y, cx + 9, y + 14], fill=r.randint(0, 70))
+        y += r.randint(22, 40)
+    return img
+
+
+def resaved(img, seed):
+    """메신저 재전송처럼 축소·밝기 변경·저화질 JPEG 재압축"""
+    r = random.Random(seed)
+    out = img.resize((int(img.width * r.uniform(0.5, 0.9)), int(img.height * r.uniform(0.5, 0.9))))
+    gain, shift = r.uniform(0.9, 1.1), r.randint(-10, 10)
+    out = out.point(lambda p: min(255, max(0, int(p * gain + shift))))
+    buf = io.BytesIO()
+    out.save(buf, "JPEG", quality=r.randint(40, 80))
+    buf.seek(0)
+    return Image.open(buf).convert("L")
+
+
+class _CountingTree(duplicate_images.BKTree):
+    """find 가 계산한 해밍거리 수를 셈 (BK-tree 가 건너뛴 비교 확인용)"""
+
+    def find(self, key, radius):
+        hamming = duplicate_images.hamming
+        counted = [0]
+
+        def counting(a, b):
+            counted[0] += 1
+            return hamming(a, b)
+
+        duplicate_images.hamming = counting
+        try:
+            return super().find(key, radius), counted[0]
+        finally:
+            duplicate_images.hamming = hamming
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with tempfile.TemporaryDirectory() as tmp:
+        originals, copies = [], []
+        for i in range(count):
+            img = synthetic_receipt(i)
+            path = os.path.join(tmp, f"r{i}.jpg")
+            img.save(path, quality=90)
+            originals.append(path)
+            if i < RESAVED:
+                path = os.path.join(tmp, f"dup{i}.jpg")
+                resaved(img, i).save(path, quality=85)
+                copies.append(path)
+
+        print(f"합성 영수증 {count}장, 재저장본 {len(copies)}장")
+        print(f"{'해시':>7} {'다른 영수증 최소/1%/중앙':>22} {'같은 사진 최대/중앙':>18} {'반경':>5} {'검출':>7}"
+              f" {'검색당 비교':>10} {'BK-tree(ms)':>12} {'전체 비교(ms)':>13}")
+        for size in HASH_SIZES:
+            hashes = [duplicate_images.dhash(p, size) for p in originals]
+            copy_hashes = [duplicate_images.dhash(p, size) for p in copies]
+            sample = hashes[:60]
+            different = sorted(duplicate_images.hamming(a, b)
+                               for i, a in enumerate(sample) for b in sample[i + 1:])
+            same = [duplicate_images.hamming(hashes[i], h) for i, h in enumerate(copy_hashes)]
+            radius = size * size // 32
+
+            tree = _CountingTree()
+            for h, path in zip(hashes, originals):
+                tree.add(h, path)
+            found, compared = 0, 0
+            for i, h in enumerate(copy_hashes):
+                match, n = tree.find(h, radius)
+                compared += n
+                found += match is not None and match[1] == originals[i]
+
+            plain = duplicate_images.BKTree()
+            for h, path in zip(hashes, originals):
+                plain.add(h, path)
+            start = time.perf_counter()
+            for h in copy_hashes:
+                plain.find(h, radius)
+            tree_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for h in copy_hashes:
+                min(duplicate_images.hamming(h, other) for other in hashes)
+            linear_ms = (time.perf_counter() - start) * 1000
+
+            print(f"{size:>3}x{size:<3} {different[0]:>10}/{different[len(different) // 100]}/{statistics.median(different):g}"
+                  f" {max(same):>12}/{statistics.median(same):g} {radius:>5} {found:>4}/{len(copies)}"
+                  f" {compared / len(copies):>6.0f}/{count} {tree_ms:>12.2f} {linear_ms:>13.2f}")
+        print(f"(모듈 기본값: {duplicate_images.HASH_SIZE}x{duplicate_images.HASH_SIZE},"
+              f" 반경 {duplicate_images.DISTANCE})")
+
+
+if __name__ == "__main__":
+    main()
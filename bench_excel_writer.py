@@ -0,0 +1,73 @@
+# === 벤치마크: 엑셀 저장 (write_to_excel vs write_to_excel_fast) ===
+# 가짜 교통비 내역 N건을 템플릿에 저장하는 시간과 최대 메모리(RSS)를 비교
+# write_to_excel_fast 는 템플릿 기록 / write-only 경로를 각각 측정 (STREAMING_ROWS 를 정한 근거)
+# 측정마다 새 프로세스에서 실행해 최대 RSS가 서로 섞이지 않게 함
+# 실행: python bench_excel_writer.py [건수 ...]   (기본 100 1000 10000 100000)
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reciept_format", "영수증계산기.xlsx")
+# 이름 → (함수, 추가 인자): write_to_excel_fast 는 템플릿 기록 / write-only 를 따로 측정
+WRITERS = {
+    "write_to_excel": ("write_to_excel", {}),
+    "fast(템플릿)": ("write_to_excel_fast", {"streaming": False}),
+    "fast(write-only)": ("write_to_excel_fast", {"streaming": True}),
+}
+NAMES = ["홍길동", "김철수", "이영희", "박민수", "최지우"]
+
+
+def synthetic_rows(count):
+    details, summary = [], {}
+    for i in range(count):
+        name = NAMES[i % len(NAMES)]
+        amount = 1000 + (i * 137) % 30000
+        details.append([str(i + 1), f"2025-05-{i % 28 + 1:02d}", name, "출장",
+                        "서울역 - 강남역", f"{amount:,}원", ""])
+        summary[name] = summary.get(name, 0) + amount
+    return details, {name: f"{total:,}원" for name, total in summary.items()}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(writer_name, count):
+    """자식 프로세스: 한 가지 함수로 count건 저장 후 '초 MB' 출력"""
+    import excel_writer_250722
+    details, summary = synthetic_rows(count)
+    func_name, kwargs = WRITERS[writer_name]
+    writer = getattr(excel_writer_250722, func_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        writer(TEMPLATE_PATH, os.path.join(tmp, "out.xlsx"), details, summary, **kwargs)
+        elapsed = time.perf_counter() - start
+    print(f"{elapsed:.3f} {peak_rss_mb():.1f}")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_one(sys.argv[2], int(sys.argv[3]))
+        return
+    counts = [int(a) for a in sys.argv[1:]] or [100, 1000, 10000, 100000]
+    print(f"{'건수':>8}  {'함수':<22}{'시간(s)':>9}{'최대RSS(MB)':>13}")
+    for count in counts:
+        for writer_name in WRITERS:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", writer_name, str(count)],
+                                 capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f"{count:>8}  {writer_name:<22} 실패: {out.stderr.strip().splitlines()[-1:]}")
+                continue
+            elapsed, rss = out.stdout.split()[-2:]
+            print(f"{count:>8}  {writer_name:<22}{float(elapsed):>9.2f}{float(rss):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
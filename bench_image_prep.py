@@ -0,0 +1,80 @@
+# === 벤치마크: 이미지 전처리 효과 ===
+# 폴더의 영수증 이미지에 대해
+#   - 전처리 전/후 바이트, 장당 전처리 시간 (로컬)
+#   - --api 옵션 시: 원본 vs 전처리 이미지의 Gemini 1회 호출(single) 지연시간 비교
+# 실행: python bench_image_prep.py <이미지폴더> [--api] [--limit N]
+#       (--api 는 GEMINI_API_KEY 환경변수 필요, 캐시 사용 안 함)
+import os
+import sys
+import glob
+import time
+import statistics
+import importlib
+
+import image_prep
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.gif", "*.tiff")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print("사용법: python bench_image_prep.py <이미지폴더> [--api] [--limit N]")
+        return
+    limit = int(sys.argv[sys.argv.index("--limit") + 1]) if "--limit" in sys.argv else None
+    files = sorted(f for pattern in IMAGE_PATTERNS for f in glob.glob(os.path.join(args[0], pattern)))
+    if limit:
+        files = files[:limit]
+    if not files:
+        print("이미지 파일이 없습니다.")
+        return
+
+    print(f"설정: {image_prep.SETTINGS_KEY}")
+    originals, prepared, prep_times = [], [], []
+    for path in files:
+        with open(path, "rb") as f:
+            data = f.read()
+        start = time.perf_counter()
+        out = image_prep.prepare_image(data)
+        prep_times.append(time.perf_counter() - start)
+        originals.append(data)
+        prepared.append(out)
+
+    before = sum(len(d) for d in originals)
+    after = sum(len(d) for d in prepared)
+    print(f"{len(files)}장: {before / 1e6:.2f}MB → {after / 1e6:.2f}MB "
+          f"({100.0 * (before - after) / before:.0f}% 절약), "
+          f"전처리 장당 평균 {statistics.mean(prep_times) * 1000:.0f}ms")
+
+    if "--api" not in sys.argv:
+        return
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("--api 는 GEMINI_API_KEY 환경변수가 필요합니다.")
+        return
+
+    import api_clients
+    ocr = importlib.import_module("gemini_epc_demo-multi-gui")
+    client = api_clients.get_gemini_client(api_key)
+    latencies = {"원본": [], "전처리": []}
+    for raw, small in zip(originals, prepared):
+        for label, data in (("원본", raw), ("전처리", small)):
+            start = time.perf_counter()
+            try:
+                ocr._extract_single(client, data)
+            except Exception as e:
+                print(f"  [{label}] 오류: {e}")
+                continue
+            latencies[label].append(time.perf_counter() - start)
+
+    for label, values in latencies.items():
+        if values:
+            print(f"  {label:<4} API 지연시간 평균 {statistics.mean(values):.2f}s  "
+                  f"중앙값 {statistics.median(values):.2f}s")
+    if latencies["원본"] and latencies["전처리"]:
+        change = statistics.mean(latencies["전처리"]) - statistics.mean(latencies["원본"])
+        print(f"  → 영수증당 {change:+.2f}s")
+
+
+if __name__ == "__main__":
+    main()
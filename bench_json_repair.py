@@ -0,0 +1,78 @@
+# === 벤치마크: 모델 응답 JSON 관대한 파싱 (json_repair) ===
+# 실제로 받아 본 형식이 깨진 응답을 표로 두고
+#   - 표의 모든 응답이 기대값으로 파싱되는지 확인 (하나라도 틀리면 종료코드 1)
+#   - 호출 1회당 처리시간(µs) 측정 (정상 응답은 json.loads 그대로, 깨진 응답은 복구)
+# 실행: python bench_json_repair.py [반복수]
+import sys
+import json
+import time
+
+import json_repair
+
+FAIL = object()  # 복구할 수 없어야 하는 응답
+
+# (응답 원문, 기대값)
+CASES = [
+    ('{"a": "2025-07-22 15:06", "c": "12,700원"}', {"a": "2025-07-22 15:06", "c": "12,700원"}),
+    ('```json\n{"a": "2025-07-22", "b": "청원"}\n```', {"a": "2025-07-22", "b": "청원"}),
+    ('```\n{"d": "야근식대"}\n```', {"d": "야근식대"}),
+    ('다음은 추출 결과입니다.\n{"b": "GS25"}\n필요하면 말씀하세요.', {"b": "GS25"}),
+    ('{"a": "x", "b": "y",}', {"a": "x", "b": "y"}),                          # 후행 쉼표
+    ("{'d': '외근식대', 'e': ''}", {"d": "외근식대", "e": ""}),                  # 작은따옴표
+    ('{d: "외근식대", e: "홍길동"}', {"d": "외근식대", "e": "홍길동"}),            # 따옴표 없는 키
+    ('{"a": "x"\n "b": "y"}', {"a": "x", "b": "y"}),                          # 빠진 쉼표
+    ('{"a": "x", "b" "y"}', {"a": "x", "b": "y"}),                            # 빠진 콜론
+    ('{"c": 12,700, "d": "주간식대"}', {"c": 12700, "d": "주간식대"}),          # 천 단위 쉼표 숫자
+    ('{"c": 12700원}', {"c": "12700원"}),
+    ('{"e": None, "f": True}', {"e": None, "f": True}),
+    ('{"b": "맛집 "청원" 본점", "c": "9000"}', {"b": '맛집 "청원" 본점', "c": "9000"}),  # 문자열 안의 따옴표
+    ('{"f": "개인카드\n(손근영)"}', {"f": "개인카드\n(손근영)"}),                # 문자열 안의 줄바꿈
+    ('{"a": "x", // 메모\n "b": "y"}', {"a": "x", "b": "y"}),                 # 주석
+    ('{"a": "2025-07-22 15:06", "b": "청원", "c": "12,7', {"a": "2025-07-22 15:06", "b": "청원"}),  # 잘린 응답
+    ('{"a": "2025-07-22 15:06", "b": {"x": [1, 2', {"a": "2025-07-22 15:06", "b": {"x": [1, 2]}}),
+    ('[{"index": 0, "a": "x"}, {"index": 1, "a": "y"},]', [{"index": 0, "a": "x"}, {"index": 1, "a": "y"}]),
+    ('[{"index": 0, "a": "x"}, {"index": 1, "a": "y"', [{"index": 0, "a": "x"}, {"index": 1, "a": "y"}]),  # 잘린 묶음
+    ('[{"index": 0, "a": "x"}, {"index": 1, "a": "20', [{"index": 0, "a": "x"}, {"index": 1}]),
+    ('{"a": "\\uc815\\uc0c1"}', {"a": "정상"}),
+    ('{"a": "x"}]', {"a": "x"}),                                              # 괄호 짝 안 맞음
+    ("죄송합니다. 이미지를 읽을 수 없습니다.", FAIL),
+    ("", FAIL),
+]
+
+
+def check():
+    failures = 0
+    for raw, expected in CASES:
+        try:
+            got, _ = json_repair.loads(raw)
+        except json.JSONDecodeError:
+            got = FAIL
+        if got != expected:
+            failures += 1
+            print(f"  ✗ loads({raw!r}) = {'실패' if got is FAIL else repr(got)}, "
+                  f"기대값 {'실패' if expected is FAIL else repr(expected)}")
+    print(f"[JSON 복구 표] {len(CASES) - failures}/{len(CASES)} 일치")
+    return failures
+
+
+def bench(repeat):
+    print(f"\n[속도] {repeat}회 반복, 호출 1회당")
+    for label, raws in (("정상 응답", [raw for raw, _ in CASES[:1]]),
+                        ("깨진 응답", [raw for raw, expected in CASES[1:] if expected is not FAIL])):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for raw in raws:
+                json_repair.loads(raw)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<10} {elapsed / (repeat * len(raws)) * 1e6:.2f} µs")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    failures = check()
+    bench(repeat)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
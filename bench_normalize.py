@@ -0,0 +1,31 @@
+# === 벤치마크: 로컬 거래일시·금액 정규화 (receipt_normalize) ===
+# test_receipt_normalize.py 의 예시 표로 호출 1회당 처리시간(µs) 측정
+# (표의 기대값 확인은 python -m pytest test_receipt_normalize.py)
+# 실행: python bench_normalize.py [반복수]
+import sys
+import time
+
+import receipt_normalize
+from test_receipt_normalize import AMOUNT_CASES, DATETIME_CASES
+
+
+def bench(repeat):
+    print(f"[속도] {repeat}회 반복, 호출 1회당")
+    for function, cases in ((receipt_normalize.normalize_datetime, DATETIME_CASES),
+                            (receipt_normalize.normalize_amount, AMOUNT_CASES)):
+        raws = [raw for raw, _ in cases]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for raw in raws:
+                function(raw)
+        elapsed = time.perf_counter() - start
+        print(f"  {function.__name__:<20} {elapsed / (repeat * len(raws)) * 1e6:.2f} µs")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    bench(repeat)
+
+
+if __name__ == "__main__":
+    main()
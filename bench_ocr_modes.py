@@ -0,0 +1,111 @@
+# === 벤치마크: Gemini 2회 호출(two_pass) vs 1회 호출(single) ===
+# 텍스트결과/results_*.csv 에 저장된 파일명을 기준으로 두 모드를 실행하여
+#   - 영수증당 지연시간 (평균 / p50 / p95)
+#   - 필드별 일치율 (두 모드 간, 각 모드와 저장된 CSV 간)
+# 를 비교. 캐시는 사용하지 않음 (실제 API 호출).
+# 실행: python bench_ocr_modes.py <이미지폴더> [기준CSV]
+#       (GEMINI_API_KEY 환경변수 필요)
+import os
+import re
+import csv
+import sys
+import glob
+import time
+import statistics
+import importlib
+
+FIELDS = ["date", "purpose", "company", "price", "worker", "note"]
+
+
+def latest_sample_csv():
+    files = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "텍스트결과", "results_*.csv")))
+    return files[-1] if files else None
+
+
+def load_reference(csv_path):
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        return {row["filename"]: row for row in csv.DictReader(f)}
+
+
+def normalize(field, value):
+    value = str(value or "").strip()
+    if field == "price":
+        return re.sub(r"[^\d]", "", value)
+    return re.sub(r"\s+", "", value)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[idx]
+
+
+def run_mode(ocr, api_key, image_path, mode):
+    start = time.perf_counter()
+    try:
+        front_info, handwritten_info = ocr.extract_front_info_gemini(api_key, image_path, use_cache=False, mode=mode)
+        row = ocr.to_row(image_path, front_info, handwritten_info)
+    except Exception as e:
+        print(f"  [{mode}] 오류 {os.path.basename(image_path)}: {e}")
+        row = None
+    return time.perf_counter() - start, row
+
+
+def agreement(pairs):
+    """pairs: [(row_a, row_b)] → 필드별 일치율(%)"""
+    result = {}
+    for i, field in enumerate(FIELDS, start=1):
+        valid = [(a, b) for a, b in pairs if a is not None and b is not None]
+        same = sum(1 for a, b in valid if normalize(field, a[i]) == normalize(field, b[i]))
+        result[field] = 100.0 * same / len(valid) if valid else 0.0
+    return result
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("사용법: python bench_ocr_modes.py <이미지폴더> [기준CSV]")
+        return
+    image_dir = sys.argv[1]
+    csv_path = sys.argv[2] if len(sys.argv) > 2 else latest_sample_csv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key or not csv_path:
+        print("GEMINI_API_KEY 환경변수와 기준 CSV가 필요합니다.")
+        return
+
+    ocr = importlib.import_module("gemini_epc_demo-multi-gui")
+    reference = load_reference(csv_path)
+    images = [os.path.join(image_dir, name) for name in reference if os.path.exists(os.path.join(image_dir, name))]
+    print(f"기준 CSV: {csv_path}  (이미지 {len(images)}/{len(reference)}개 발견)")
+
+    latencies = {mode: [] for mode in ocr.IMAGE_MODES}
+    rows = {mode: [] for mode in ocr.IMAGE_MODES}
+    for image_path in images:
+        for mode in ocr.IMAGE_MODES:
+            elapsed, row = run_mode(ocr, api_key, image_path, mode)
+            latencies[mode].append(elapsed)
+            rows[mode].append(row)
+        print(f"  {os.path.basename(image_path)}: " +
+              ", ".join(f"{mode} {latencies[mode][-1]:.2f}s" for mode in ocr.IMAGE_MODES))
+
+    print("\n[지연시간] 영수증당 (초)")
+    for mode in ocr.IMAGE_MODES:
+        values = latencies[mode]
+        if values:
+            print(f"  {mode:<9} 평균 {statistics.mean(values):.2f}  p50 {percentile(values, 0.5):.2f}  p95 {percentile(values, 0.95):.2f}")
+
+    ref_rows = [[name] + [reference[name].get(field, "") for field in FIELDS]
+                for name in (os.path.basename(p) for p in images)]
+    comparisons = [("two_pass ↔ single", list(zip(rows["two_pass"], rows["single"])))]
+    comparisons += [(f"{mode} ↔ 기준CSV", list(zip(rows[mode], ref_rows))) for mode in ocr.IMAGE_MODES]
+
+    print("\n[필드 일치율] (%)")
+    print("  " + " " * 20 + "".join(f"{field:>9}" for field in FIELDS))
+    for label, pairs in comparisons:
+        result = agreement(pairs)
+        print(f"  {label:<20}" + "".join(f"{result[field]:9.1f}" for field in FIELDS))
+
+
+if __name__ == "__main__":
+    main()
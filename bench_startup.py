@@ -0,0 +1,92 @@
+# === 벤치마크: GUI 시작 시간 ===
+# - 첫 화면 표시까지 걸린 시간 (프로세스 실행 → 첫 paintEvent, 벽시계 기준)
+# - 앱 내부 단계: 모듈 import / 폰트 로드 / 첫 화면 / 백그라운드 미리 불러오기(모듈별)
+# - 소스 실행 시: python -X importtime 으로 최상위 모듈별 import 시간
+# 실행: python bench_startup.py [--exe dist\gui_250722.exe] [--runs 3]
+#       (화면 없는 서버에서는 QT_QPA_PLATFORM=offscreen 으로 실행)
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GUI_SCRIPT = os.path.join(HERE, "gui_250722.py")
+
+
+def launch(command):
+    """GUI 를 측정 모드로 한 번 실행 → 앱이 기록한 JSON + 첫 화면까지 벽시계 시간"""
+    fd, probe = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, RECEIPTS_STARTUP_PROBE=probe)
+    try:
+        started = time.time()
+        subprocess.run(command, env=env, cwd=HERE, timeout=120,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(probe, "r", encoding="utf-8") as f:
+            text = f.read()
+        if not text:
+            return None
+        result = json.loads(text)
+        result["time_to_first_paint"] = result["first_paint_wall"] - started
+        return result
+    finally:
+        os.remove(probe)
+
+
+def import_times():
+    """python -X importtime 결과 중 최상위 import (누적 시간 순)"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import gui_250722"],
+                         cwd=HERE, capture_output=True, text=True,
+                         env=dict(os.environ, QT_QPA_PLATFORM=os.getenv("QT_QPA_PLATFORM", "offscreen")))
+    rows, children = [], []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        ms = int(cumulative_us) / 1000
+        if depth == 1:  # 하위 모듈이 먼저 출력되고 부모(depth 0)가 마지막에 출력됨
+            children.append((ms, name.strip()))
+        elif depth == 0:
+            if name.strip() == "gui_250722":
+                rows = children + [(ms, "gui_250722 (전체)")]
+            children = []
+    return sorted(rows, reverse=True)
+
+
+def report(label, runs):
+    runs = [r for r in runs if r]
+    if not runs:
+        print(f"[{label}] 측정 실패 (창이 뜨지 않았거나 측정 모드 미지원 빌드)")
+        return
+    med = lambda key: statistics.median(r[key] for r in runs) * 1000
+    print(f"[{label}] {len(runs)}회 중앙값")
+    print(f"  첫 화면까지      {med('time_to_first_paint'):8.0f} ms  (프로세스 실행 기준)")
+    print(f"  모듈 import      {med('imports'):8.0f} ms")
+    print(f"  폰트 로드        {med('fonts'):8.0f} ms")
+    print(f"  첫 paintEvent    {med('first_paint'):8.0f} ms  (스크립트 시작 기준)")
+    print("  백그라운드 미리 불러오기 (첫 화면 이후):")
+    for name in runs[0]["preload"]:
+        value = statistics.median(r["preload"].get(name, 0) for r in runs) * 1000
+        print(f"    {name:<32}{value:8.0f} ms")
+
+
+def main():
+    runs = int(sys.argv[sys.argv.index("--runs") + 1]) if "--runs" in sys.argv else 3
+    exe = sys.argv[sys.argv.index("--exe") + 1] if "--exe" in sys.argv else None
+
+    report("소스", [launch([sys.executable, GUI_SCRIPT]) for _ in range(runs)])
+    print("\n  import 시간 (gui_250722 기준 최상위, 누적):")
+    for ms, name in import_times()[:12]:
+        print(f"    {name:<32}{ms:8.1f} ms")
+
+    if exe:
+        print()
+        report(f"EXE {os.path.basename(exe)}", [launch([os.path.abspath(exe)]) for _ in range(runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,9 @@ pyinstaller --noconfirm --onefile --windowed ^
     --add-data "insert_image;insert_image" ^
     --add-data "reciept_format;reciept_format" ^
     --hidden-import=gpt_receipt_ocr_250721 ^
-    --hidden-import=gemini_receipt_ocr_250722 ^
+    --hidden-import=gemini_epc_demo-multi-gui ^
+    --hidden-import=excel_writer_250722 ^
+    --hidden-import=receipts_cli ^
     --icon "insert_image/icon.png" ^
     gui_250722.py
 
@@ -0,0 +1,129 @@
+# === 모듈: duplicate_images.py ===
+# API 호출 전에 같은 영수증 사진(카카오톡 재전송, 다시 저장한 파일 등)을 로컬에서 찾아 1장만 OCR
+# - 이미지마다 dHash(가로 밝기 차이 32x32 = 1024비트) 계산 → 재압축·축소·약간의 밝기 차이에도 거의 같은 값
+#   (영수증끼리는 흰 종이 + 글자라 16x16 이하에서는 서로 다른 영수증도 거의 같은 해시가 됨)
+# - 대표 이미지의 해시만 BK-tree 에 넣고, 새 이미지는 해밍거리 DISTANCE 이내 대표가 있는지만 검색
+#   (전체 쌍 비교 O(n²) 없이 그룹화)
+# - 중복 이미지는 OCR 하지 않고, 대표 영수증 레코드의 비고에 "중복: 파일명" 으로 표시
+import os
+
+import image_prep
+
+ENABLED = os.getenv("RECEIPTS_DEDUP", "on").lower() not in ("off", "0", "false")
+# 1024비트를 쓰는 이유 (bench_duplicate_images.py, 합성 영수증 300장 + 재저장본 40장):
+#   8x8(64비트)   : 서로 다른 영수증 최소 거리 0 → 구분 불가
+#   16x16(256비트): 다른 영수증 최소 27 vs 같은 사진 최대 19 → 여유가 거의 없음
+#   32x32(1024비트): 다른 영수증 최소 149(중앙값 243) vs 같은 사진 최대 31(중앙값 13)
+HASH_SIZE = 32
+# 반경은 비트 수에 비례해 1/32 (1024비트 → 32, 64비트 해시의 2비트에 해당)
+# 재저장본 40/40 검출, 다른 영수증 최소 거리의 1/4 이하라 오검출 여유가 큼
+# (이전 기본값 20은 1024비트의 2%뿐이라 저화질 재저장본 일부를 놓침)
+# BK-tree 는 반경이 클수록 많이 내려가지만 검색당 대표 해시의 약 1/3만 비교
+DISTANCE = int(os.getenv("RECEIPTS_DEDUP_DISTANCE", str(HASH_SIZE * HASH_SIZE // 32)))
+
+
+def dhash(path, hash_size=HASH_SIZE):
+    """이미지 파일 → dHash 정수 (hash_size² 비트). 읽을 수 없으면 None"""
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(path) as img:
+            img.draft("L", (hash_size * 4, hash_size * 4))  # JPEG 는 축소 디코딩 (원본 전체를 풀지 않음)
+            img = ImageOps.exif_transpose(img).convert("L")
+            pixels = list(img.resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    except Exception:  # 읽을 수 없는 파일은 중복 검사 없이 그대로 OCR 로 넘김
+        return None
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """해밍거리 BK-tree. 노드: [해시, 값, {거리: 자식 노드}]"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, key, value):
+        if self.root is None:
+            self.root = [key, value, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(key, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [key, value, {}]
+                return
+            node = child
+
+    def find(self, key, radius):
+        """거리 radius 이내 (거리, 값) 중 가장 가까운 것 (없으면 None)
+        삼각부등식: 자식 중 |d - 간선거리| <= radius 인 가지만 내려감"""
+        best = None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(key, node[0])
+            if d <= radius and (best is None or d < best[0]):
+                best = (d, node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return best
+
+
+def _hash_all(paths):
+    """[(경로, 해시)] — 디코딩은 CPU 작업이라 image_prep 프로세스 풀에서 계산"""
+    try:
+        return list(zip(paths, image_prep.get_pool().map(dhash, paths, chunksize=8)))
+    except Exception as e:  # 프로세스 풀 생성 불가 환경 등
+        print(f"프로세스 풀 해시 실패, 현재 스레드에서 처리: {e}")
+        return [(path, dhash(path)) for path in paths]
+
+
+def split_duplicates(files, distance=None):
+    """files(처리 순서) → (대표 이미지 목록, {대표 경로: [중복 경로, ...]})
+    앞쪽 파일이 대표가 되고, 뒤에 나온 거의 같은 이미지는 그 대표에 묶임"""
+    if not ENABLED or len(files) < 2:
+        return list(files), {}
+    distance = DISTANCE if distance is None else distance
+    tree = BKTree()
+    representatives, duplicates, failed = [], {}, 0
+    for path, value in _hash_all(files):
+        if value is None:
+            failed += 1
+            representatives.append(path)
+            continue
+        match = tree.find(value, distance)
+        if match is not None:
+            duplicates.setdefault(match[1], []).append(path)
+            continue
+        tree.add(value, path)
+        representatives.append(path)
+    if failed:
+        print(f"이미지 해시 실패 {failed}장 (중복 검사 없이 처리)")
+    if duplicates:
+        count = sum(len(v) for v in duplicates.values())
+        print(f"중복 이미지 {count}장 발견 → OCR 생략 (대표 {len(duplicates)}장의 비고에 표시)")
+    return representatives, duplicates
+
+
+def mark_duplicates(records, duplicates):
+    """대표 이미지로 만든 레코드의 비고에 중복 파일명 추가 (합계에는 한 번만 포함)"""
+    if not duplicates:
+        return records
+    by_name = {os.path.basename(rep): dups for rep, dups in duplicates.items()}
+    for record in records:
+        dups = by_name.get(record.source)
+        if dups:
+            flag = "중복: " + ", ".join(os.path.basename(p) for p in dups)
+            record.note = f"{record.note} / {flag}" if record.note else flag
+    return records
@@ -1,6 +1,28 @@
 # === 모듈 2: excel_writer.py ===
 import os
-from openpyxl import load_workbook
+from copy import copy
+from datetime import date, datetime
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import NamedStyle
+from openpyxl.utils import get_column_letter
+
+import receipt_records
+
+DETAILS_SHEET = "교통비내역"
+SUMMARY_SHEET = "직원별 사용금액"
+SUMMARY_HEADER = ["적요", "직원명", "총합계"]
+BREAKDOWN_SHEET = "용도별·일자별 합계"
+DUPLICATES_SHEET = "중복 의심"
+METRICS_SHEET = "API 사용량"
+DUPLICATES_HEADER = ["영수증번호", "거래일시", "업체명", "금액", "기존 영수증", "기존 업체명", "기존 등록일", "업체명 유사도"]
+AMOUNT_FORMAT = "#,##0"
+DAY_FORMAT = "yyyy-mm-dd"
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm"
+TEMPLATE_DATA_ROW = 2        # 템플릿 교통비내역에서 데이터 행 서식을 가져올 행
+TEMPLATE_DETAIL_COLS = 7     # 영수증No ~ 비고
+STREAMING_ROWS = 50000       # 이보다 많으면 write-only 워크북으로 저장 (bench_excel_writer.py 기준)
 
 def read_text_files(output_text_folder):
     details_path = os.path.join(output_text_folder, "교통비내역.txt")
@@ -45,9 +67,341 @@ def write_to_excel(template_path, output_excel, details, summary):
 
     wb.save(output_excel)
 
-def generate_excel(output_text_folder, template_path, output_excel, progress_callback=None):
+# ✅ 서식을 맞춘 저장 (write_to_excel_fast): 건수에 따라 두 가지 경로
+# - STREAMING_ROWS 건 이하: 템플릿 워크북에 직접 기록 (정적 시트는 손대지 않음)
+#   양식 행은 값만 넣고, 양식보다 긴 부분만 템플릿 행 서식의 StyleArray 로 새 Cell 을 만들어 append
+# - 초과: write-only 워크북에 서식을 입힌 셀을 행마다 재사용해 기록 (메모리가 건수와 거의 무관)
+# - 교통비내역 양식 서식은 이름 있는 서식(NamedStyle)으로 한 번만 등록 (openpyxl 공개 API만 사용)
+# - bench_excel_writer.py 측정 (write_to_excel / 템플릿 기록 / write-only, 초):
+#     100건 0.13 / 0.13~0.18 / 0.36,  1천 0.34 / 0.28~0.34 / 0.53,  1만 1.25 / 1.66 / 2.11,
+#     5만 10.5 / 12.6 / 13.5,  10만 18.0 / 24.7 / 21.2 (최대 메모리 308 / 393 / 77MB)
+#   write_to_excel 은 양식 밖 행에 서식이 없고 집계 시트도 없어 1만 건 이상에서는 더 빠름
+#   (서식 있는 셀의 XML 기록 비용), 1천 건 이하에서는 차이가 측정 오차 수준
+DEFAULT_STYLE = "템플릿 기본"   # 서식 없는 셀: 템플릿 기본 글꼴(돋움)
+TEMPLATE_STYLE = "템플릿 서식 {}"
+
+
+class _TemplateStyles:
+    """템플릿 셀 서식 → 결과 워크북에 등록한 NamedStyle 이름 (같은 서식은 1번만 등록)"""
+
+    def __init__(self, wb, template):
+        self.wb = wb
+        self._names = {}
+        self._styles = {}
+        # 서식 없는 셀의 기본 글꼴을 템플릿과 맞춤 (새 Cell 의 글꼴 = 템플릿 워크북 기본 글꼴)
+        self._add(NamedStyle(name=DEFAULT_STYLE, font=copy(Cell(template.worksheets[0]).font)))
+
+    def _add(self, style):
+        self.wb.add_named_style(style)
+        self._styles[style.name] = style
+
+    def name(self, src):
+        if not src.has_style:
+            return DEFAULT_STYLE
+        name = self._names.get(src.style_id)
+        if name is None:
+            name = TEMPLATE_STYLE.format(len(self._names) + 1)
+            self._add(NamedStyle(
+                name=name, font=copy(src.font), border=copy(src.border), fill=copy(src.fill),
+                number_format=src.number_format, alignment=copy(src.alignment), protection=copy(src.protection),
+            ))
+            self._names[src.style_id] = name
+        return name
+
+    def array(self, src):
+        """src 서식의 StyleArray (Cell(style_array=...) 로 새 셀을 만들 때 이름 조회 없이 사용)"""
+        return self._styles[self.name(src)].as_tuple()
+
+
+def _clean(value):
+    return ILLEGAL_CHARACTERS_RE.sub("", value) if isinstance(value, str) else value
+
+
+def _cell(ws, value, style=DEFAULT_STYLE, number_format=None):
+    cell = WriteOnlyCell(ws, _clean(value))
+    cell.style = style
+    if number_format:
+        cell.number_format = number_format
+    return cell
+
+
+def _row(ws, values):
+    """값 목록 → 기본 서식 셀 목록 (WriteOnlyCell 은 그대로)"""
+    return [value if isinstance(value, Cell) else _cell(ws, value) for value in values]
+
+
+def _copy_sheet_layout(template_ws, ws, max_row=None):
+    """열 너비·행 높이·인쇄 설정 복사 (첫 append 전에 호출해야 적용됨)"""
+    for key, dim in template_ws.column_dimensions.items():
+        ws.column_dimensions[key].width = dim.width
+        ws.column_dimensions[key].hidden = dim.hidden
+    for idx, dim in template_ws.row_dimensions.items():
+        if max_row is None or idx <= max_row:
+            ws.row_dimensions[idx].height = dim.height
+    ws.sheet_format = copy(template_ws.sheet_format)
+    ws.page_setup = copy(template_ws.page_setup)
+    ws.page_margins = copy(template_ws.page_margins)
+    ws.print_options = copy(template_ws.print_options)
+
+
+def _copy_cell_style(src, dst):
+    dst.font = copy(src.font)
+    dst.border = copy(src.border)
+    dst.fill = copy(src.fill)
+    dst.number_format = src.number_format
+    dst.alignment = copy(src.alignment)
+    dst.protection = copy(src.protection)
+
+
+def _copy_static_sheet(template_ws, ws):
+    """값·수식·서식·병합까지 그대로 복사 (Sheet1, 교통비집계처럼 결과와 무관한 시트)
+    셀 수가 적으므로 서식은 셀마다 복사 (이름 있는 서식은 교통비내역 행 서식만 등록해 목록을 짧게 유지)"""
+    _copy_sheet_layout(template_ws, ws)
+    for rng in template_ws.merged_cells.ranges:
+        ws.merged_cells.add(str(rng))
+    if template_ws.print_area:
+        ws.print_area = template_ws.print_area
+    for row in template_ws.iter_rows():
+        out = []
+        for cell in row:
+            if not cell.has_style:
+                out.append(_cell(ws, cell.value) if cell.value is not None else None)
+                continue
+            new = WriteOnlyCell(ws, cell.value)
+            _copy_cell_style(cell, new)
+            out.append(new)
+        ws.append(out)
+
+
+def _details_layout(template_ws, details):
+    """(열 수, 템플릿 합계 행, 템플릿 마지막 양식 행, 결과 마지막 데이터 행)"""
+    ncols = max(TEMPLATE_DETAIL_COLS, max((len(r) for r in details), default=0))
+    total_row = template_ws.max_row
+    body_last = total_row - 1
+    # 건수가 템플릿 양식(2~41행)보다 적으면 빈 양식 행을 채워 기존과 같은 모양 유지
+    last_row = max(len(details) + 1, body_last)
+    return ncols, total_row, body_last, last_row
+
+
+def _template_row(row_idx, body_last, last_row):
+    """결과 row_idx 행에 입힐 템플릿 행 서식
+    양식 행은 테두리가 행마다 다르므로 같은 위치의 템플릿 행 서식을 쓰고,
+    양식보다 긴 부분은 중간 행 서식, 마지막 데이터 행은 템플릿 마지막 양식 행 서식 사용"""
+    if row_idx < body_last:
+        return row_idx
+    if row_idx == last_row:
+        return body_last
+    return max(TEMPLATE_DATA_ROW, body_last - 1)
+
+
+def _total_values(template_ws, ncols, total_row, last_row):
+    """합계 행: 템플릿 마지막 행(계 / =SUM)을 데이터 바로 아래로 옮기고 범위를 실제 행 수에 맞춤"""
+    totals = []
+    for col in range(1, ncols + 1):
+        value = template_ws.cell(row=total_row, column=col).value
+        if isinstance(value, str) and value.upper().startswith("=SUM("):
+            letter = get_column_letter(col)
+            value = f"=SUM({letter}2:{letter}{last_row})"
+        totals.append(value)
+    return totals
+
+
+def _set_details_format(template_ws, ws, last_row):
+    height = template_ws.row_dimensions[TEMPLATE_DATA_ROW].height
+    if height:  # 행마다 높이를 두지 않고 기본 행 높이로 지정
+        ws.sheet_format.defaultRowHeight = height
+        ws.sheet_format.customHeight = True
+    ws.print_area = f"A1:{get_column_letter(TEMPLATE_DETAIL_COLS)}{last_row + 1}"
+
+
+def _fill_details_sheet(ws, details, styles):
+    """교통비내역(템플릿 시트에 직접 기록): 양식 행은 값만 넣고,
+    양식보다 긴 부분과 옮긴 합계 행에만 템플릿 행 서식을 입힘
+    템플릿 합계 행 아래부터는 서식을 입힌 새 Cell 을 append (셀마다 NamedStyle 이름을 찾지 않음)"""
+    ncols, total_row, body_last, last_row = _details_layout(ws, details)
+    totals = _total_values(ws, ncols, total_row, last_row)
+    src_rows = (body_last - 1, body_last, total_row)
+    names = {r: [styles.name(ws.cell(row=r, column=col)) for col in range(1, ncols + 1)] for r in src_rows}
+    arrays = {r: [styles.array(ws.cell(row=r, column=col)) for col in range(1, ncols + 1)] for r in src_rows}
+    _set_details_format(ws, ws, last_row)
+
+    def put_row(row_idx, values, src_row):
+        values = list(values) + [None] * (ncols - len(values))
+        if row_idx > total_row:
+            ws.append([Cell(ws, value=_clean(value), style_array=array)
+                       for value, array in zip(values, arrays[src_row])])
+            return
+        for col, (value, name) in enumerate(zip(values, names[src_row]), 1):
+            ws.cell(row=row_idx, column=col, value=_clean(value)).style = name
+
+    for pos, values in enumerate(details):
+        row_idx = pos + TEMPLATE_DATA_ROW
+        if row_idx < body_last:
+            for col, value in enumerate(values, 1):
+                ws.cell(row=row_idx, column=col, value=_clean(value))
+        else:
+            put_row(row_idx, values, _template_row(row_idx, body_last, last_row))
+    if last_row > body_last:
+        put_row(last_row + 1, totals, total_row)
+
+
+def _write_details_sheet(template_ws, ws, details, styles):
+    """교통비내역(write-only): 템플릿 헤더 → 데이터 행(양식 행 서식) → 합계 행 순서로 append"""
+    ncols, total_row, body_last, last_row = _details_layout(template_ws, details)
+    _copy_sheet_layout(template_ws, ws, max_row=1)
+    _set_details_format(template_ws, ws, last_row)
+
+    def row_cells(src_row):
+        """템플릿 행 서식을 입힌 빈 셀 목록 (값만 바꿔 가며 여러 행에 재사용)"""
+        return [_cell(ws, None, styles.name(template_ws.cell(row=src_row, column=col))) for col in range(1, ncols + 1)]
+
+    def append_values(cells, values):
+        # write-only 시트는 append 할 때 행을 바로 기록하므로 같은 셀 객체에 다음 행 값을 넣어도 됨
+        for cell, value in zip(cells, values):
+            cell.value = _clean(value)
+        ws.append(cells)
+
+    header = row_cells(1)
+    append_values(header, [template_ws.cell(row=1, column=col).value for col in range(1, ncols + 1)])
+
+    cells_by_row = {src_row: row_cells(src_row) for src_row in {*range(TEMPLATE_DATA_ROW, body_last + 1), total_row}}
+    blank = [None] * ncols
+    for row_idx in range(TEMPLATE_DATA_ROW, last_row + 1):
+        pos = row_idx - TEMPLATE_DATA_ROW
+        values = details[pos] if pos < len(details) else blank
+        append_values(cells_by_row[_template_row(row_idx, body_last, last_row)],
+                      list(values) + [None] * (ncols - len(values)))
+    append_values(cells_by_row[total_row], _total_values(template_ws, ncols, total_row, last_row))
+
+
+def _amount_cell(ws, value):
+    return _cell(ws, value, number_format=AMOUNT_FORMAT if isinstance(value, int) else None)
+
+
+def _write_summary_sheet(ws, summary):
+    ws.append(_row(ws, SUMMARY_HEADER))
+    for name, total in summary.items():
+        ws.append(_row(ws, ["교통비", name, _amount_cell(ws, total)]))
+
+
+def _write_breakdown_sheet(ws, breakdowns):
+    """breakdowns: [(제목, 헤더, [(키, 금액), ...])] → 표를 한 칸씩 띄워 세로로 나열"""
+    ws.column_dimensions["A"].width = 14
+    ws.column_dimensions["B"].width = 14
+    for i, (title, header, rows) in enumerate(breakdowns):
+        if i:
+            ws.append([])
+        ws.append(_row(ws, [title]))
+        ws.append(_row(ws, header))
+        for key, total in rows:
+            if isinstance(key, date):
+                key = _cell(ws, key, number_format=DAY_FORMAT)
+            ws.append(_row(ws, [key, _amount_cell(ws, total)]))
+
+
+def _write_duplicates_sheet(ws, suspects):
+    """suspects: DUPLICATES_HEADER 순서의 행 목록 (거래일시·등록일은 datetime, 금액은 int)"""
+    for col, width in zip("ABCDEFGH", (22, 17, 18, 11, 22, 18, 17, 12)):
+        ws.column_dimensions[col].width = width
+    ws.append(_row(ws, DUPLICATES_HEADER))
+    for row in suspects:
+        cells = []
+        for value in row:
+            if isinstance(value, datetime):
+                value = _cell(ws, value, number_format=DATETIME_FORMAT)
+            elif isinstance(value, int):
+                value = _amount_cell(ws, value)
+            cells.append(value)
+        ws.append(_row(ws, cells))
+
+
+def _write_metrics_sheet(ws, sections):
+    """sections: api_metrics.APIMetrics.sheet_sections() → [(제목, 헤더, 행 목록)] 을 세로로 나열"""
+    for col, width in zip("ABCDEFGHI", (22, 12, 18, 11, 11, 11, 12, 8, 16)):
+        ws.column_dimensions[col].width = width
+    for i, (title, header, rows) in enumerate(sections):
+        if i:
+            ws.append([])
+        ws.append(_row(ws, [title]))
+        ws.append(_row(ws, header))
+        for row in rows:
+            ws.append(_row(ws, [_amount_cell(ws, value) if isinstance(value, int) else value for value in row]))
+
+
+def _write_streaming(template, details, summary, styles):
+    """write-only 워크북에 템플릿 시트를 순서대로 다시 기록 (정적 시트는 값·서식 복사)"""
+    wb = styles.wb
+    for template_ws in template.worksheets:
+        ws = wb.create_sheet(template_ws.title)
+        if template_ws.title == DETAILS_SHEET:
+            _write_details_sheet(template_ws, ws, details, styles)
+        elif template_ws.title == SUMMARY_SHEET:
+            _copy_sheet_layout(template_ws, ws)
+            _write_summary_sheet(ws, summary)
+        else:
+            _copy_static_sheet(template_ws, ws)
+
+
+def write_to_excel_fast(template_path, output_excel, details, summary, breakdowns=None, suspects=None,
+                        metrics=None, streaming=None):
+    """write_to_excel 과 같은 내용 + 집계 시트를 서식을 맞춰 기록
+    - 교통비내역: 템플릿 헤더/양식 행/합계 행 서식 그대로, 건수가 많으면 합계 행을 아래로 이동
+    - 직원별 사용금액: 헤더 + 요약 append
+    - 그 밖의 시트: 템플릿 그대로 (교통비집계의 '직원별 사용금액' 참조 수식 유지)
+    - breakdowns 가 있으면 용도별·일자별 합계 시트 추가
+    - suspects 가 있으면 중복 의심 시트 추가
+    - metrics 가 있으면 API 사용량 시트 추가
+    streaming: True 면 write-only 워크북으로 저장 (None 이면 STREAMING_ROWS 건 초과일 때만)"""
+    if streaming is None:
+        streaming = len(details) > STREAMING_ROWS
+    template = load_workbook(template_path)
+    if streaming:
+        wb = Workbook(write_only=True)
+        styles = _TemplateStyles(wb, template)
+        _write_streaming(template, details, summary, styles)
+    else:
+        wb = template
+        styles = _TemplateStyles(wb, template)
+        if DETAILS_SHEET in wb.sheetnames:
+            _fill_details_sheet(wb[DETAILS_SHEET], details, styles)
+        if SUMMARY_SHEET in wb.sheetnames:
+            _write_summary_sheet(wb[SUMMARY_SHEET], summary)
+
+    if SUMMARY_SHEET not in template.sheetnames:
+        _write_summary_sheet(wb.create_sheet(SUMMARY_SHEET), summary)
+    if breakdowns:
+        _write_breakdown_sheet(wb.create_sheet(BREAKDOWN_SHEET), breakdowns)
+    if suspects:
+        _write_duplicates_sheet(wb.create_sheet(DUPLICATES_SHEET), suspects)
+    if metrics:
+        _write_metrics_sheet(wb.create_sheet(METRICS_SHEET), metrics)
+
+    wb.save(output_excel)
+
+
+def generate_excel(records, template_path, output_excel, progress_callback=None, metrics=None):
+    """records: OCR 모듈 process_receipts 가 반환한 Receipt 리스트
+    (텍스트 결과 폴더 경로를 주면 이전 버전의 교통비내역.txt 를 읽어서 사용)
+    직원별 사용금액 / 용도별·일자별 합계는 ReceiptBatch 로 한 번에 집계
+    duplicate_of 가 있는 영수증은 중복 의심 시트에 따로 나열
+    metrics: api_metrics.batch.sheet_sections() (배치 API 사용량 → API 사용량 시트)"""
     if progress_callback: progress_callback(75)  # Excel 시작
-    details, summary = read_text_files(output_text_folder)
-    write_to_excel(template_path, output_excel, details, summary)
+    if isinstance(records, str):
+        records = receipt_records.read_text_files(records)
+    totals = receipt_records.ReceiptBatch(records).totals()
+    details = [record.detail_row() for record in records]
+    breakdowns = [
+        ("용도별 합계", ["용도", "금액"], [(p.value, total) for p, total in totals.purpose.items()]),
+        ("일자별 합계", ["일자", "금액"], sorted(totals.day.items())),
+    ]
+    # 같은 거래로 의심되는 영수증 (transaction_index 에서 일시·금액·업체명이 겹친 건)
+    suspects = []
+    for record in records:
+        match = record.duplicate_of
+        if match is not None:
+            suspects.append([record.receipt_no, record.when or record.date_text, record.route,
+                             record.amount if record.amount is not None else record.amount_text,
+                             match.file, match.merchant, match.added, f"{match.similarity:.0%}"])
+    write_to_excel_fast(template_path, output_excel, details, totals.employee, breakdowns, suspects, metrics)
     if progress_callback: progress_callback(100)  # Excel 완료
-    return True
\ No newline at end of file
+    return True
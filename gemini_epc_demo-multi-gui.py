@@ -1,171 +1,445 @@
-from google import genai
 from google.genai import types
 import os
-import re
 import json # json 파싱을 위해 추가
-import csv
 import glob
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
+import time
+import math
+import asyncio
+from collections import Counter
+
+import api_clients
+import api_metrics
+import async_engine
+import duplicate_images
+import image_prep
+import key_pool
+import ocr_backends
+import ocr_cache
+import progress_events
+import receipt_normalize
+import receipt_records
+import receipt_schema
+import results_journal
+import transaction_index
 
 def convert_date_format(date_str):
-    """YYYY-MM-DD HH:MM 형태를 `(MM/DD)` 형태로 변환"""
+    """거래일시(YYYY-MM-DD HH:MM 또는 영수증 원문)를 `(MM/DD)` 형태로 변환"""
     if not date_str or date_str.strip() == "":
         return ""
-    
-    try:
-        # YYYY-MM-DD HH:MM 형태에서 MM/DD 추출
-        # 정규식으로 YYYY-MM-DD 패턴 찾기
-        match = re.match(r'(\d{4})-(\d{2})-(\d{2})', date_str)
-        if match:
-            year, month, day = match.groups()
-            return f"({month}/{day})"
-        else:
-            return date_str  # 변환 실패시 원본 반환
-    except Exception:
-        return date_str  # 오류시 원본 반환
 
-def extract_front_info_gemini(api_key, image_path: str) -> dict:
-    client = genai.Client(api_key=api_key)
-    with open(image_path, "rb") as f:
-        image_bytes = f.read()
+    parts = receipt_normalize.parse_datetime_parts(date_str)
+    if parts is None:
+        return date_str  # 변환 실패시 원본 반환
+    return f"({parts[1]:02d}/{parts[2]:02d})"
+
+MODEL_NAME = "gemini-2.5-flash"
+
+# 2회 호출 프롬프트 (OpenAI 키로 넘어간 요청도 같은 문구 사용, receipt_schema)
+FRONT_PROMPT = receipt_schema.FRONT_PROMPT
+
+# 손글씨 프롬프트 템플릿 (front_info, card_info 를 format으로 채움)
+HANDWRITTEN_PROMPT_TEMPLATE = receipt_schema.HANDWRITTEN_PROMPT
+
+# 2회 호출 모드도 response_schema 로 JSON 형식 강제 (RECEIPTS_RESPONSE_SCHEMA=off 면 프롬프트의 JSON 예시만)
+FRONT_SCHEMA = receipt_schema.gemini_schema(receipt_schema.FrontFields)
+HANDWRITTEN_SCHEMA = receipt_schema.gemini_schema(receipt_schema.HandwrittenFields)
+
+def _json_config(schema):
+    if not receipt_schema.ENABLED:
+        return None
+    return types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+
+# 프롬프트/모델/스키마가 바뀌면 해시가 달라져 기존 캐시는 자동으로 사용되지 않음
+PROMPT_HASH = ocr_cache.prompt_hash(
+    MODEL_NAME, FRONT_PROMPT, HANDWRITTEN_PROMPT_TEMPLATE, image_prep.SETTINGS_KEY,
+    *((FRONT_SCHEMA.model_dump_json(), HANDWRITTEN_SCHEMA.model_dump_json()) if receipt_schema.ENABLED else ()),
+)
+
+# ===== 1회 호출 모드 =====
+# 프린트 정보(a/b/c/h/i)와 손글씨 정보(d/e/f)를 response_schema 하나로 한 번에 추출
+# - "two_pass": 기존 방식 (프린트 → 손글씨 2회 호출)
+# - "single"  : 1회 호출 (지연시간/토큰/업로드 절반)
+# - "packed"  : 영수증 여러 장을 1회 호출로 (배치 전용, 아래 '여러 장 묶음 호출 모드' 참고)
+IMAGE_MODES = ("two_pass", "single")   # 영수증 1장 단위 호출 방식
+PACKED = "packed"
+OCR_MODES = IMAGE_MODES + (PACKED,)
+OCR_MODE = os.getenv("RECEIPTS_OCR_MODE", "two_pass")
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
+FRONT_FIELDS = ("a", "b", "c", "h", "i")
+HANDWRITTEN_FIELDS = ("d", "e", "f")
+
+SINGLE_PROMPT = receipt_schema.FIELDS_PROMPT
+
+RECEIPT_SCHEMA = receipt_schema.gemini_schema(receipt_schema.ReceiptFields)
+
+SINGLE_PROMPT_HASH = ocr_cache.prompt_hash(
+    MODEL_NAME, SINGLE_PROMPT, RECEIPT_SCHEMA.model_dump_json(), image_prep.SETTINGS_KEY
+)
+
+def _parse_json_response(response, model, stage):
+    """응답 → model 필드 dict (코드블록·설명문·깨진 JSON 은 json_repair 로 복구,
+    복구할 수 없으면 json.JSONDecodeError → async_engine 이 파싱 오류로 재시도)"""
+    return receipt_schema.parse_fields(response.text, model, stage)
+
+# TokenBucket(TPM) 예산용 토큰 추정치: 이미지 1장(768px 타일 4개 기준) + 프롬프트 + 응답
+EST_IMAGE_TOKENS = 1032
+EST_OUTPUT_TOKENS = 300
+
+def _estimate_tokens(prompt):
+    return EST_IMAGE_TOKENS + len(prompt) + EST_OUTPUT_TOKENS
+
+def _image_part(image_bytes):
+    # 실제 파일 형식에 맞는 MIME (PNG를 image/jpeg로 보내지 않도록)
+    return types.Part.from_bytes(data=image_bytes, mime_type=image_prep.detect_mime(image_bytes))
+
+def _front_request(image_bytes):
+    return dict(
+        model=MODEL_NAME,
         contents=[
-            types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-            (
-                """
-                영수증에 최상단에는 hand-written 손글씨로 여러 정보가 있습니다.당신은 손글씨를 무시하고, 출력된 영수증에서만 여러 정보를 추출해야합니다.
-                a) 날짜 및 시간 (YYYY-MM-DD HH:MM)
-                b) 업체명
-                c) 금액 (integer)
-                h) 결제카드 정보
-
-                ## a) 날짜 및 시간
-                - 출력 형식은 반드시 YYYY-MM-DD HH:MM 이어야 합니다.  
-                - 초 단위(SS)는 무시하고, 분까지만 표시하세요.  
-                - 시간이 누락되었다면 **추출하지 않고 빈 문자열**("")로 남겨주세요.
-
-                아래 예시를 참고하세요
-
-                ### 예시 맵핑
-                "승인일시 2025-07-22 18:34:23"          → "2025-07-22 18:34"  
-                "거래일시:25-07-22(화) 15:06:04"        → "2025-07-22 15:06"  
-                "2025/07/17 15:26:23"                → "2025-07-17 15:26"  
-                "[일시] 2025/07/14 11:43"             → "2025-07-14 11:43"  
-                "발행일시: 2025-07-16 12:45:47"       → "2025-07-16 12:45"  
-                "[등록] 2025-07-24 13:56"            → "2025-07-24 13:56"  
-                "2025-07-23 22:21:51"                → "2025-07-23 22:21"
-
-                ## b) 업체명
-                - 영수증에 프린트되어있는 업체명(가맹점 등)을 추출해주세요. 최상단 손글씨를 보지 마세요.
-                - 업체명은 [날짜 및 시간] 근처에 있습니다. 예를 들어 2025-07-22 15:06 근처에 있습니다.
-                - '엔에이치엔케이씨피 주식회사', '양상관' 은 업체명이 아닙니다.
-                - 실제 사용처인 식당 등 가게이름으로 추출하세요.
-                ex) 청원, 남원전통추어탕, 탐앤탐스, 오토김밥, GS25 등
-
-                ## c) 금액 (integer)
-                - 금액을 integer로 숫자만 추출해주세요
-                
-                ## h) 결제카드 정보
-                - 영수증의 카드정보를 불러오세요. 카드회사명과 카드소유주 이름, 카드번호를 추출하세요.
-                - ex)신한카드법인 451844*** 등입니다.
-
-                ## i) 결제주소 정보
-                - 영수증의 결제된 장소의 주소 정보를 불러오세요.
-                - ex)서울시 영등포구 버드나루로19길 6 등입니다.
-                
-                다음 JSON 형식으로 정확히 반환해주세요:
-                {"a": "...", "b": "...", "c": "...(integer)", "h": "...", "i": "..."}
-                """
-            ),
+            _image_part(image_bytes),
+            FRONT_PROMPT,
         ],
+        config=_json_config(FRONT_SCHEMA),
     )
-    raw = response.text.strip()
-    # 코드블록 백틱이 있을 경우 제거
-    if raw.startswith("```"):
-        raw = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw, flags=re.DOTALL).strip()
-    front_info = json.loads(raw)   # {'date': '2024-07-25 14:05', 'price': '7,500원'}
-
-    input_text = f"""영수증에 최상단에는 hand-written 손글씨로 여러 정보가 있습니다. 당신은 손글씨에서 정보를 추출해야합니다. 
-                프린터로 출력되어있는 영수증의 내용을 참고하여 d), f)를 작성하세요. 영수증의 내용은 {front_info} 입니다.
-                
-                ## 추출해야할 3가지 정보
-                - d) 용도구분 (외근식대, 야근식대, 유류대, 통행료, 주간식대, 교통비, 숙박비, 회식비, 부서간식대 중 1개)
-                - e) 야근자 (사람이름) - d)가 "야근식대"인경우만 작성해주세요. 야근식대가 아니면 없습니다.
-                - f) 비고 (법인카드 혹은 개인카드)
-
-                ## d) 용도구분 
-                - 외근식대, 야근식대, 유류대, 통행료, 주간식대, 교통비, 숙박비, 회식비, 부서간식대 중 1개입니다. 만약 본인이 분류할수 없다고 판단이 된다면(그럴일은 적겠지만) 손글씨 씌여진대로 작성하세요. 
-                - 영수증 최상단에 한글 손글씨로 써있습니다.
-                - 프린트된 영수증의 내용 를 참고하세요.
-                - 외근식대 : "외근" 혹은 "출장" "접대비" 써있습니다.
-                - 주간식대 : "주간식대"라고 써있습니다.
-                - 야근식대 : "야근식대"라고 써있습니다. 결제시간이 17시30분 이후이고 주소가 서울시 영등포구이면 야근식대입니다.
-                - 유류대 : "유류대"라고 써있습니다. 혹은 상호명이 주유소 등입니다.
-                - 통행료 : 하이플러스충전, 한국도로공사 등 써있습니다
-                - 숙박료 : 무인텔, 모텔 등 써있습니다.
-                - 교통비 : 동화운수, 콜택시, 택시 등 써있습니다.
-
-                ## e) 야근자 (사람이름) - 없을 수 있습니다. 없는 경우 빈칸("")으로 반환하세요
-                - b)가 "야근식대"인경우만 작성해주세요. 야근식대가 아니면 없습니다. 없는 경우 빈칸("")으로 반환하세요
-                - 사람이름 혹은 영어 이니셜 2글자로 되어있습니다. 
-                - 사람이름은 그대로 추출해주세요
-                    ```사람이름
-                    이인호
-                    이동혁
-                    양상관
-                    조준호
-                    안형범
-                    손근영
-                    오형석
-                    석영진
-                    이관희
-                    박주연
-                    ```
-                - 영어이니셜 2글자인 경우에는 아래를 참고해서 사람이름 3글자로 출력해주세요.
-                    ```영어 이니셜과 사람이름 매칭
-                    이인호 - IH
-                    이동혁 - DH
-                    양상관 - SK
-                    조준호 - JH
-                    안형범 - HB
-                    손근영 - KY
-                    오형석 - HS
-                    석영진 - YJ
-                    이관희 - GH
-                    박주연 - JY
-                    ```
-
-                ## f) 비고
-                - 영수증 최상단에 법인카드 혹은 개인카드 써있습니다. 
-                - {front_info.get('h', '')}를 참고하세요.
-                - 추가정보로는 법인카드는 신한카드법인 법카라고 써있습니다.
-                - 신한카드법인 카드번호 451844로 시작하니 참고하세요. 
-                - 개인카드는 사람이름과 함께 아웃풋해주세요 ex) 개인카드(손근영) 
-                - 개인카드인 경우 영어 이니셜 2글자일 수 있습니다. 영어 이니셜과 사람이름 매칭을 참고해서 사람이름 3글자로 추출해주세요.
-                
-                어떤 상황에서도 아래 JSON 형식으로 정확히 반환해주세요:
-                {{"d": "...", "e": "...", "f": "..."}}
-                """
-    
-    response_handwritten = client.models.generate_content(
-        model="gemini-2.5-flash",
+
+def _handwritten_request(image_bytes, front_info):
+    input_text = HANDWRITTEN_PROMPT_TEMPLATE.format(
+        front_info=front_info, card_info=front_info.get('h', '')
+    )
+    return dict(
+        model=MODEL_NAME,
         contents=[
-            types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
+            _image_part(image_bytes),
             (input_text),
         ],
+        config=_json_config(HANDWRITTEN_SCHEMA),
+    )
+
+def _single_request(image_bytes):
+    return dict(
+        model=MODEL_NAME,
+        contents=[
+            _image_part(image_bytes),
+            SINGLE_PROMPT,
+        ],
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=RECEIPT_SCHEMA,
+        ),
+    )
+
+def _normalize_front(front_info):
+    """모델이 원문으로 준 거래일시(a)·금액(c)을 로컬에서 'YYYY-MM-DD HH:MM' / 정수로 변환"""
+    return {**front_info,
+            "a": receipt_normalize.normalize_datetime(front_info.get("a", ""), warn=True),
+            "c": receipt_normalize.normalize_amount(front_info.get("c", ""))}
+
+def _split_single(info):
+    front_info = _normalize_front({key: info.get(key, "") for key in FRONT_FIELDS})
+    handwritten_info = {key: info.get(key, "") for key in HANDWRITTEN_FIELDS}
+    return front_info, handwritten_info
+
+def _extract_two_pass(client, image_bytes):
+    """기존 방식: 프린트 정보 추출 후 그 결과를 넣어 손글씨 정보 추출 (2회 호출)"""
+    response = api_metrics.generate_content(client, "front", **_front_request(image_bytes))
+    front_info = _normalize_front(_parse_json_response(response, receipt_schema.FrontFields, "front"))   # {'a': '2025-07-22 15:06', 'b': '...', 'c': 7500, ...}
+    response_handwritten = api_metrics.generate_content(client, "handwritten", **_handwritten_request(image_bytes, front_info))
+    handwritten_info = _parse_json_response(response_handwritten, receipt_schema.HandwrittenFields, "handwritten")
+    return front_info, handwritten_info
+
+def _extract_single(client, image_bytes):
+    """1회 호출: response_schema로 a~i 전체를 한 번에 추출"""
+    response = api_metrics.generate_content(client, "single", **_single_request(image_bytes))
+    return _split_single(_parse_json_response(response, receipt_schema.ReceiptFields, "single"))
+
+async def _extract_two_pass_async(client, image_bytes, limiter):
+    await limiter.acquire(tokens=_estimate_tokens(FRONT_PROMPT))
+    response = await api_metrics.generate_content_async(client, "front", **_front_request(image_bytes))
+    front_info = _normalize_front(_parse_json_response(response, receipt_schema.FrontFields, "front"))
+    await limiter.acquire(tokens=_estimate_tokens(HANDWRITTEN_PROMPT_TEMPLATE))
+    response_handwritten = await api_metrics.generate_content_async(
+        client, "handwritten", **_handwritten_request(image_bytes, front_info)
+    )
+    handwritten_info = _parse_json_response(response_handwritten, receipt_schema.HandwrittenFields, "handwritten")
+    return front_info, handwritten_info
+
+async def _extract_single_async(client, image_bytes, limiter):
+    await limiter.acquire(tokens=_estimate_tokens(SINGLE_PROMPT))
+    response = await api_metrics.generate_content_async(client, "single", **_single_request(image_bytes))
+    return _split_single(_parse_json_response(response, receipt_schema.ReceiptFields, "single"))
+
+def _check_mode(mode):
+    mode = mode or OCR_MODE
+    if mode not in OCR_MODES:
+        raise ValueError(f"지원하지 않는 OCR 모드: {mode} ({', '.join(OCR_MODES)})")
+    return mode
+
+def _image_mode(mode):
+    """영수증 1장 단위 호출 방식 (묶음 모드에서 1장만 처리할 때는 1회 호출)"""
+    mode = _check_mode(mode)
+    return "single" if mode == PACKED else mode
+
+_PROMPT_KEYS = {"two_pass": PROMPT_HASH, "single": SINGLE_PROMPT_HASH}
+
+def _load_with_cache(image_path, mode, use_cache):
+    """이미지 읽기 + 캐시 조회 → (image_bytes, cache, image_hash, prompt_key, cached)"""
+    prompt_key = _PROMPT_KEYS[mode]
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+
+    # ✅ 같은 이미지 + 같은 프롬프트면 캐시된 결과 반환 (API 호출 없음)
+    cache = ocr_cache.get_cache() if use_cache else None
+    image_hash = ocr_cache.hash_bytes(image_bytes)
+    cached = cache.get(image_hash, prompt_key) if cache is not None else None
+    return image_bytes, cache, image_hash, prompt_key, cached
+
+def extract_front_info_gemini(api_key, image_path: str, use_cache=True, mode=None) -> dict:
+    """(front_info, handwritten_info) 반환. mode는 OCR_MODES 중 하나 (기본: OCR_MODE)"""
+    mode = _image_mode(mode)
+    image_bytes, cache, image_hash, prompt_key, cached = _load_with_cache(image_path, mode, use_cache)
+    if cached is not None:
+        return cached["front"], cached["handwritten"]
+
+    image_bytes = image_prep.prepare(image_bytes)
+    client = api_clients.get_gemini_client(api_key)
+    if mode == "single":
+        front_info, handwritten_info = _extract_single(client, image_bytes)
+    else:
+        front_info, handwritten_info = _extract_two_pass(client, image_bytes)
+
+    if cache is not None:
+        cache.put(image_hash, prompt_key, {"front": front_info, "handwritten": handwritten_info})
+
+    return front_info, handwritten_info
+
+async def extract_front_info_gemini_async(api_key, image_path: str, limiter, use_cache=True, mode=None):
+    """extract_front_info_gemini 의 asyncio 버전. API 호출마다 limiter(TokenBucket) 통과"""
+    mode = _image_mode(mode)
+    image_bytes, cache, image_hash, prompt_key, cached = await asyncio.to_thread(
+        _load_with_cache, image_path, mode, use_cache
     )
-    raw_handwritten = response_handwritten.text.strip()
-    # 코드블록 백틱이 있을 경우 제거
-    if raw_handwritten.startswith("```"):
-        raw_handwritten = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw_handwritten, flags=re.DOTALL).strip()
-    handwritten_info = json.loads(raw_handwritten) 
+    if cached is not None:
+        return cached["front"], cached["handwritten"]
+
+    image_bytes = await image_prep.prepare_async(image_bytes)
+    client = api_clients.get_gemini_client(api_key)
+    if mode == "single":
+        front_info, handwritten_info = await _extract_single_async(client, image_bytes, limiter)
+    else:
+        front_info, handwritten_info = await _extract_two_pass_async(client, image_bytes, limiter)
 
+    if cache is not None:
+        await asyncio.to_thread(
+            cache.put, image_hash, prompt_key, {"front": front_info, "handwritten": handwritten_info}
+        )
 
     return front_info, handwritten_info
 
+async def extract_handwritten_gemini_async(api_key, image_path: str, front_info, limiter, use_cache=True):
+    """프린트 정보(front_info)를 이미 알 때 손글씨 정보만 1회 호출로 추출 (로컬 OCR 라우팅용)
+    캐시 키에 front_info 를 포함 (프린트 정보가 다르면 손글씨 프롬프트도 달라짐)"""
+    prompt_key = ocr_cache.prompt_hash(MODEL_NAME, HANDWRITTEN_PROMPT_TEMPLATE, image_prep.SETTINGS_KEY,
+                                       json.dumps(front_info, ensure_ascii=False, sort_keys=True))
+
+    def load():
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+        cache = ocr_cache.get_cache() if use_cache else None
+        image_hash = ocr_cache.hash_bytes(image_bytes)
+        return image_bytes, cache, image_hash, cache.get(image_hash, prompt_key) if cache is not None else None
+
+    image_bytes, cache, image_hash, cached = await asyncio.to_thread(load)
+    if cached is not None:
+        return cached["handwritten"]
+
+    image_bytes = await image_prep.prepare_async(image_bytes)
+    client = api_clients.get_gemini_client(api_key)
+    await limiter.acquire(tokens=_estimate_tokens(HANDWRITTEN_PROMPT_TEMPLATE))
+    response = await api_metrics.generate_content_async(
+        client, "handwritten", **_handwritten_request(image_bytes, front_info)
+    )
+    handwritten_info = _parse_json_response(response, receipt_schema.HandwrittenFields, "handwritten")
+    if cache is not None:
+        await asyncio.to_thread(cache.put, image_hash, prompt_key, {"handwritten": handwritten_info})
+    return handwritten_info
+
+# ===== 여러 장 묶음 호출 모드 =====
+# 영수증 N장을 generate_content 1회로 보내고 이미지 번호(index)가 붙은 JSON 배열로 받음
+# - 요청당 고정 지연시간과 RPM 한도를 N장이 나눠 씀 (작은 영수증이 수백 장일 때 효과)
+# - N은 이미지 크기로 추정한 토큰이 PACK_TOKEN_BUDGET 안에 들어오도록 정함 (최대 PACK_MAX_IMAGES)
+# - 응답에 없거나 형식이 잘못된 이미지는 1장씩(single) 다시 호출
+PACK_MAX_IMAGES = int(os.getenv("RECEIPTS_PACK_MAX", "8"))
+PACK_TOKEN_BUDGET = int(os.getenv("RECEIPTS_PACK_TOKENS", "12000"))  # 요청 1회 입력 토큰 예산 (이미지 + 프롬프트)
+GEMINI_TILE_TOKENS = 258  # 384px 이하 이미지 1장, 또는 768px 타일 1개
+
+PACKED_PROMPT = SINGLE_PROMPT + """
+                ## 여러 장
+                - 영수증 이미지 여러 장이 "이미지 0", "이미지 1", ... 라벨 뒤에 순서대로 주어집니다.
+                - 이미지마다 위 항목을 추출한 객체 1개씩, index 에 이미지 번호를 넣어 JSON 배열로 반환하세요.
+                - 다른 이미지의 내용을 섞지 마세요.
+                """
+
+PACKED_SCHEMA = types.Schema(
+    type="ARRAY",
+    items=types.Schema(
+        type="OBJECT",
+        properties={"index": types.Schema(type="INTEGER", description="이미지 번호"), **RECEIPT_SCHEMA.properties},
+        required=["index", *RECEIPT_SCHEMA.required],
+    ),
+)
+
+PACKED_PROMPT_HASH = ocr_cache.prompt_hash(
+    MODEL_NAME, PACKED_PROMPT, PACKED_SCHEMA.model_dump_json(), image_prep.SETTINGS_KEY
+)
+_PROMPT_KEYS[PACKED] = PACKED_PROMPT_HASH
+
+class ReceiptPack(tuple):
+    """한 번에 보낼 이미지 경로 묶음 (async_engine 작업 항목, 로그에는 '첫 파일 외 N장')"""
+
+    def __str__(self):
+        name = os.path.basename(self[0]) if self else ""
+        return f"{name} 외 {len(self) - 1}장" if len(self) > 1 else name
+
+def estimate_image_tokens(image_path):
+    """Gemini 이미지 토큰 추정: 전처리 후 크기 기준 384px 이하 258, 그 이상은 768px 타일당 258
+    (헤더만 읽음, 읽을 수 없으면 EST_IMAGE_TOKENS)"""
+    try:
+        from PIL import Image
+
+        with Image.open(image_path) as img:
+            width, height = img.size
+    except Exception:
+        return EST_IMAGE_TOKENS
+    if image_prep.ENABLED and max(width, height) > image_prep.LONG_EDGE:
+        scale = image_prep.LONG_EDGE / max(width, height)
+        width, height = width * scale, height * scale
+    if width <= 384 and height <= 384:
+        return GEMINI_TILE_TOKENS
+    return math.ceil(width / 768) * math.ceil(height / 768) * GEMINI_TILE_TOKENS
+
+def plan_packs(image_paths, budget=PACK_TOKEN_BUDGET, max_images=PACK_MAX_IMAGES):
+    """이미지 경로(처리 순서) → [ReceiptPack] (묶음마다 추정 토큰 ≤ budget, 최대 max_images장)"""
+    packs, current, used = [], [], len(PACKED_PROMPT)
+    for path in image_paths:
+        tokens = estimate_image_tokens(path) + EST_OUTPUT_TOKENS
+        if current and (len(current) >= max_images or used + tokens > budget):
+            packs.append(ReceiptPack(current))
+            current, used = [], len(PACKED_PROMPT)
+        current.append(path)
+        used += tokens
+    if current:
+        packs.append(ReceiptPack(current))
+    return packs
+
+def _packed_request(images):
+    contents = []
+    for i, image_bytes in enumerate(images):
+        contents += [f"이미지 {i}", _image_part(image_bytes)]
+    contents.append(PACKED_PROMPT)
+    return dict(
+        model=MODEL_NAME,
+        contents=contents,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=PACKED_SCHEMA,
+        ),
+    )
+
+def _split_packed(response, count):
+    """묶음 응답 → 이미지 순서대로 info dict 또는 None (누락·필드 누락·파싱 실패,
+    같은 index 가 두 번 오면 어느 쪽이 맞는지 알 수 없으므로 둘 다 None)"""
+    infos = [None] * count
+    try:
+        items = receipt_schema.parse_json(response.text, PACKED)
+    except (ValueError, AttributeError):
+        return infos
+    if not isinstance(items, list):
+        return infos
+    items = [item for item in items if isinstance(item, dict)]
+    counts = Counter(item.get("index") for item in items)
+    for item in items:
+        index = item.get("index")
+        if isinstance(index, int) and 0 <= index < count and counts[index] == 1 \
+                and all(key in item for key in RECEIPT_SCHEMA.required):
+            infos[index] = receipt_schema.validate(item, receipt_schema.ReceiptFields)
+    return infos
+
+async def extract_packed_async(api_key, image_paths, limiter, use_cache=True):
+    """이미지 여러 장 → [(front_info, handwritten_info) 또는 예외] (image_paths 순서)
+    캐시에 있는 이미지는 묶음에서 빼고, 묶음 응답에서 빠진 이미지는 1장씩 다시 호출"""
+    loaded = await asyncio.gather(*(asyncio.to_thread(_load_with_cache, path, PACKED, use_cache)
+                                    for path in image_paths))
+    results = [None] * len(image_paths)
+    pending = []
+    for i, (_, _, _, _, cached) in enumerate(loaded):
+        if cached is not None:
+            results[i] = (cached["front"], cached["handwritten"])
+        else:
+            pending.append(i)
+
+    if len(pending) > 1:
+        images = await asyncio.gather(*(image_prep.prepare_async(loaded[i][0]) for i in pending))
+        tokens = sum(estimate_image_tokens(image_paths[i]) + EST_OUTPUT_TOKENS for i in pending)
+        await limiter.acquire(tokens=tokens + len(PACKED_PROMPT))
+        client = api_clients.get_gemini_client(api_key)
+        response = await api_metrics.generate_content_async(client, PACKED, **_packed_request(images))
+        for i, info in zip(pending, _split_packed(response, len(pending))):
+            if info is None:
+                continue
+            results[i] = _split_single(info)
+            _, cache, image_hash, prompt_key, _ = loaded[i]
+            if cache is not None:
+                await asyncio.to_thread(
+                    cache.put, image_hash, prompt_key, {"front": results[i][0], "handwritten": results[i][1]}
+                )
+
+    missing = [i for i in pending if results[i] is None]
+    if missing:
+        if len(pending) > 1:
+            print(f"묶음 응답에서 빠진 영수증 {len(missing)}장 → 1장씩 다시 처리: {ReceiptPack(image_paths)}")
+        retried = await asyncio.gather(
+            *(extract_front_info_gemini_async(api_key, image_paths[i], limiter, use_cache, mode="single")
+              for i in missing),
+            return_exceptions=True,
+        )
+        for i, result in zip(missing, retried):
+            results[i] = result
+    return results
+
+def to_row(image_path, front_info, handwritten_info):
+    """추출 결과를 CSV 한 줄(filename, date, purpose, company, price, worker, note) + 원본 거래일시로 변환
+    (저널에 이 형식으로 저장, 마지막 원본 거래일시는 엑셀 날짜·일자별 합계용)"""
+    return [
+        os.path.basename(image_path),
+        convert_date_format(front_info.get('a', '')),    # 날짜시간 변환
+        handwritten_info.get('d', ''),    # 용도구분
+        front_info.get('b', ''),    # 업체명
+        front_info.get('c', ''),    # 금액
+        handwritten_info.get('e', ''),    # 야근자
+        handwritten_info.get('f', ''),    # 비고
+        front_info.get('a', ''),    # 거래일시 원본
+    ]
+
+def row_to_record(row):
+    """to_row 결과(저널에 저장된 형식) → Receipt (업체명은 출발-도착 열에 표시)"""
+    filename, date, purpose, company, price, worker, note = row[:7]
+    return receipt_records.Receipt(
+        source=filename,
+        receipt_no=os.path.splitext(filename)[0],
+        when=receipt_records.parse_datetime(row[7]) if len(row) > 7 else None,
+        date_text=date,
+        employee=worker,
+        purpose_text=purpose,
+        route=company,
+        amount_text=price,
+        note=note,
+    )
+
+def check_transaction(index, image_hash, row):
+    """to_row 결과를 거래 색인에 등록하고 먼저 등록된 같은 거래(일시·금액·업체명)를 찾음 → Match 또는 None"""
+    return index.check(image_hash, row[0], receipt_records.parse_datetime(row[7]) if len(row) > 7 else None,
+                       receipt_records.parse_amount(row[4]), row[3])
+
 def process_single_receipt(api_key, image_path, index):
     """단일 영수증 처리 함수 (멀티스레딩용)"""
     print(f"{index}번째 영수증 처리 시작: {os.path.basename(image_path)}")
@@ -174,117 +448,204 @@ def process_single_receipt(api_key, image_path, index):
         print(f"{index}번째 영수증 완료: {os.path.basename(image_path)}")
         print("프린트된 정보:", front_info)
         print("손글씨 정보:", handwritten_info)
-        return [
-            os.path.basename(image_path), 
-            convert_date_format(front_info.get('a', '')),    # 날짜시간 변환
-            handwritten_info.get('d', ''),    # 용도구분  
-            front_info.get('b', ''),    # 업체명
-            front_info.get('c', ''),    # 금액
-            handwritten_info.get('e', ''),    # 야근자
-            handwritten_info.get('f', '')     # 비고
-        ]
+        return to_row(image_path, front_info, handwritten_info)
     except Exception as e:
         print(f"{index}번째 영수증 오류: {e}")
         return [os.path.basename(image_path), '', '', '', '', '', '']
 
-def process_single_receipt_parallel(api_key, image_path, index):
-    """병렬 처리용 단일 영수증 처리 함수"""
-    try:
-        front_info, handwritten_info = extract_front_info_gemini(api_key, image_path)
-        
-        # 날짜 정보가 없으면 None 반환
-        if not front_info.get('a'):
-            return None
-            
-        return [
-            os.path.basename(image_path),
-            convert_date_format(front_info.get('a', '')),    # 날짜시간 변환
-            handwritten_info.get('d', ''),    # 용도구분  
-            front_info.get('b', ''),    # 업체명
-            front_info.get('c', ''),    # 금액
-            handwritten_info.get('e', ''),    # 야근자
-            handwritten_info.get('f', '')     # 비고
-        ]
-    except Exception as e:
-        print(f"영수증 처리 오류 {os.path.basename(image_path)}: {e}")
+async def process_single_receipt_async(api_key, image_path, limiter, mode=None, backend=None):
+    """병렬 처리용 단일 영수증 처리 코루틴 (오류는 async_engine에서 처리)
+    backend: ocr_backends 백엔드 (없으면 Gemini 직접 호출)"""
+    if backend is not None:
+        front_info, handwritten_info = await backend.extract_async(image_path, limiter)
+    else:
+        front_info, handwritten_info = await extract_front_info_gemini_async(api_key, image_path, limiter, mode=mode)
+    return _result_row(image_path, front_info, handwritten_info)
+
+def _result_row(image_path, front_info, handwritten_info):
+    # 날짜 정보가 없으면 None 반환
+    if not front_info.get('a'):
         return None
 
-def process_receipts(api_key, image_files, output_text_folder, progress_callback=None):
-    client = genai.Client(api_key=api_key)
-    """영수증들을 4개 스레드로 병렬 처리하여 정보를 추출하고 CSV로 저장"""
-    
-    max_workers = 4  # 하드코딩
-    
+    return to_row(image_path, front_info, handwritten_info)
+
+def pipeline_stages(api_key, mode=None, pooled=None):
+    """1장 단위 모드의 단계별 파이프라인 → (앞 단계, API 단계 worker, 뒤 단계)
+    읽기(파일·캐시 조회) → 전처리(프로세스 풀) → API 호출(JSON 파싱까지, 파싱 실패는 API 재시도)
+    → 정리(캐시 저장·행 변환). 캐시에 있는 영수증은 읽기 단계에서 바로 기록으로
+    pooled: ocr_backends.PooledBackend (API 키 여러 개, 요청마다 키를 빌려 씀)"""
+    mode = _image_mode(mode)
+    extract = _extract_single_async if mode == "single" else _extract_two_pass_async
+
+    async def read(image_path, _):
+        loaded = await asyncio.to_thread(_load_with_cache, image_path, mode, True)
+        cached = loaded[4]
+        if cached is not None:
+            return async_engine.Skip(_result_row(image_path, cached["front"], cached["handwritten"]))
+        return loaded
+
+    async def prepare(image_path, loaded):
+        return (await image_prep.prepare_async(loaded[0]),) + loaded[1:]
+
+    async def call(image_path, loaded, limiter):
+        if pooled is None:
+            client = api_clients.get_gemini_client(api_key)
+            return loaded, await extract(client, loaded[0], limiter)
+        async with pooled.pool.lease() as key:
+            if key.provider == ocr_backends.GeminiBackend.name:
+                client = api_clients.get_gemini_client(key.api_key)
+                return loaded, await extract(client, loaded[0], key.bucket)
+            # 다른 공급자 키로 넘어간 요청: 같은 모드·같은 프롬프트(receipt_schema)로 추출 (캐시는 그 모듈이 따로 저장)
+            fields = await pooled.backend_for(key).extract_async(image_path, key.bucket)
+            return loaded[:1] + (None,) + loaded[2:], fields
+
+    async def finish(image_path, value):
+        (_, cache, image_hash, prompt_key, _), (front_info, handwritten_info) = value
+        if cache is not None:
+            await asyncio.to_thread(
+                cache.put, image_hash, prompt_key, {"front": front_info, "handwritten": handwritten_info}
+            )
+        return _result_row(image_path, front_info, handwritten_info)
+
+    stages = (async_engine.Stage("읽기", read, async_engine.READ_WORKERS),
+              async_engine.Stage("전처리", prepare, image_prep.POOL_WORKERS))
+    return stages, call, (async_engine.Stage("정리", finish),)
+
+async def process_pack_async(api_key, pack, limiter):
+    """묶음 처리 코루틴 → 이미지 순서대로 to_row 결과(또는 None), 1장씩 다시 처리해도 실패한 이미지는 예외"""
+    results = await extract_packed_async(api_key, pack, limiter)
+    return [result if isinstance(result, Exception) else _result_row(path, *result)
+            for path, result in zip(pack, results)]
+
+def process_receipts(api_key, image_files, output_text_folder, progress_callback=None, mode=None,
+                     side_outputs=("csv",), backend=None, progress_tracker=None, control=None):
+    """영수증들을 asyncio로 병렬 처리하여 정보를 추출 → Receipt 리스트 반환
+    (동시 실행 수는 지연시간/429 응답에 따라 자동 조절, RPM/TPM은 async_engine 설정)
+    api_key 에 키를 여러 개(쉼표 구분) 넣으면 키마다 RPM/TPM 한도를 두고 나눠 보냄 (key_pool, OpenAI 키 섞어도 됨)
+    mode="packed" 면 여러 장씩 묶어서 호출 (묶음 단위로 재시도)
+    backend: ocr_backends 백엔드 (기본: default_backend → RECEIPTS_LOCAL_OCR 설정 시 필드별 로컬/클라우드)
+    progress_tracker: progress_events.ProgressTracker (완료/전체 장 수·처리 속도·남은 시간 이벤트)
+    control: async_engine.BatchControl (중지·일시정지, 중지 전에 끝난 결과는 저널에 남아 다음 실행에서 이어서 처리)
+    결과는 완료 즉시 output_text_folder/journal.jsonl 에 기록되며,
+    같은 폴더로 다시 실행하면 저널에 있는 이미지는 건너뛰고 이어서 처리
+    results_*.csv 는 side_outputs 형식으로 따로 기록"""
     os.makedirs(output_text_folder, exist_ok=True)
-    files = sorted(image_files)
-    details = []
-    used = set()
-    total_images = len(files)
+    tracker = progress_tracker or progress_events.ProgressTracker()
+    tracker.set_phase(progress_events.PREPARE)
+    # ✅ 같은 사진이 여러 번 들어오면 1장만 OCR (나머지는 대표 영수증 비고에 표시)
+    files, duplicates = duplicate_images.split_duplicates(sorted(image_files))
+    image_prep.stats.reset()
+    api_metrics.batch.reset()
+    started = time.perf_counter()
+
+    journal_path = os.path.join(output_text_folder, results_journal.JOURNAL_NAME)
+    hashes = results_journal.hash_files(files)
+    done = results_journal.load_done(journal_path)
+    todo = [f for f in files if hashes[f] not in done]
+    if len(todo) < len(files):
+        print(f"이전 작업 이어서 진행: {len(files) - len(todo)}장 건너뜀, {len(todo)}장 처리")
 
     if progress_callback: 
         progress_callback(15)
 
-    # 병렬 처리를 위한 ThreadPoolExecutor 사용
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 사용되지 않은 파일들만 처리
-        files_to_process = [f for f in files if f not in used]
-        
-        # 모든 작업 제출
-        future_to_file = {
-            executor.submit(process_single_receipt_parallel, api_key, image_path, idx): image_path
-            for idx, image_path in enumerate(files_to_process)
-        }
-        
-        completed_count = 0
-        
-        # 완료된 작업들 수집
-        for future in as_completed(future_to_file):
-            image_path = future_to_file[future]
-            completed_count += 1
-            
-            try:
-                result = future.result()
-                if result is not None:  # 유효한 결과만 추가
-                    details.append(result)
-                used.add(image_path)
-                
-            except Exception as e:
-                print(f"작업 실패 {os.path.basename(image_path)}: {e}")
-                used.add(image_path)
-            
-            # Progress callback 업데이트
-            if progress_callback:
-                current_progress = 15 + int((completed_count / len(files_to_process)) * 45)
-                progress_callback(current_progress)
+    def on_progress(completed_count, total):
+        if progress_callback:
+            progress_callback(15 + int((completed_count / total) * 45))
+
+    pool = key_pool.KeyPool.from_text(api_key)
+    pooled = len(pool) > 1
+    api_key = pool.keys[0].api_key
+    # 백엔드에는 1장 단위 모드를 넘김 (OpenAI 키로 넘어간 요청도 같은 2회/1회 호출 프롬프트 사용)
+    backend = backend or ocr_backends.default_backend(api_key, _image_mode(mode), pool)
+    concurrency = pool.concurrency() if pooled else None
+
+    async def worker(image_path, limiter):
+        return await process_single_receipt_async(api_key, image_path, limiter, mode=mode, backend=backend)
+
+    async def pack_worker(pack, limiter):
+        if not pooled:
+            return await process_pack_async(api_key, pack, limiter)
+        async with pool.lease(providers=(ocr_backends.GeminiBackend.name,)) as key:  # 묶음 호출은 Gemini 만
+            return await process_pack_async(key.api_key, pack, key.bucket)
+
+    index = transaction_index.get_index()
+    with results_journal.ResultJournal(journal_path) as journal:
+        journaled = []
+        if control is not None:  # 중지하면 기다리지 않고 지금까지의 기록을 디스크에 확정
+            control.on_cancel(journal.sync)
+
+        def on_result(image_path, row):
+            # ✅ 완료 즉시 저널에 기록 (중간에 종료돼도 다음 실행에서 이어서 처리)
+            journal.append(hashes[image_path], os.path.basename(image_path), row)
+            journaled.append(image_path)
+            # ✅ 같은 거래가 이미 있는지 바로 확인 (일시·금액 색인 조회)
+            match = check_transaction(index, hashes[image_path], row) if row else None
+            if match:
+                print(f"⚠️ 중복 거래 의심: {row[0]} ↔ {match.file} ({row[7]}, {row[4]}원)")
+
+        def on_pack_result(pack, rows):
+            for image_path, row in zip(pack, rows):
+                if isinstance(row, Exception):  # 저널에 남기지 않음 → 다음 실행에서 다시 처리
+                    print(f"영수증 처리 오류 {os.path.basename(image_path)}: {row}")
+                else:
+                    on_result(image_path, row)
+
+        pipeline = async_engine.PipelineStats()
+        tracker.set_phase(progress_events.OCR, total=len(todo))
+        if _check_mode(mode) == PACKED:
+            packs = plan_packs(todo)
+            if packs:
+                print(f"묶음 호출: {len(todo)}장 → {len(packs)}회 (최대 {PACK_MAX_IMAGES}장, 입력 {PACK_TOKEN_BUDGET}토큰 이내)")
+            async_engine.run(packs, pack_worker, concurrency=concurrency, progress_callback=on_progress,
+                             on_result=on_pack_result, stats=pipeline, tracker=tracker, control=control)
+        elif isinstance(backend, ocr_backends.GeminiBackend) or (
+                isinstance(backend, ocr_backends.PooledBackend) and pool.provider == ocr_backends.GeminiBackend.name):
+            # ✅ 읽기·전처리·API·정리·기록을 단계별로 겹쳐서 처리 (대기열 크기 제한 → 메모리 일정)
+            stages, call, post_stages = pipeline_stages(api_key, mode, backend if pooled else None)
+            async_engine.run_pipeline(todo, call, stages, post_stages, progress_callback=on_progress,
+                                      on_result=on_result, stats=pipeline, tracker=tracker, control=control,
+                                      concurrency=concurrency)
+        else:
+            async_engine.run(todo, worker, concurrency=concurrency, progress_callback=on_progress,
+                             on_result=on_result, stats=pipeline, tracker=tracker, control=control)
+        if len(journaled) == len(todo):  # 실패한 영수증이 있으면 다음 실행에서 재시도
+            journal.mark_complete()
+
+    elapsed = time.perf_counter() - started
+    print(image_prep.stats.summary())
+    print(api_metrics.batch.summary_text())
+    print(pipeline.summary_text())
+    if isinstance(backend, ocr_backends.RoutedBackend):
+        print(backend.summary())
+    if pooled:
+        print(pool.summary())
+    if todo:
+        print(f"OCR 완료: {len(todo)}장 {elapsed:.1f}초 (영수증당 평균 {elapsed / len(todo):.2f}초)")
+
+    # 저널에서 이번 배치의 유효한 결과만 파일명 순서대로 레코드로 변환 (이전 실행분 포함)
+    order = {hashes[f]: i for i, f in reversed(list(enumerate(files)))}
+    results = sorted((order[record["hash"]], record["hash"], record["result"])
+                     for record in results_journal.iter_results(journal_path, set(order))
+                     if record["result"] is not None)
+    records = []
+    for _, image_hash, row in results:
+        record = row_to_record(row)
+        record.duplicate_of = check_transaction(index, image_hash, row)  # 이전 실행분도 같은 결과
+        records.append(record)
+    duplicate_images.mark_duplicates(records, duplicates)
 
     if progress_callback: 
         progress_callback(60)
 
-    # CSV 저장 - 타임스탬프로 고유한 파일명 생성
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    csv_filename = os.path.join(output_text_folder, f'results_{timestamp}.csv')
-    
-    try:
-        with open(csv_filename, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow(['filename', 'date', 'purpose', 'company', 'price', 'worker', 'note'])
-            writer.writerows(details)
-        
-        print(f"{csv_filename}에 저장완료!")
-        
-        if progress_callback: 
-            progress_callback(100)
-            
-    except Exception as e:
-        print(f"❌ CSV 저장 중 오류 발생: {e}")
-        print("\n📋 결과 데이터:")
-        print("filename,date,purpose,company,price,worker,note")
-        for row in details:
-            print(','.join(str(item) for item in row))
-    
-    return len(details)
+    # ✅ CSV는 부가 출력 (엑셀은 반환된 레코드로 바로 생성)
+    receipt_records.write_side_outputs(output_text_folder, records, receipt_records.side_output_formats(side_outputs))
+    return records
 
 if __name__ == "__main__":
+    # python gemini_epc_demo-multi-gui.py [폴더|glob ...]  (기본: img 폴더) → receipts_cli 로 처리
+    import sys
+    import receipts_cli
+
     # API 키 설정 (환경변수에서 가져오거나 직접 입력)
     api_key = os.getenv('GEMINI_API_KEY')
     
@@ -292,7 +653,6 @@ if __name__ == "__main__":
         api_key = input("Gemini API 키를 입력하세요: ")
     
     if api_key:
-        # max_workers 파라미터로 동시 처리할 스레드 수 조절 (기본값: 4)
-        process_receipts(api_key, max_workers=4)
+        sys.exit(receipts_cli.main(["run", *(sys.argv[1:] or ["img"]), "--api-key", api_key]))
     else:
-        print("API 키가 필요합니다.")
\ No newline at end of file
+        print("API 키가 필요합니다.")
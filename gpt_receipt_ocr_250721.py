@@ -1,119 +1,339 @@
-from openai import OpenAI
 import os
 import re
 import base64
-from datetime import datetime
-from collections import defaultdict
+import asyncio
 
-# ✅ client를 global로 두지 않고, 함수 호출 시 생성
+import api_clients
+import api_metrics
+import async_engine
+import duplicate_images
+import image_classifier
+import image_prep
+import key_pool
+import ocr_backends
+import ocr_cache
+import progress_events
+import receipt_normalize
+import receipt_pairing
+import receipt_records
+import receipt_schema
+import results_journal
+
+# ✅ api_key 별 공유 클라이언트 사용 (연결 재사용)
 def create_client(api_key):
-    return OpenAI(api_key=api_key)
+    return api_clients.get_openai_client(api_key)
+
+MODEL_NAME = "gpt-4o"
+SYSTEM_PROMPT = "You are an OCR assistant for receipts."
 
 def encode_image(image_path):
     with open(image_path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
-def gpt_ocr(client, image_path, prompt):
-    base64_image = encode_image(image_path)
-    response = client.chat.completions.create(
-        model="gpt-4o",
+def _chat_request(image_bytes, prompt, response_format=None):
+    """response_format: JSON 응답 형식 (receipt_schema.openai_response_format), 없으면 자유 텍스트"""
+    base64_image = base64.b64encode(image_bytes).decode("utf-8")
+    mime_type = image_prep.detect_mime(image_bytes)
+    return dict(
+        model=MODEL_NAME,
         messages=[
-            {"role": "system", "content": "You are an OCR assistant for receipts."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": [
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}" }},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}" }},
                 {"type": "text", "text": prompt}
             ]}
         ],
-        max_tokens=500
+        max_tokens=500,
+        **({"response_format": response_format} if response_format else {})
     )
-    return response.choices[0].message.content
 
-def extract_front_info(client, image_path):
-    prompt = "영수증인지 확인 후 거래일시(YYYY-MM-DD HH:MM), 결제요금(예: 12,700원)을 출력.\n형식:\n거래일시: ...\n결제요금: ..."
-    result = gpt_ocr(client, image_path, prompt)
-    date_match = re.search(r"거래일시:\s*(\d{4}-\d{2}-\d{2}\s*\d{2}:\d{2})", result)
+def _lookup_cache(image_hash, prompt, use_cache):
+    """캐시 조회 → (cache, prompt_key, cached_text)"""
+    # ✅ 같은 이미지 + 같은 프롬프트면 캐시된 응답 반환 (API 호출 없음)
+    cache = ocr_cache.get_cache() if use_cache else None
+    prompt_key = ocr_cache.prompt_hash(MODEL_NAME, SYSTEM_PROMPT, prompt, image_prep.SETTINGS_KEY)
+    cached = cache.get(image_hash, prompt_key) if cache is not None else None
+    return cache, prompt_key, (cached["text"] if cached else None)
+
+def read_image(image_path):
+    """이미지 파일 → (image_hash, image_bytes)"""
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+    return ocr_cache.hash_bytes(image_bytes), image_bytes
+
+def _load_with_cache(image_path, prompt, use_cache):
+    """이미지 읽기 + 캐시 조회 → (image_bytes, cache, image_hash, prompt_key, cached_text)"""
+    image_hash, image_bytes = read_image(image_path)
+    cache, prompt_key, cached = _lookup_cache(image_hash, prompt, use_cache)
+    return image_bytes, cache, image_hash, prompt_key, cached
+
+# TokenBucket(TPM) 예산용 토큰 추정치: 이미지(high detail 1장) + 프롬프트 + max_tokens
+EST_IMAGE_TOKENS = 1105
+
+def gpt_ocr(client, image_path, prompt, use_cache=True, stage="ocr"):
+    image_bytes, cache, image_hash, prompt_key, cached = _load_with_cache(image_path, prompt, use_cache)
+    if cached is not None:
+        return cached
+
+    image_bytes = image_prep.prepare(image_bytes)
+    response = api_metrics.chat_completion(client, stage, **_chat_request(image_bytes, prompt))
+    result = response.choices[0].message.content
+
+    if cache is not None and result:
+        cache.put(image_hash, prompt_key, {"text": result})
+    return result
+
+async def gpt_ocr_async(api_key, image_path, prompt, limiter, use_cache=True, stage="ocr", response_format=None,
+                        image=None, parse=None):
+    """gpt_ocr 의 asyncio 버전 (AsyncOpenAI 사용, 호출 전 limiter 통과)
+    image: 파이프라인 앞 단계에서 읽고 전처리한 (image_hash, 전처리된 bytes) — 있으면 파일을 다시 읽지 않음
+    parse: 응답 텍스트 → 결과 (있으면 파싱에 성공한 응답만 캐시, 실패하면 예외 → async_engine 이 재시도)"""
+    if image is None:
+        image_bytes, cache, image_hash, prompt_key, cached = await asyncio.to_thread(
+            _load_with_cache, image_path, prompt, use_cache
+        )
+    else:
+        image_hash, image_bytes = image
+        cache, prompt_key, cached = await asyncio.to_thread(_lookup_cache, image_hash, prompt, use_cache)
+    if cached is not None:
+        return parse(cached) if parse else cached
+
+    if image is None:
+        image_bytes = await image_prep.prepare_async(image_bytes)
+    await limiter.acquire(tokens=EST_IMAGE_TOKENS + len(prompt) + 500)
+    client = api_clients.get_async_openai_client(api_key)
+    response = await api_metrics.chat_completion_async(client, stage,
+                                                       **_chat_request(image_bytes, prompt, response_format))
+    result = response.choices[0].message.content
+    parsed = parse(result) if parse else result
+
+    if cache is not None and result:
+        await asyncio.to_thread(cache.put, image_hash, prompt_key, {"text": result})
+    return parsed
+
+FRONT_PROMPT = "영수증인지 확인 후 거래일시(YYYY-MM-DD HH:MM), 결제요금(예: 12,700원)을 출력.\n형식:\n거래일시: ...\n결제요금: ..."
+
+def _parse_front(result):
+    # 모델이 형식을 지키지 않아도 (25.07.22 15:06 등) 로컬에서 YYYY-MM-DD HH:MM 으로 변환
+    date_match = re.search(r"거래일시:([^\n]*)", result)
     price_match = re.search(r"결제요금:\s*([\d,]+원)", result)
-    return {"date": date_match.group(1) if date_match else "", "price": price_match.group(1) if price_match else ""}
+    date = receipt_normalize.normalize_datetime(date_match.group(1), warn=True) if date_match else ""
+    return {"date": date, "price": price_match.group(1) if price_match else ""}
 
-def extract_back_info(client, image_path, employee_names):
-    employee_list = ", ".join(employee_names)
-    prompt = f"뒷면 이미지에서 손글씨 이름과 경로를 추출.\n리스트에서 이름 선택: [{employee_list}]\n형식:\n직원명: ...\n경로: ..."
-    result = gpt_ocr(client, image_path, prompt)
+def _parse_back(result):
     name_match = re.search(r"직원명:\s*([가-힣]+)", result)
     route_match = re.search(r"경로:\s*([^\n]+)", result)
     route_clean = re.sub(r"[→➡>~]+", "-", route_match.group(1).strip() if route_match else "")
     return {"employee": name_match.group(1) if name_match else "", "route": route_clean}
 
-def process_receipts(api_key, image_files, output_text_folder, employee_names, progress_callback=None):
-    client = create_client(api_key)
+def _employee_hint(employee_names):
+    return f"리스트에서 이름 선택: [{', '.join(employee_names)}]\n" if employee_names else ""
+
+def extract_front_info(client, image_path):
+    result = gpt_ocr(client, image_path, FRONT_PROMPT, stage="front")
+    return _parse_front(result)
+
+def back_prompt(employee_names):
+    return f"뒷면 이미지에서 손글씨 이름과 경로를 추출.\n{_employee_hint(employee_names)}형식:\n직원명: ...\n경로: ..."
+
+def extract_back_info(client, image_path, employee_names):
+    result = gpt_ocr(client, image_path, back_prompt(employee_names), stage="back")
+    return _parse_back(result)
+
+def classify_prompt(employee_names):
+    """앞면/뒷면 판별 + 정보 추출을 한 번에 하는 프롬프트"""
+    return (
+        "이미지 종류를 판별 후 정보를 출력.\n"
+        "- 인쇄된 영수증(앞면): 거래일시(YYYY-MM-DD HH:MM), 결제요금(예: 12,700원)\n"
+        "- 손글씨로 이름과 경로가 적힌 뒷면: 직원명, 경로\n"
+        "- 둘 다 아니면 종류: 기타\n"
+        f"{_employee_hint(employee_names)}"
+        "해당 없는 항목은 비워둘 것.\n"
+        "형식:\n종류: 앞면/뒷면/기타\n거래일시: ...\n결제요금: ...\n직원명: ...\n경로: ..."
+    )
+
+async def classify_image_async(api_key, image_path, employee_names, limiter, image=None):
+    """이미지 1장을 1회 호출로 분류 + OCR → (kind, front_info, back_info)"""
+    result = await gpt_ocr_async(api_key, image_path, classify_prompt(employee_names), limiter, stage="classify",
+                                 image=image) or ""
+    front_info, back_info = _parse_front(result), _parse_back(result)
+    if front_info["date"]:
+        return receipt_pairing.FRONT, front_info, back_info
+    if back_info["employee"]:
+        return receipt_pairing.BACK, front_info, back_info
+    return receipt_pairing.UNKNOWN, front_info, back_info
+
+async def route_image_async(api_key, image_path, employee_names, limiter, label, image=None):
+    """로컬 사전 분류(image_classifier) 결과에 맞는 프롬프트 1개로 OCR → (kind, front_info, back_info)
+    관계없는 사진은 API 호출 없이 UNKNOWN, 전용 프롬프트로 읽지 못하면 분류 프롬프트로 다시 확인"""
+    if label == image_classifier.IRRELEVANT:
+        return receipt_pairing.UNKNOWN, _parse_front(""), _parse_back("")
+    if label == receipt_pairing.FRONT:
+        result = await gpt_ocr_async(api_key, image_path, FRONT_PROMPT, limiter, stage="front", image=image) or ""
+        front_info = _parse_front(result)
+        if front_info["date"]:
+            return receipt_pairing.FRONT, front_info, _parse_back("")
+    elif label == receipt_pairing.BACK:
+        result = await gpt_ocr_async(api_key, image_path, back_prompt(employee_names), limiter, stage="back",
+                                     image=image) or ""
+        back_info = _parse_back(result)
+        if back_info["employee"]:
+            return receipt_pairing.BACK, _parse_front(""), back_info
+    return await classify_image_async(api_key, image_path, employee_names, limiter, image)
+
+# ocr_backends.OpenAIBackend 용: Gemini 식대 처리와 같은 프롬프트(receipt_schema)로 영수증 1장 추출
+# - "two_pass": 프린트(FRONT_PROMPT) → 손글씨(HANDWRITTEN_PROMPT) 2회, "single": a~i 1회 (FIELDS_PROMPT)
+# - 거래일시·금액은 원문 그대로 받아 로컬에서 변환, JSON 객체 모드는 프롬프트에 'JSON' 이 있어야 함
+FIELDS_PROMPT = receipt_schema.FIELDS_PROMPT + """
+                다음 JSON 형식으로 정확히 반환해주세요:
+                {"a": "...", "b": "...", "c": "...", "d": "...", "e": "...", "f": "...", "h": "...", "i": "..."}
+                """
+
+def _json_format(model, name):
+    """JSON 스키마(strict)로 키를 강제 (RECEIPTS_RESPONSE_SCHEMA=off 면 JSON 객체 모드만)"""
+    return receipt_schema.openai_response_format(model, name) if receipt_schema.ENABLED else {"type": "json_object"}
+
+FIELDS_FORMAT = _json_format(receipt_schema.ReceiptFields, "receipt_fields")
+FRONT_FORMAT = _json_format(receipt_schema.FrontFields, "front_fields")
+HANDWRITTEN_FORMAT = _json_format(receipt_schema.HandwrittenFields, "handwritten_fields")
+
+def _parse_fields(result):
+    return receipt_schema.parse_fields(result, receipt_schema.ReceiptFields, "fields")
+
+def _parse_front_fields(result):
+    return receipt_schema.parse_fields(result, receipt_schema.FrontFields, "front")
+
+def _parse_handwritten_fields(result):
+    return receipt_schema.parse_fields(result, receipt_schema.HandwrittenFields, "handwritten")
+
+def _normalize_front(front_info):
+    """거래일시(a)·금액(c)은 Gemini 와 같이 로컬에서 'YYYY-MM-DD HH:MM' / 정수로 변환"""
+    return {**front_info,
+            "a": receipt_normalize.normalize_datetime(front_info["a"], warn=True),
+            "c": receipt_normalize.normalize_amount(front_info["c"])}
+
+async def extract_handwritten_openai_async(api_key, image_path, front_info, limiter, use_cache=True):
+    """2회 호출의 손글씨 단계만: 프린트 정보(front_info)를 넣은 HANDWRITTEN_PROMPT → {d,e,f}"""
+    prompt = receipt_schema.HANDWRITTEN_PROMPT.format(front_info=front_info, card_info=front_info.get("h", ""))
+    return await gpt_ocr_async(api_key, image_path, prompt, limiter, use_cache, stage="handwritten",
+                               response_format=HANDWRITTEN_FORMAT, parse=_parse_handwritten_fields)
+
+async def extract_fields_openai_async(api_key, image_path, limiter, use_cache=True, mode="single"):
+    """이미지 1장 → (front_info {a,b,c,h,i}, handwritten_info {d,e,f}), 구조화 출력
+    mode: Gemini 식대 처리의 1장 단위 모드 ("two_pass" 면 2회 호출, 그 밖에는 1회 호출)"""
+    if mode == "two_pass":
+        front = await gpt_ocr_async(api_key, image_path, receipt_schema.FRONT_PROMPT, limiter, use_cache,
+                                    stage="front", response_format=FRONT_FORMAT, parse=_parse_front_fields)
+        front_info = _normalize_front(front)
+        return front_info, await extract_handwritten_openai_async(api_key, image_path, front_info, limiter,
+                                                                  use_cache)
+    info = await gpt_ocr_async(api_key, image_path, FIELDS_PROMPT, limiter, use_cache, stage="fields",
+                               response_format=FIELDS_FORMAT, parse=_parse_fields)
+    front_info = _normalize_front({key: info[key] for key in ("a", "b", "c", "h", "i")})
+    handwritten_info = {key: info[key] for key in ("d", "e", "f")}
+    return front_info, handwritten_info
+
+def process_receipts(api_key, image_files, output_text_folder, employee_names=None, progress_callback=None,
+                     side_outputs=("txt",), progress_tracker=None, control=None):
+    """0단계: 로컬 사전 분류로 관계없는 사진은 제외, 앞면/뒷면이 확실하면 전용 프롬프트 사용
+    1단계: 나머지 이미지를 병렬로 한 번씩만 분류 + OCR
+    2단계: 파일명 순서/촬영시각으로 앞면-뒷면 짝짓기 (추가 API 호출 없음)
+    → Receipt 리스트 반환 (교통비내역.txt 등은 side_outputs 형식으로 따로 기록)
+    분류 결과는 완료 즉시 output_text_folder/journal.jsonl 에 기록되며,
+    같은 폴더로 다시 실행하면 저널에 있는 이미지는 건너뛰고 이어서 처리
+    progress_tracker: progress_events.ProgressTracker (완료/전체 장 수·처리 속도·남은 시간 이벤트)
+    control: async_engine.BatchControl (중지·일시정지, 중지 전에 끝난 결과는 저널에 남아 다음 실행에서 이어서 처리)
+    api_key 에 OpenAI 키를 여러 개(쉼표 구분) 넣으면 키마다 RPM/TPM 한도를 두고 나눠 보냄 (key_pool)"""
     os.makedirs(output_text_folder, exist_ok=True)
-    files = sorted(image_files)
-    details, summary = [], defaultdict(int)
-    used = set()
-    total_images = len(files)
+    tracker = progress_tracker or progress_events.ProgressTracker()
+    tracker.set_phase(progress_events.PREPARE)
+    # ✅ 같은 사진이 여러 번 들어오면 1장만 OCR (짝짓기 전에 제외, 대표 영수증 비고에 표시)
+    files, duplicates = duplicate_images.split_duplicates(sorted(image_files))
+    api_metrics.batch.reset()
 
-    if progress_callback: progress_callback(15)
+    journal_path = os.path.join(output_text_folder, results_journal.JOURNAL_NAME)
+    hashes = results_journal.hash_files(files)
+    done = results_journal.load_done(journal_path)
+    todo = [f for f in files if hashes[f] not in done]
+    if len(todo) < len(files):
+        print(f"이전 작업 이어서 진행: {len(files) - len(todo)}장 건너뜀, {len(todo)}장 처리")
 
-    for idx, front in enumerate(files):
-        if front in used:
-            continue
-        front_info = extract_front_info(client, front)
+    # ✅ API 호출 전에 로컬에서 종류 판별 (관계없는 사진은 호출 없이 제외)
+    # 제외한 사진은 저널에 기록하지 않음 → 다음 실행에서 다시 판별 (기준이 바뀌면 다시 처리됨)
+    labels = image_classifier.classify_all(todo)
+    skipped = [f for f in todo if labels[f] == image_classifier.IRRELEVANT]
+    if skipped:
+        print(f"영수증이 아닌 사진으로 판단해 제외: {', '.join(os.path.basename(f) for f in skipped)}")
+        todo = [f for f in todo if labels[f] != image_classifier.IRRELEVANT]
 
+    if progress_callback: progress_callback(15)
+
+    def on_progress(completed_count, total):
         if progress_callback:
-            current_progress = 15 + int(((idx + 1) / total_images) * 45)
-            progress_callback(current_progress)
-
-        if not front_info["date"]:
-            continue
-
-        back_info = {"employee": "", "route": ""}
-        for candidate in files[idx + 1:]:
-            if candidate in used:
-                continue
-            temp_info = extract_back_info(client, candidate, employee_names)
-            if temp_info["employee"]:
-                back_info = temp_info
-                used.add(candidate)
-                break
-
-        month_day, task = "", ""
-        try:
-            dt = datetime.strptime(front_info["date"], "%Y-%m-%d %H:%M")
-            month_day = f"{dt.month}월 {dt.day}일"
-            task = "외근" if dt.hour < 17 or (dt.hour == 17 and dt.minute <= 30) else "야근"
-        except:
-            pass
-
-        details.append([
-            os.path.splitext(os.path.basename(front))[0],
-            month_day,
-            back_info["employee"],
-            task,
-            back_info["route"],
-            front_info["price"],
-            ""
-        ])
-
-        if back_info["employee"] and front_info["price"]:
-            try:
-                summary[back_info["employee"]] += int(front_info["price"].replace(",", "").replace("원", ""))
-            except:
-                pass
-
-        used.add(front)
+            progress_callback(15 + int((completed_count / total) * 45))
 
-    if progress_callback: progress_callback(60)
+    # ✅ 읽기·전처리·API·기록을 단계별로 겹쳐서 처리 (대기열 크기 제한 → 메모리 일정)
+    async def read(image_path, _):
+        return await asyncio.to_thread(read_image, image_path)
+
+    async def prepare(image_path, image):
+        return image[0], await image_prep.prepare_async(image[1])
+
+    # ✅ 키가 여러 개면 요청마다 키를 빌려 씀 (앞면/뒷면 분류 프롬프트는 GPT 전용 → OpenAI 키만)
+    pool = key_pool.KeyPool.from_text(api_key)
+    providers = (ocr_backends.OpenAIBackend.name,)
+    pooled = pool.count(providers[0]) > 1
+    if len(pool) > pool.count(providers[0]):
+        print(f"교통비 처리는 OpenAI 키만 사용: 다른 공급자 키 {len(pool) - pool.count(providers[0])}개 제외")
+
+    async def call(image_path, image, limiter):
+        if not pooled:
+            return await route_image_async(pool.keys[0].api_key, image_path, employee_names, limiter,
+                                           labels[image_path], image)
+        async with pool.lease(providers) as key:
+            return await route_image_async(key.api_key, image_path, employee_names, key.bucket,
+                                           labels[image_path], image)
 
-    details_path = os.path.join(output_text_folder, "교통비내역.txt")
-    with open(details_path, "w", encoding="utf-8") as f:
-        f.write("영수증번호\t사용일자\t직원명\t업무내용\t출발-도착\t사용요금\t비고\n")
-        for row in details:
-            f.write("\t".join(str(item) for item in row) + "\n")
+    stages = (async_engine.Stage("읽기", read, async_engine.READ_WORKERS),
+              async_engine.Stage("전처리", prepare, image_prep.POOL_WORKERS))
 
-    summary_path = os.path.join(output_text_folder, "직원별합계.txt")
-    with open(summary_path, "w", encoding="utf-8") as f:
-        f.write("직원명\t총액\n")
-        for name, total in summary.items():
-            f.write(f"{name}\t{total:,}원\n")
+    with results_journal.ResultJournal(journal_path) as journal:
+        journaled = []
+        if control is not None:  # 중지하면 기다리지 않고 지금까지의 기록을 디스크에 확정
+            control.on_cancel(journal.sync)
+
+        def on_result(image_path, result):
+            journal.append(hashes[image_path], os.path.basename(image_path), list(result))
+            journaled.append(image_path)
+
+        pipeline = async_engine.PipelineStats()
+        tracker.set_phase(progress_events.OCR, total=len(todo))
+        async_engine.run_pipeline(todo, call, stages, progress_callback=on_progress, on_result=on_result,
+                                  stats=pipeline, tracker=tracker, control=control,
+                                  concurrency=pool.concurrency(providers) if pooled else None)
+        if len(journaled) == len(todo):
+            journal.mark_complete()
+    print(api_metrics.batch.summary_text())
+    print(pipeline.summary_text())
+    if pooled:
+        print(pool.summary())
+
+    # 저널을 읽어 분류 결과 복원 (이전 실행분 포함)
+    by_hash = {record["hash"]: record["result"]
+               for record in results_journal.iter_results(journal_path, set(hashes.values()))}
+    classified = [by_hash.get(hashes[f]) or (receipt_pairing.UNKNOWN, None, None) for f in files]
+    kinds = [kind for kind, _, _ in classified]
+    pairs = receipt_pairing.pair_front_back(files, kinds)
+
+    records = []
+    for front_idx, back_idx in pairs.items():
+        front_info = classified[front_idx][1]
+        back_info = classified[back_idx][2] if back_idx is not None else {"employee": "", "route": ""}
+        records.append(receipt_records.transport_record(files[front_idx], front_info, back_info))
+
+    duplicate_images.mark_duplicates(records, duplicates)
+    if progress_callback: progress_callback(60)
 
-    return len(details)
\ No newline at end of file
+    # ✅ 텍스트 파일은 부가 출력 (엑셀은 반환된 레코드로 바로 생성)
+    receipt_records.write_side_outputs(output_text_folder, records, receipt_records.side_output_formats(side_outputs))
+    return records
\ No newline at end of file
@@ -1,17 +1,32 @@
+import time
+_STARTED = time.perf_counter()  # 시작 시간 측정 기준 (bench_startup.py)
+
 import sys
 import os
+import json
 import webbrowser
 import subprocess
 import importlib
+import threading
+import multiprocessing
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QLabel, QComboBox, QFileDialog,
     QVBoxLayout, QHBoxLayout, QProgressBar, QSizePolicy, QInputDialog, QMessageBox
 )
 from PyQt5.QtGui import QFontDatabase, QFont, QPixmap
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+
+# ✅ 무거운 모듈(openpyxl, google.genai, openai)은 여기서 가져오지 않음
+#    → 창이 처음 그려진 직후 PreloadThread 가 백그라운드에서 미리 import
+import async_engine
+import progress_events
+import results_journal
+import receipts_cli
 
-# Excel 모듈
-from excel_writer_250722 import generate_excel
+PRELOAD_MODULES = ["excel_writer_250722", "gpt_receipt_ocr_250721", "gemini_epc_demo-multi-gui"]
+# 설정 시 시작 단계별 시간을 이 경로에 JSON으로 기록하고 미리 불러오기가 끝나면 종료 (bench_startup.py)
+STARTUP_PROBE = os.getenv("RECEIPTS_STARTUP_PROBE")
+_IMPORTS_DONE = time.perf_counter() - _STARTED
 
 # ===== 경로 설정 =====
 base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
@@ -34,14 +49,35 @@ EMPLOYEE_NAMES = [
 
 # ===== 스레드 클래스 =====
 class ProcessThread(QThread):
-    progress = pyqtSignal(int)
+    progress = pyqtSignal()  # 새 진행 이벤트 있음 (take_progress_event 로 가장 최근 것만 가져감)
     finished = pyqtSignal(int, str)
 
-    def __init__(self, api_key, image_files, save_folder):
+    def __init__(self, api_key, image_files, save_folder, resume_folder=None):
         super().__init__()
         self.api_key = api_key
         self.image_files = image_files
         self.save_folder = save_folder
+        self.resume_folder = resume_folder  # 중단된 작업의 텍스트결과 폴더 (이어서 처리)
+        self.metrics_summary = ""  # 이번 배치 API 사용량 요약 (완료 화면 표시)
+        self.control = async_engine.BatchControl()  # 중지·일시정지 (GUI 스레드에서 호출)
+        self._event_lock = threading.Lock()
+        self._latest_event = None
+        self._event_queued = False
+
+    def _on_progress_event(self, event):
+        """OCR 엔진 → 진행 이벤트. GUI 가 아직 가져가지 않은 신호가 있으면 이벤트만 바꾸고 신호는 보내지 않음
+        (완료가 몰려도 Qt 이벤트 루프에는 신호 1개만 쌓임)"""
+        with self._event_lock:
+            self._latest_event = event
+            if self._event_queued:
+                return
+            self._event_queued = True
+        self.progress.emit()
+
+    def take_progress_event(self):
+        with self._event_lock:
+            self._event_queued = False
+            return self._latest_event
 
     def get_unique_path(self, path):
         """파일 경로 중복 시 _01, _02 추가"""
@@ -65,15 +101,12 @@ class ProcessThread(QThread):
     def run(self):
         try:
             # ✅ 저장 경로 중복 처리
-            output_text_folder = self.get_unique_folder(os.path.join(self.save_folder, "텍스트결과"))
+            output_text_folder = self.resume_folder or self.get_unique_folder(os.path.join(self.save_folder, "텍스트결과"))
             output_excel = self.get_unique_path(os.path.join(self.save_folder, "교통비_결과.xlsx"))
 
-            # ✅ API Key 유형에 따라 OCR 모듈 선택
-            if self.api_key.startswith("sk-"):  # OpenAI 키
-                ocr_module = importlib.import_module("gpt_receipt_ocr_250721")
-            elif self.api_key.startswith("AIza"):  # Gemini 키
-                ocr_module = importlib.import_module("gemini_epc_demo-multi-gui")
-            else:
+            # ✅ API Key 유형에 따라 OCR 모듈 선택 (sk- → GPT, AIza → Gemini)
+            ocr_module = receipts_cli.load_ocr_module(self.api_key)
+            if ocr_module is None:
                 # 잘못된 API Key는 신호를 보냄
                 self.finished.emit(0, "invalid_key")
                 return
@@ -81,21 +114,32 @@ class ProcessThread(QThread):
             # ✅ process_receipts 함수 가져오기
             process_receipts = getattr(ocr_module, "process_receipts")
 
-            # ✅ OCR 실행
-            total = process_receipts(
+            # ✅ OCR 실행 (결과 레코드를 메모리로 바로 받음, 텍스트/CSV는 부가 출력)
+            #    진행 상황은 처리한 영수증 수 기준 이벤트 (완료/전체, 처리 속도, 남은 시간, API 오류)
+            #    GPT 교통비는 직원명 목록을 프롬프트에 넣어 손글씨 이름을 목록에서 고르게 함
+            tracker = progress_events.ProgressTracker(self._on_progress_event)
+            kwargs = {"employee_names": EMPLOYEE_NAMES} if receipts_cli.takes_employee_names(ocr_module) else {}
+            records = process_receipts(
                 self.api_key,
                 self.image_files,
                 output_text_folder,
-                progress_callback=lambda val: self.progress.emit(val)
+                progress_tracker=tracker,
+                control=self.control,
+                **kwargs
             )
+            total = len(records)
 
-            # ✅ Excel 생성
+            # ✅ Excel 생성 (openpyxl 은 보통 PreloadThread 가 이미 불러와 둠)
+            import api_metrics
+            from excel_writer_250722 import generate_excel
+            tracker.set_phase(progress_events.EXCEL)
             generate_excel(
-                output_text_folder,
+                records,
                 TEMPLATE_PATH,
                 output_excel,
-                progress_callback=lambda val: self.progress.emit(val)
+                metrics=api_metrics.batch.sheet_sections()
             )
+            self.metrics_summary = api_metrics.batch.summary_text()
 
             self.finished.emit(total, output_excel)
 
@@ -104,6 +148,25 @@ class ProcessThread(QThread):
             self.finished.emit(0, "")
 
 
+# ===== 백그라운드 모듈 미리 불러오기 =====
+class PreloadThread(QThread):
+    """첫 화면 표시 후 OCR/엑셀 모듈을 미리 import (실행 버튼을 누를 때 기다리지 않도록)"""
+
+    def __init__(self, modules):
+        super().__init__()
+        self.modules = modules
+        self.timings = {}  # 모듈별 import 시간(초)
+
+    def run(self):
+        for name in self.modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:  # 실제 실행 시 다시 import 하면서 오류 표시됨
+                print(f"모듈 미리 불러오기 실패 {name}: {e}")
+            self.timings[name] = time.perf_counter() - start
+
+
 # ===== 드래그앤드랍 가능한 QLabel =====
 class DropLabel(QLabel):
     def __init__(self, parent=None):
@@ -153,7 +216,40 @@ class ReceiptApp(QWidget):
         self.setup_fonts()
         self.initUI()
 
+        self._first_paint = None
+        self._preload = None
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._first_paint is None:
+            self._first_paint = time.perf_counter() - _STARTED
+            QTimer.singleShot(0, self.start_preload)  # 첫 화면을 그린 뒤 이벤트 루프에서 시작
+
+    def start_preload(self):
+        self._preload = PreloadThread(PRELOAD_MODULES)
+        if STARTUP_PROBE:
+            self._preload.finished.connect(self.write_startup_probe)
+        self._preload.start()
+
+    def write_startup_probe(self):
+        """시작 단계별 시간 기록 후 종료 (bench_startup.py 가 소스/EXE 실행 모두 측정)"""
+        with open(STARTUP_PROBE, "w", encoding="utf-8") as f:
+            json.dump({
+                "first_paint_wall": time.time() - (time.perf_counter() - _STARTED - self._first_paint),
+                "imports": _IMPORTS_DONE,
+                "fonts": self._fonts_time,
+                "first_paint": self._first_paint,
+                "preload": self._preload.timings,
+                "frozen": bool(getattr(sys, "frozen", False)),
+            }, f, ensure_ascii=False)
+        QApplication.quit()
+
     def setup_fonts(self):
+        start = time.perf_counter()
+        self._load_fonts()
+        self._fonts_time = time.perf_counter() - start
+
+    def _load_fonts(self):
         try:
             title_font_id = QFontDatabase.addApplicationFont(TITLE_FONT_PATH)
             body_font_id = QFontDatabase.addApplicationFont(BODY_FONT_PATH)
@@ -272,6 +368,21 @@ class ReceiptApp(QWidget):
         self.percent_label.setAlignment(Qt.AlignRight)
         self.percent_label.hide()
 
+        # 진행 상세: 완료/전체 장 수, 처리 중 건수, 처리 속도, 남은 시간, API 오류
+        self.progress_detail = QLabel("")
+        self.progress_detail.setFont(self.BODY_FONT)
+        self.progress_detail.setAlignment(Qt.AlignCenter)
+        self.progress_detail.setStyleSheet("color:#7f7f7f;")
+        self.progress_detail.hide()
+
+        # 완료 화면: 이번 배치 API 사용량 (지연시간, 영수증당 토큰, 예상 비용)
+        self.metrics_label = QLabel("")
+        self.metrics_label.setFont(self.BODY_FONT)
+        self.metrics_label.setAlignment(Qt.AlignCenter)
+        self.metrics_label.setWordWrap(True)
+        self.metrics_label.setStyleSheet("color:#7f7f7f;")
+        self.metrics_label.hide()
+
         progress_bar_layout = QHBoxLayout()
         progress_bar_layout.addWidget(self.progress_bar, stretch=1)
         progress_bar_layout.addWidget(self.percent_label)
@@ -283,6 +394,27 @@ class ReceiptApp(QWidget):
         self.main_button.hide()
         self.main_button.clicked.connect(self.reset_ui)
 
+        # 실행 중 일시정지/중지 (중지해도 끝난 영수증은 엑셀에 저장, 나머지는 다음 실행에서 이어서)
+        self.pause_btn = QPushButton("일시정지")
+        self.pause_btn.setFont(self.BODY_FONT)
+        self.pause_btn.setStyleSheet("background-color:#00AFFF; color:white; border-radius:5px;")
+        self.pause_btn.setFixedSize(100, 40)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.pause_btn.hide()
+
+        self.stop_btn = QPushButton("중지")
+        self.stop_btn.setFont(self.BODY_FONT)
+        self.stop_btn.setStyleSheet("background-color:#7f7f7f; color:white; border-radius:5px;")
+        self.stop_btn.setFixedSize(100, 40)
+        self.stop_btn.clicked.connect(self.stop_process)
+        self.stop_btn.hide()
+
+        control_layout = QHBoxLayout()
+        control_layout.addStretch()
+        control_layout.addWidget(self.pause_btn)
+        control_layout.addWidget(self.stop_btn)
+        control_layout.addStretch()
+
         self.progress_layout = QVBoxLayout()
         self.progress_layout.setSpacing(5)
         self.progress_layout.addWidget(self.progress_icon, alignment=Qt.AlignCenter)
@@ -290,7 +422,10 @@ class ReceiptApp(QWidget):
         self.progress_layout.addWidget(self.progress_msg, alignment=Qt.AlignCenter)
         self.progress_layout.addSpacing(5)
         self.progress_layout.addLayout(progress_bar_layout)
+        self.progress_layout.addWidget(self.progress_detail)
+        self.progress_layout.addWidget(self.metrics_label)
         self.progress_layout.addSpacing(5)
+        self.progress_layout.addLayout(control_layout)
         self.progress_layout.addWidget(self.main_button, alignment=Qt.AlignCenter)
 
         # 로고
@@ -351,7 +486,7 @@ class ReceiptApp(QWidget):
             return
 
         # ✅ API Key 입력
-        api_key, ok = QInputDialog.getText(self, "API Key 입력", "OpenAI(또는 Gemini) API Key를 입력하세요:")
+        api_key, ok = QInputDialog.getText(self, "API Key 입력", "OpenAI(또는 Gemini) API Key를 입력하세요 (여러 개는 쉼표로 구분):")
         if not ok or not api_key.strip():
             QMessageBox.warning(self, "알림", "API Key가 필요합니다.")
             return
@@ -361,8 +496,22 @@ class ReceiptApp(QWidget):
 
         if folder:
             self.save_folder = folder
+            resume_folder = self.ask_resume(folder)
             self.show_progress_ui()
-            self.run_process(api_key)
+            self.run_process(api_key, resume_folder)
+
+    def ask_resume(self, folder):
+        """중단된 작업(완료 표시 없는 저널)이 있으면 이어서 할지 확인"""
+        resume_folder = results_journal.find_incomplete(folder)
+        if not resume_folder:
+            return None
+        answer = QMessageBox.question(
+            self, "이전 작업 이어서 하기",
+            f"중단된 작업이 있습니다.\n{os.path.basename(resume_folder)}\n\n"
+            "이미 처리된 영수증은 건너뛰고 이어서 진행할까요?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+        )
+        return resume_folder if answer == QMessageBox.Yes else None
 
     def show_progress_ui(self):
         for widget in [self.dept_label, self.dept_combo, self.upload_header, self.drop_area,
@@ -373,17 +522,75 @@ class ReceiptApp(QWidget):
         self.progress_msg.show()
         self.progress_bar.show()
         self.percent_label.show()
-
-    def run_process(self, api_key):
+        self.progress_detail.show()
+        self.pause_btn.setText("일시정지")
+        self.pause_btn.setEnabled(True)
+        self.stop_btn.setEnabled(True)
+        self.pause_btn.show()
+        self.stop_btn.show()
+
+    def run_process(self, api_key, resume_folder=None):
         # ✅ API Key 전달
-        self.thread = ProcessThread(api_key, self.image_files, self.save_folder)
+        self.thread = ProcessThread(api_key, self.image_files, self.save_folder, resume_folder)
         self.thread.progress.connect(self.update_progress)
         self.thread.finished.connect(self.show_finish_screen)
         self.thread.start()
 
-    def update_progress(self, value):
-        self.progress_bar.setValue(value)
-        self.percent_label.setText(f"{value}%")
+    def update_progress(self):
+        """진행 이벤트 표시 (신호는 합쳐져 오므로 가장 최근 상태만 그림)"""
+        event = self.thread.take_progress_event()
+        if event is None:
+            return
+        message = progress_events.PHASE_NAMES.get(event.phase, "처리중입니다")
+        if self.thread.control.cancelled and event.phase == progress_events.OCR:
+            message = "중지하는 중 (처리 중인 영수증 마무리)"
+        elif self.thread.control.paused:
+            message += " (일시정지)"
+        self.progress_msg.setText(message)
+        if event.phase == progress_events.OCR and event.total:
+            self.progress_bar.setRange(0, event.total)
+            self.progress_bar.setValue(event.completed)
+            self.percent_label.setText(f"{int(event.fraction * 100)}%")
+            self.progress_detail.setText(event.text())
+        else:
+            self.progress_bar.setRange(0, 0)  # 전체 양을 모르는 단계는 움직이는 막대로 표시
+            self.percent_label.setText("")
+            self.progress_detail.setText("")
+
+    def toggle_pause(self):
+        """새 영수증 처리 시작을 멈춤/재개 (API 호출 중인 것은 끝까지 진행)"""
+        control = self.thread.control
+        if control.paused:
+            control.resume()
+            self.pause_btn.setText("일시정지")
+        else:
+            control.pause()
+            self.pause_btn.setText("재개")
+        self.update_progress_message()
+
+    def stop_process(self):
+        """대기 중인 영수증은 건너뛰고, 끝난 결과까지만 엑셀로 저장"""
+        self.thread.control.cancel()
+        self.pause_btn.setEnabled(False)
+        self.stop_btn.setEnabled(False)
+        self.update_progress_message()
+
+    def update_progress_message(self):
+        if self.thread.control.cancelled:
+            self.progress_msg.setText("중지하는 중 (처리 중인 영수증 마무리)")
+        elif self.thread.control.paused:
+            self.progress_msg.setText("일시정지 (처리 중인 영수증은 마무리)")
+        else:
+            self.progress_msg.setText("처리중입니다")
+
+    def closeEvent(self, event):
+        """실행 중에 창을 닫으면 중지 후 끝난 결과를 저장할 때까지 기다림 (API 호출이 남지 않도록)"""
+        thread = getattr(self, "thread", None)
+        if thread is not None and thread.isRunning():
+            thread.control.cancel()
+            self.progress_msg.setText("중지하는 중 (처리 중인 영수증 마무리)")
+            thread.wait(int((async_engine.CANCEL_GRACE_SEC + 30) * 1000))
+        event.accept()
 
     def open_result_folder(self):
         if self.save_folder and os.path.exists(self.save_folder):
@@ -401,9 +608,19 @@ class ReceiptApp(QWidget):
             self.reset_ui()
             return
 
-        self.progress_msg.setText(f"총 {total}개 처리완료!")
+        self.pause_btn.hide()
+        self.stop_btn.hide()
+        if self.thread.control.cancelled:
+            self.progress_msg.setText(f"중지됨: {total}개 저장\n남은 영수증은 같은 폴더로 다시 실행하면 이어서 처리")
+        else:
+            self.progress_msg.setText(f"총 {total}개 처리완료!")
+        self.progress_detail.hide()
+        self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(100)
         self.percent_label.setText("100%")
+        if self.thread.metrics_summary:
+            self.metrics_label.setText(self.thread.metrics_summary.replace("API 사용량: ", "API 사용량\n", 1))
+            self.metrics_label.show()
         self.main_button.show()
         self.raise_()
         self.activateWindow()
@@ -414,7 +631,14 @@ class ReceiptApp(QWidget):
         self.progress_msg.hide()
         self.progress_bar.hide()
         self.percent_label.hide()
+        self.progress_detail.hide()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_msg.setText("처리중입니다")
+        self.metrics_label.hide()
         self.main_button.hide()
+        self.pause_btn.hide()
+        self.stop_btn.hide()
 
         for widget in [self.dept_label, self.dept_combo, self.upload_header, self.drop_area,
                        self.modify_header, self.excel_btn, self.add_btn, self.run_btn]:
@@ -424,6 +648,7 @@ class ReceiptApp(QWidget):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 이미지 전처리 프로세스 풀 (PyInstaller EXE)
     app = QApplication(sys.argv)
     window = ReceiptApp()
     window.show()
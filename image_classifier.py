@@ -0,0 +1,146 @@
+# === 모듈: image_classifier.py ===
+# API 호출 전에 로컬(CPU)에서 이미지 종류를 대략 판별 (GPT 앞면/뒷면 경로)
+# - 축소한 이미지의 통계만 사용: 종이 비율, 채도, 잉크(글자) 비율, 글자 줄 수, 질감(이웃 픽셀 밝기 차이)
+#   · 종이·잉크 기준은 이미지 자체의 밝기 분포로 정함 (어두운 조명·노란 조명에서도 같은 기준)
+#     종이 = 가장 밝은 부분 근처 밝기 + 그 부분의 색조(조명 색)와 비슷한 채도, 잉크 = 종이 밝기보다 충분히 어두움
+#   · 인쇄 영수증 앞면: 종이 위에 가는 글자 줄이 촘촘히 많음
+#   · 손글씨 뒷면    : 종이 위에 굵은 글씨 몇 줄
+#   · 관계없는 사진  : 종이가 거의 없고 채도가 높으며 질감이 있는 사진 (풍경·음식 사진 등)
+# - 확실할 때만 판별하고 애매하면 None → 기존처럼 API 분류 프롬프트로 처리
+#   (종이를 못 찾았거나 글자가 없는 이미지도 None, 관계없는 사진은 API 호출 없이 이번 실행에서만 제외)
+import os
+
+import image_prep
+import receipt_pairing
+
+ENABLED = os.getenv("RECEIPTS_PRECLASSIFY", "on").lower() not in ("off", "0", "false")
+IRRELEVANT = "irrelevant"
+THUMB_SIZE = 384
+
+# 종이·잉크 기준 (이미지 밝기 분포 기준 상대값)
+PAPER_PERCENTILE = 0.95     # 이 분위 밝기를 종이 밝기 기준으로 (가장 밝은 5%)
+PAPER_RANGE = 0.80          # 기준 밝기의 80% 이상이면 종이 후보
+PAPER_CAST_RANGE = 40       # 밝은 부분의 채도(조명 색) + 이 값 이내면 종이 (0~255)
+MAX_PAPER_CAST = 120        # 밝은 부분 채도가 이보다 높으면 종이가 아닌 색 (노란 조명 종이 ≈ 100)
+INK_RATIO = 0.60            # 종이 밝기의 60% 보다 어두우면 잉크
+
+# 판별 기준 (값이 애매한 이미지는 None)
+MIN_PAPER = 0.10            # 이보다 종이가 적고
+MIN_SATURATION = 0.30       # 채도가 높고
+MIN_TEXTURE = 0.01          # 질감이 있으면(단색·그라데이션이 아님) 관계없는 사진
+FRONT_MIN_LINES = 12        # 인쇄 영수증 글자 줄 수
+FRONT_MIN_INK = 0.02
+BACK_MAX_LINES = 6          # 손글씨 뒷면 글자 줄 수
+BACK_MIN_PAPER = 0.30
+
+
+def features(path):
+    """이미지 파일 → {paper, saturation, ink, lines, texture} (0~1 비율, 줄 수). 읽을 수 없으면 None"""
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(path) as img:
+            img.draft("RGB", (THUMB_SIZE, THUMB_SIZE))  # JPEG 는 축소 디코딩
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+            width, height = img.size
+            gray = list(img.convert("L").getdata())
+            sat = list(img.convert("HSV").getchannel("S").getdata())
+    except Exception:  # 읽을 수 없는 파일은 API 분류로 넘김
+        return None
+
+    total = len(gray)
+    saturation = sum(sat) / total / 255
+    texture = sum(abs(gray[i] - gray[i + 1]) for i in range(total - 1) if (i + 1) % width) / total / 255
+    empty = {"paper": 0.0, "saturation": saturation, "ink": 0.0, "lines": 0, "texture": texture}
+
+    # 종이: 가장 밝은 부분 근처 밝기이고 채도가 그 부분(조명 색)과 비슷한 픽셀
+    bright_level = sorted(gray)[int(total * PAPER_PERCENTILE)]
+    bright_sat = sorted(s for g, s in zip(gray, sat) if g >= bright_level)
+    cast = bright_sat[len(bright_sat) // 2]
+    if cast > MAX_PAPER_CAST:  # 가장 밝은 부분이 색이 진함 → 종이 없음
+        return empty
+    paper_min, sat_max = bright_level * PAPER_RANGE, cast + PAPER_CAST_RANGE
+    paper_levels = [g for g, s in zip(gray, sat) if g >= paper_min and s <= sat_max]
+    paper = len(paper_levels) / total
+    if not paper_levels:
+        return empty
+
+    # 종이 밝기 기준으로 충분히 어두운 픽셀을 글자(잉크, 볼펜 색 포함)로 봄
+    # 행마다 종이가 있는 가로 구간 안에서만 셈 (책상 등 어두운 배경 제외)
+    paper_level = sorted(paper_levels)[len(paper_levels) // 2]
+    ink_level = paper_level * INK_RATIO
+    ink = 0
+    row_ink = []
+    for y in range(height):
+        row_gray, row_sat = gray[y * width:(y + 1) * width], sat[y * width:(y + 1) * width]
+        on_paper = [x for x in range(width) if row_gray[x] >= paper_min and row_sat[x] <= sat_max]
+        if len(on_paper) < width * 0.2:
+            row_ink.append(0.0)
+            continue
+        dark = sum(1 for g in row_gray[on_paper[0]:on_paper[-1] + 1] if g < ink_level)
+        ink += dark
+        row_ink.append(dark / width)
+
+    # 글자 줄 = 잉크가 있는 행이 연속된 구간 (한 줄짜리 잡음 제외)
+    lines, run = 0, 0
+    for value in row_ink + [0.0]:
+        if value > 0.01:
+            run += 1
+            continue
+        if run >= 2:
+            lines += 1
+        run = 0
+    return {"paper": paper, "saturation": saturation, "ink": ink / total, "lines": lines, "texture": texture}
+
+
+def classify_features(f):
+    """features() 결과 → FRONT / BACK / IRRELEVANT, 애매하면 None
+    종이를 못 찾았거나 글자가 없는 이미지(빈 종이·단색·아주 어두운 사진)는 None → API 분류 프롬프트"""
+    if f is None:
+        return None
+    if f["paper"] < MIN_PAPER and f["saturation"] > MIN_SATURATION and f["texture"] >= MIN_TEXTURE:
+        return IRRELEVANT
+    if f["lines"] >= FRONT_MIN_LINES and f["ink"] >= FRONT_MIN_INK:
+        return receipt_pairing.FRONT
+    if 1 <= f["lines"] <= BACK_MAX_LINES and f["paper"] >= BACK_MIN_PAPER:
+        return receipt_pairing.BACK
+    return None
+
+
+def classify(path):
+    return classify_features(features(path))
+
+
+def classify_all(paths):
+    """{경로: FRONT / BACK / IRRELEVANT / None} — 디코딩은 image_prep 프로세스 풀에서 계산"""
+    if not ENABLED or not paths:
+        return {path: None for path in paths}
+    try:
+        labels = dict(zip(paths, image_prep.get_pool().map(classify, paths, chunksize=8)))
+    except Exception as e:  # 프로세스 풀 생성 불가 환경 등
+        print(f"프로세스 풀 사전 분류 실패, 현재 스레드에서 처리: {e}")
+        labels = {path: classify(path) for path in paths}
+    counts = {}
+    for label in labels.values():
+        counts[label] = counts.get(label, 0) + 1
+    print(f"사전 분류: 앞면 {counts.get(receipt_pairing.FRONT, 0)}장, 뒷면 {counts.get(receipt_pairing.BACK, 0)}장, "
+          f"제외 {counts.get(IRRELEVANT, 0)}장, API 분류 {counts.get(None, 0)}장")
+    return labels
+
+
+if __name__ == "__main__":
+    # python image_classifier.py <이미지 또는 폴더 ...>  → 파일별 특징값과 판별 결과 (기준값 조정용)
+    import sys
+    import glob
+
+    for source in sys.argv[1:]:
+        paths = sorted(glob.glob(os.path.join(source, "*"))) if os.path.isdir(source) else [source]
+        for path in paths:
+            f = features(path)
+            if f is None:
+                print(f"{os.path.basename(path)}: 읽을 수 없음")
+                continue
+            print(f"{os.path.basename(path)}: {classify_features(f)} "
+                  f"(종이 {f['paper']:.2f}, 채도 {f['saturation']:.2f}, 잉크 {f['ink']:.3f}, 줄 {f['lines']}, "
+                  f"질감 {f['texture']:.3f})")
@@ -0,0 +1,175 @@
+# === 모듈: image_prep.py ===
+# 업로드 전 이미지 전처리 (Pillow)
+# EXIF 회전 보정 → 영수증 영역 자르기 → 흑백 변환 → 긴 변 축소 → JPEG 재압축
+# 3~5MB 카카오톡 사진을 수백 KB로 줄여 업로드 시간/토큰을 절약
+# 프로세스 풀에서 실행되어 네트워크 호출과 겹쳐서 처리됨
+import io
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+ENABLED = os.getenv("RECEIPTS_IMAGE_PREP", "on").lower() not in ("off", "0", "false")
+LONG_EDGE = int(os.getenv("RECEIPTS_IMAGE_LONG_EDGE", "1600"))
+JPEG_QUALITY = int(os.getenv("RECEIPTS_JPEG_QUALITY", "80"))
+GRAYSCALE = os.getenv("RECEIPTS_IMAGE_GRAYSCALE", "on").lower() not in ("off", "0", "false")
+CROP = os.getenv("RECEIPTS_IMAGE_CROP", "on").lower() not in ("off", "0", "false")
+POOL_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))  # 전처리 프로세스 수
+
+# 전처리 설정이 바뀌면 모델 입력이 달라지므로 캐시 키(프롬프트 해시)에 포함
+SETTINGS_KEY = f"prep={int(ENABLED)},{LONG_EDGE},{JPEG_QUALITY},{int(GRAYSCALE)},{int(CROP)}"
+
+
+def detect_mime(data: bytes) -> str:
+    """파일 시그니처로 MIME 타입 판별 (확장자/기본값 image/jpeg 에 의존하지 않음)"""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return "image/jpeg"
+
+
+def _receipt_bbox(gray):
+    """배경보다 밝은 영수증 종이 영역의 bbox (못 찾으면 None)"""
+    from PIL import ImageFilter, ImageStat
+
+    small = gray.copy()
+    small.thumbnail((256, 256))
+    stat = ImageStat.Stat(small)
+    threshold = min(230, stat.mean[0] + 0.5 * stat.stddev[0])
+    mask = small.point(lambda p: 255 if p > threshold else 0).filter(ImageFilter.MedianFilter(5))
+    bbox = mask.getbbox()
+    if bbox is None:
+        return None
+
+    left, top, right, bottom = bbox
+    area_ratio = (right - left) * (bottom - top) / float(small.width * small.height)
+    if area_ratio < 0.15 or area_ratio > 0.95:
+        return None  # 너무 작거나 거의 전체면 자르지 않음
+
+    scale_x = gray.width / small.width
+    scale_y = gray.height / small.height
+    margin_x = int(gray.width * 0.03)
+    margin_y = int(gray.height * 0.03)
+    return (
+        max(0, int(left * scale_x) - margin_x),
+        max(0, int(top * scale_y) - margin_y),
+        min(gray.width, int(right * scale_x) + margin_x),
+        min(gray.height, int(bottom * scale_y) + margin_y),
+    )
+
+
+def prepare_image(data: bytes) -> bytes:
+    """원본 이미지 바이트 → 전처리된 JPEG 바이트 (실패하거나 더 커지면 원본 반환)"""
+    if not ENABLED:
+        return data
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("L") if GRAYSCALE else img.convert("RGB")
+            if CROP:
+                bbox = _receipt_bbox(img if GRAYSCALE else img.convert("L"))
+                if bbox:
+                    img = img.crop(bbox)
+            if max(img.size) > LONG_EDGE:
+                img.thumbnail((LONG_EDGE, LONG_EDGE), Image.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        print(f"이미지 전처리 실패 (원본 사용): {e}")
+        return data
+    prepared = out.getvalue()
+    return prepared if len(prepared) < len(data) else data
+
+
+class PrepStats:
+    """배치 단위 전처리 통계 (절약한 바이트, 소요시간)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.original_bytes = 0
+            self.prepared_bytes = 0
+            self.seconds = 0.0
+
+    def add(self, original_size, prepared_size, seconds):
+        with self._lock:
+            self.count += 1
+            self.original_bytes += original_size
+            self.prepared_bytes += prepared_size
+            self.seconds += seconds
+
+    def summary(self):
+        with self._lock:
+            if not self.count:
+                return "이미지 전처리: 처리한 이미지 없음"
+            saved = self.original_bytes - self.prepared_bytes
+            ratio = 100.0 * saved / self.original_bytes if self.original_bytes else 0.0
+            return (
+                f"이미지 전처리: {self.count}장, {self.original_bytes / 1e6:.1f}MB → "
+                f"{self.prepared_bytes / 1e6:.1f}MB ({ratio:.0f}% 절약), "
+                f"장당 평균 {self.seconds / self.count * 1000:.0f}ms"
+            )
+
+
+stats = PrepStats()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """전처리용 프로세스 풀 (CPU 작업이라 GIL을 피해 별도 프로세스에서 실행)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+        return _pool
+
+
+def prepare(data: bytes) -> bytes:
+    """현재 스레드에서 전처리 (통계 기록)"""
+    start = time.perf_counter()
+    prepared = prepare_image(data)
+    stats.add(len(data), len(prepared), time.perf_counter() - start)
+    return prepared
+
+
+async def prepare_async(data: bytes) -> bytes:
+    """프로세스 풀에서 전처리 → 그동안 이벤트 루프는 다른 영수증의 API 호출 진행"""
+    if not ENABLED:
+        return data
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        prepared = await loop.run_in_executor(get_pool(), prepare_image, data)
+    except Exception as e:  # 프로세스 풀 생성 불가 환경 등
+        print(f"프로세스 풀 전처리 실패, 스레드에서 처리: {e}")
+        prepared = await asyncio.to_thread(prepare_image, data)
+    stats.add(len(data), len(prepared), time.perf_counter() - start)
+    return prepared
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,194 @@
+# === 모듈: json_repair.py ===
+# 모델 응답 JSON 관대한 파싱 — json.loads 가 실패한 응답만 처음부터 한 글자씩 읽으며 복구
+# - 코드블록(```json), 앞뒤 설명문, 주석(//, #)
+# - 작은따옴표·따옴표 없는 키, True/False/None, 후행 쉼표, 빠진 쉼표·콜론
+# - 문자열 안의 줄바꿈·따옴표 (닫는 따옴표는 뒤에 , } ] : 가 오는 것만)
+# - 객체 값의 천 단위 쉼표 숫자 (12,700 → 12700)
+# - 잘린 응답: 열린 객체·배열은 닫고, 끝나지 않은 마지막 값은 버림 (반쯤 잘린 값을 쓰지 않음)
+# - 예시·속도 확인: python bench_json_repair.py
+import re
+import json
+
+_FENCE = re.compile(r"```[A-Za-z]*\s*(.*?)(?:```|$)", re.DOTALL)
+_NUMBER = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?")
+_GROUPED = re.compile(r"-?\d{1,3}(?:,\d{3})+(?:\.\d+)?(?=\s*(?:[,}\]\n]|$))")  # 천 단위 쉼표 숫자 (뒤에 구분자)
+_WORD = re.compile(r"[^\s,:{}\[\]\"']+")
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_QUOTES = {'"': '"', "'": "'", "“": "”", "‘": "’"}
+_CLOSE_AFTER_STRING = ",}]:"
+
+
+class _Truncated(Exception):
+    """응답이 값 중간에서 끝남"""
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def skip(self):
+        """공백·주석 건너뛰기 → 다음 글자 (끝이면 "")"""
+        text = self.text
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char.isspace():
+                self.pos += 1
+            elif text.startswith("//", self.pos) or char == "#":
+                end = text.find("\n", self.pos)
+                self.pos = len(text) if end < 0 else end
+            else:
+                return char
+        return ""
+
+    def value(self, in_object=False):
+        char = self.skip()
+        if not char:
+            raise _Truncated
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char in _QUOTES:
+            return self.string()
+        if in_object:
+            match = _GROUPED.match(self.text, self.pos)
+            if match:
+                self.pos = match.end()
+                number = match.group().replace(",", "")
+                return float(number) if "." in number else int(number)
+        match = _NUMBER.match(self.text, self.pos)
+        if match and not _WORD.match(self.text, match.end()):
+            return self.number(match)
+        return self.word()
+
+    def number(self, match):
+        self.pos = match.end()
+        token = match.group()
+        try:
+            return json.loads(token)
+        except json.JSONDecodeError:  # 0123, +5, 1. 등 → 원문 문자열
+            return token
+
+    def word(self):
+        match = _WORD.match(self.text, self.pos)
+        if not match:  # 알 수 없는 글자 1개는 버림
+            self.pos += 1
+            return self.value()
+        self.pos = match.end()
+        token = match.group()
+        return _LITERALS.get(token, token)  # 따옴표 없는 문자열은 그대로
+
+    def string(self):
+        text = self.text
+        quote = text[self.pos]
+        close = _QUOTES[quote]
+        self.pos += 1
+        chars = []
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char == "\\" and self.pos + 1 < len(text):
+                try:
+                    chars.append(json.loads(f'"{text[self.pos:self.pos + 2]}"'))
+                    self.pos += 2
+                except json.JSONDecodeError:  # \uXXXX 또는 잘못된 이스케이프
+                    match = re.match(r"\\u[0-9a-fA-F]{4}", text[self.pos:])
+                    if match:
+                        chars.append(chr(int(match.group()[2:], 16)))
+                        self.pos += 6
+                    else:
+                        chars.append(text[self.pos + 1])
+                        self.pos += 2
+                continue
+            self.pos += 1
+            if char == close:
+                rest = text[self.pos:].lstrip()
+                if not rest or rest[0] in _CLOSE_AFTER_STRING or rest[0] in _QUOTES:
+                    return "".join(chars)
+            chars.append(char)  # 문자열 안의 따옴표·줄바꿈은 내용으로
+        raise _Truncated
+
+    def key(self):
+        char = self.skip()
+        if char in _QUOTES:
+            return self.string()
+        match = re.match(r"[^\s:,{}\[\]]+", self.text[self.pos:])
+        if not match:
+            raise _Truncated
+        self.pos += match.end()
+        return match.group()
+
+    def object(self):
+        self.pos += 1
+        result = {}
+        while True:
+            char = self.skip()
+            if not char:
+                return result
+            if char == "}":
+                self.pos += 1
+                return result
+            if char == ",":
+                self.pos += 1
+                continue
+            if char == "]":  # 괄호 짝이 안 맞음
+                self.pos += 1
+                return result
+            try:
+                key = self.key()
+                if self.skip() == ":":  # 콜론이 빠졌으면 그대로 값
+                    self.pos += 1
+                result[key] = self.value(in_object=True)
+            except _Truncated:
+                return result
+            self._separator("}")
+
+    def array(self):
+        self.pos += 1
+        result = []
+        while True:
+            char = self.skip()
+            if not char:
+                return result
+            if char == "]":
+                self.pos += 1
+                return result
+            if char == ",":
+                self.pos += 1
+                continue
+            if char == "}":
+                self.pos += 1
+                return result
+            try:
+                result.append(self.value())
+            except _Truncated:
+                return result
+            self._separator("]")
+
+    def _separator(self, close):
+        """값 뒤: 쉼표면 넘어감 (후행 쉼표는 다음 반복에서 닫는 괄호로 처리, 쉼표가 빠졌으면 그대로 다음 값)"""
+        if self.skip() == ",":
+            self.pos += 1
+
+
+def loads(text):
+    """응답 텍스트 → (값, 복구했는지). json.loads 가 실패하면 복구, 그래도 JSON 값을 찾지 못하면 json.JSONDecodeError"""
+    text = (text or "").strip()
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError as e:
+        error = e
+    body = text
+    fence = _FENCE.search(text)
+    if fence:
+        body = fence.group(1)
+    starts = [i for i in (body.find("{"), body.find("[")) if i >= 0]
+    if not starts:
+        raise error
+    parser = _Parser(body)
+    parser.pos = min(starts)
+    try:
+        value = parser.value()
+    except _Truncated:
+        raise error from None
+    return value, True
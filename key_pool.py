@@ -0,0 +1,159 @@
+# === 모듈: key_pool.py ===
+# API 키 여러 개를 묶어서 요청을 나눠 보냄 (Gemini·OpenAI 키를 섞어도 됨)
+# - 키마다 TokenBucket (RPM/TPM 한도가 키 단위) → 전체 처리량이 키 수만큼 늘어남
+# - 요청마다 첫 번째 키의 공급자(기본 공급자) 키 중 가장 빨리 보낼 수 있는 키 선택 → 처리 중·누적 요청이 적은 키
+#   (RPM/TPM 대기는 기본 공급자 키에서 기다림, 다른 공급자 키는 기본 공급자 키가 모두
+#    429 로 쉬는 중이거나 한도 소진·잘못된 키로 제외됐을 때만 사용)
+# - 429 를 받은 키는 그 키만 잠시 쉬고, 한도 소진(일일 할당량·결제)·잘못된 키(401/403)는 이번 배치에서 제외
+#   → 쉬지 않는 다른 키가 있으면 KeyFailover 로 바로 재시도 (모든 키가 쉬면 원래 오류 → 엔진의 429 백오프)
+# - 키 입력: 쉼표·공백·줄바꿈으로 구분 (GUI 입력창, --api-key, RECEIPTS_API_KEY)
+import re
+import time
+import contextlib
+
+import async_engine
+import ocr_backends
+
+KEY_PAUSE_MAX_SEC = 60.0  # 429 가 이어질 때 키 1개를 쉬게 하는 최대 시간
+# 재시도해도 풀리지 않는 429 (OpenAI 결제 한도, Gemini 일일 할당량)
+_EXHAUSTED = ("insufficient_quota", "PerDay", "per day", "billing")
+
+
+class NoKeyAvailable(Exception):
+    """쓸 수 있는 키가 없음 (모두 한도 소진·잘못된 키) — async_engine 에서 CLIENT 오류로 분류해 재시도하지 않음"""
+    status_code = 403
+
+
+class KeyFailover(Exception):
+    """이 키는 쉬거나 제외됐으니 다른 키로 다시 시도 — async_engine 에서 FAILOVER 로 분류해 바로 재시도"""
+    failover = True
+
+
+def parse_keys(text):
+    """'AIza...,sk-...' → 키 목록 (순서 유지, 중복 제거)"""
+    return list(dict.fromkeys(key for key in re.split(r"[\s,;]+", text or "") if key))
+
+
+class PoolKey:
+    """키 1개의 요청 한도(bucket)와 사용 현황"""
+
+    def __init__(self, api_key, provider):
+        self.api_key = api_key
+        self.provider = provider
+        self.bucket = async_engine.TokenBucket()
+        self.in_flight = 0
+        self.calls = 0
+        self.rate_limited = 0
+        self.disabled = ""  # 제외 사유 (비어 있으면 사용 중)
+        self.resume_at = 0.0  # 429 로 쉬는 중이면 다시 쓸 시각
+        self._strikes = 0   # 연속 429 횟수
+
+    @property
+    def label(self):
+        return f"{self.provider} …{self.api_key[-4:]}"
+
+
+class KeyPool:
+    """키 목록 → lease() 로 요청마다 키 1개를 빌려 씀"""
+
+    def __init__(self, api_keys):
+        self.keys = []
+        for api_key in api_keys:
+            pipeline = ocr_backends.pipeline_for_key(api_key)
+            if pipeline is None:
+                raise ValueError(f"API 키 형식을 알 수 없습니다 (sk-... 또는 AIza...): …{api_key[-4:]}")
+            self.keys.append(PoolKey(api_key, pipeline[0]))
+        if not self.keys:
+            raise ValueError("API 키가 없습니다.")
+        self.provider = self.keys[0].provider  # 기본 공급자 (처리 모듈도 이 공급자 기준)
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(parse_keys(text))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def count(self, provider):
+        return sum(1 for key in self.keys if key.provider == provider and not key.disabled)
+
+    def concurrency(self, providers=None):
+        """키 수에 비례한 동시 실행 조절기 (키 1개 기준 기본값 × 쓸 키 수)"""
+        count = sum(1 for key in self.keys if providers is None or key.provider in providers)
+        return async_engine.AdaptiveConcurrency(initial=async_engine.DEFAULT_CONCURRENCY * count,
+                                                maximum=async_engine.MAX_CONCURRENCY * count)
+
+    def pick(self, providers=None):
+        """지금 쓸 키 (providers 로 공급자 제한), 쓸 수 있는 키가 없으면 NoKeyAvailable"""
+        usable = [key for key in self.keys
+                  if not key.disabled and (providers is None or key.provider in providers)]
+        if not usable:
+            raise NoKeyAvailable("사용할 수 있는 API 키가 없습니다 (모두 한도 소진 또는 잘못된 키)")
+
+        now = time.monotonic()
+        ready = [key for key in usable if key.resume_at <= now]  # 429 로 쉬는 키 제외
+        candidates = ([key for key in ready if key.provider == self.provider]
+                      or ready or usable)  # 모두 쉬는 중이면 가장 먼저 풀리는 키 (bucket 에 쉬는 시간 반영됨)
+        key = min(candidates, key=lambda k: (k.bucket.ready_in(), k.in_flight, k.calls))
+        key.in_flight += 1
+        key.calls += 1
+        return key
+
+    def release(self, key, error=None):
+        """요청 결과 반영 → 이번 오류로 키를 제외했으면 True"""
+        key.in_flight -= 1
+        if error is None:
+            key._strikes = 0
+            return False
+        kind = async_engine.classify_error(error)
+        if kind == async_engine.RATE_LIMIT:
+            key.rate_limited += 1
+            if any(word in str(error) for word in _EXHAUSTED):
+                return self._disable(key, "한도 소진")
+            key._strikes += 1
+            delay = min(KEY_PAUSE_MAX_SEC, 2.0 ** key._strikes)
+            key.bucket.pause(delay)  # 다른 키는 계속 사용
+            key.resume_at = time.monotonic() + delay
+        elif kind == async_engine.CLIENT and (getattr(error, "status_code", None)
+                                              or getattr(error, "code", None)) in (401, 403):
+            return self._disable(key, "잘못된 키")
+        return False
+
+    def _disable(self, key, reason):
+        if key.disabled:
+            return False
+        key.disabled = reason
+        left = len(self.keys) - sum(1 for k in self.keys if k.disabled)
+        print(f"API 키 제외 ({reason}): {key.label} → 남은 키 {left}개")
+        return True
+
+    @contextlib.asynccontextmanager
+    async def lease(self, providers=None):
+        """async with pool.lease() as key: key.api_key 로 호출, limiter 는 key.bucket"""
+        key = self.pick(providers)
+        try:
+            yield key
+        except Exception as e:
+            self.release(key, e)
+            now = time.monotonic()
+            if (key.disabled or key.resume_at > now) and any(
+                    not k.disabled and k.resume_at <= now and (providers is None or k.provider in providers)
+                    for k in self.keys):
+                raise KeyFailover(f"{key.label} {key.disabled or '429'}, 다른 키로 재시도: {e}") from e
+            raise
+        except BaseException:  # 중지(CancelledError) 등
+            self.release(key)
+            raise
+        else:
+            self.release(key)
+
+    def summary(self):
+        parts = []
+        for key in self.keys:
+            text = f"{key.label} {key.calls}건"
+            if key.rate_limited:
+                text += f" (429 {key.rate_limited}회)"
+            if key.disabled:
+                text += f" [{key.disabled}]"
+            parts.append(text)
+        return f"API 키 {len(self.keys)}개: " + ", ".join(parts)
@@ -0,0 +1,91 @@
+# === 모듈: local_ocr.py ===
+# 로컬(CPU) OCR + 규칙 기반 필드 추출 — 네트워크 없이 인쇄된 영수증의 거래일시·업체명·금액 등을 읽음
+# - OCR 엔진: Tesseract (pytesseract + tesseract 실행파일, kor+eng 학습데이터) — 설치되어 있을 때만 사용
+# - 필드 추출: 'YYYY-MM-DD HH:MM' 류 날짜, '합계/결제금액' 줄의 금액, '가맹점명/상호' 줄의 업체명, 카드·주소
+# - 못 읽은 필드는 빈 문자열 → ocr_backends.RoutedBackend 가 해당 필드만 클라우드로 보냄
+import os
+import re
+
+import receipt_normalize
+
+TESSERACT_LANG = os.getenv("RECEIPTS_TESSERACT_LANG", "kor+eng")
+TESSERACT_CMD = os.getenv("RECEIPTS_TESSERACT_CMD")  # tesseract 실행파일 경로 (PATH 에 없을 때)
+
+_AMOUNT_LINE = receipt_normalize.TOTAL_KEYWORD
+_NUMBER = re.compile(r"\d{1,3}(?:,\d{3})+|\d+")
+_MERCHANT_LINE = re.compile(r"(가맹점\s*명|가맹점|상\s*호|업체\s*명|매장\s*명)\s*[:：]?\s*(?P<name>.+)")
+_CARD_LINE = re.compile(r"(?P<card>[가-힣A-Za-z]*카드[가-힣A-Za-z]*)\D{0,10}(?P<number>\d{4,6}[\d*\-]*)")
+_ADDRESS_LINE = re.compile(r"(?:주\s*소\s*[:：]?\s*)?(?P<addr>[가-힣]+(?:시|도)\s+[가-힣]+(?:시|구|군)\s+[가-힣0-9]+(?:로|길|동)[\s\d\-가-힣]*)")
+
+
+def is_available():
+    """pytesseract 와 tesseract 실행파일이 있는지"""
+    try:
+        import pytesseract
+
+        if TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        pytesseract.get_tesseract_version()
+    except Exception:
+        return False
+    return True
+
+
+def image_to_text(image_path):
+    """Tesseract 로 이미지 → 텍스트 (image_prep 와 같은 흑백 변환·축소 후 인식)"""
+    import pytesseract
+    from PIL import Image, ImageOps
+
+    if TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img).convert("L")
+        if max(img.size) > 2400:
+            img.thumbnail((2400, 2400))
+        return pytesseract.image_to_string(img, lang=TESSERACT_LANG, config="--psm 6")
+
+
+def parse_datetime_text(text):
+    """텍스트에서 첫 거래일시 → 'YYYY-MM-DD HH:MM' (시간까지 있어야 함, 없으면 "")"""
+    return receipt_normalize.normalize_datetime(text)
+
+
+def parse_amount_text(text):
+    """'합계/결제금액' 등이 있는 줄의 금액 중 가장 큰 값 → int (없으면 "")"""
+    amounts = []
+    for line in text.splitlines():
+        if _AMOUNT_LINE.search(line):
+            amounts += [int(n.replace(",", "")) for n in _NUMBER.findall(_AMOUNT_LINE.split(line)[-1])]
+    amounts = [a for a in amounts if 100 <= a < 10_000_000]  # 수량·승인번호 등 제외
+    return max(amounts) if amounts else ""
+
+
+def parse_merchant_text(text):
+    for line in text.splitlines():
+        match = _MERCHANT_LINE.search(line)
+        if match:
+            name = re.split(r"\s{2,}|사업자|대표|TEL|전화", match["name"])[0].strip(" :：")
+            if name:
+                return name
+    return ""
+
+
+def parse_card_text(text):
+    match = _CARD_LINE.search(text)
+    return f"{match['card']} {match['number']}" if match else ""
+
+
+def parse_address_text(text):
+    match = _ADDRESS_LINE.search(text)
+    return match["addr"].strip() if match else ""
+
+
+def parse_front_fields(text):
+    """OCR 텍스트 → 프린트 정보 {a, b, c, h, i} (Gemini 프롬프트와 같은 키, 못 읽으면 "")"""
+    return {
+        "a": parse_datetime_text(text),
+        "b": parse_merchant_text(text),
+        "c": parse_amount_text(text),
+        "h": parse_card_text(text),
+        "i": parse_address_text(text),
+    }
@@ -0,0 +1,263 @@
+# === 모듈: ocr_backends.py ===
+# OCR 백엔드 공통 인터페이스: extract(image) → ReceiptFields
+# - 등록된 구현: gemini / openai (클라우드), tesseract (로컬 CPU, local_ocr)
+# - RoutedBackend: 필드별로 로컬/클라우드를 골라 씀 → 로컬에서 읽은 필드는 API 를 호출하지 않음
+#   (인쇄된 날짜·업체명·금액은 로컬, 손글씨는 클라우드 등. RECEIPTS_FIELD_ROUTING 으로 설정)
+# - PooledBackend: API 키 여러 개(key_pool)에 요청을 나눠 보내고, 공급자가 다르면 그 공급자 백엔드로 추출
+#   (식대 프롬프트는 receipt_schema 공용 → OpenAI 키로 넘어가도 같은 모드·같은 필드 설명)
+# - 배치 파이프라인(process_receipts) 모듈 선택도 여기서 (API 키 접두어 → 모듈, 키가 여러 개면 첫 번째 키 기준)
+import os
+import asyncio
+import importlib
+from typing import NamedTuple
+
+import async_engine
+
+FRONT_FIELDS = ("a", "b", "c", "h", "i")    # 프린트 정보: 거래일시, 업체명, 금액, 카드, 주소
+HANDWRITTEN_FIELDS = ("d", "e", "f")        # 손글씨 정보: 용도구분, 야근자, 비고
+FIELDS = FRONT_FIELDS + HANDWRITTEN_FIELDS
+
+# 필드별 경로
+LOCAL = "local"             # 로컬 우선, 못 읽으면 클라우드
+LOCAL_ONLY = "local_only"   # 로컬만 (못 읽어도 비워 둠)
+CLOUD = "cloud"             # 항상 클라우드
+ROUTES = (LOCAL, LOCAL_ONLY, CLOUD)
+# 카드·주소(h, i)는 엑셀에 쓰이지 않고 손글씨 프롬프트 참고용이라 못 읽어도 클라우드를 부르지 않음
+DEFAULT_ROUTING = "a,b,c=local;h,i=local_only;d,e,f=cloud"
+
+LOCAL_ENGINE = os.getenv("RECEIPTS_LOCAL_OCR", "")   # 예: tesseract (비우면 클라우드만)
+FIELD_ROUTING = os.getenv("RECEIPTS_FIELD_ROUTING", DEFAULT_ROUTING)
+
+# API 키 접두어 → 배치 파이프라인 모듈 (process_receipts)
+PIPELINES = (
+    ("sk-", "openai", "gpt_receipt_ocr_250721"),          # GPT-4o 교통비 (앞면/뒷면)
+    ("AIza", "gemini", "gemini_epc_demo-multi-gui"),      # Gemini 식대 (프린트 + 손글씨)
+)
+
+
+class ReceiptFields(NamedTuple):
+    """영수증 1장 추출 결과 (키는 프롬프트의 a~i, 기존 (front_info, handwritten_info) 와 같은 모양)"""
+    front: dict         # a, b, c, h, i
+    handwritten: dict   # d, e, f
+
+    @classmethod
+    def empty(cls):
+        return cls({key: "" for key in FRONT_FIELDS}, {key: "" for key in HANDWRITTEN_FIELDS})
+
+    def get(self, key):
+        return (self.front if key in FRONT_FIELDS else self.handwritten).get(key, "")
+
+    def set(self, key, value):
+        (self.front if key in FRONT_FIELDS else self.handwritten)[key] = value
+
+
+class OCRBackend:
+    """OCR 백엔드 기본 클래스. 하위 클래스는 extract_async 를 구현하고 @register 로 등록"""
+    name = ""
+    network = True      # API 호출 여부 (False 면 로컬 CPU)
+
+    async def extract_async(self, image_path, limiter):
+        """이미지 1장 → ReceiptFields (API 호출은 limiter 통과)"""
+        raise NotImplementedError
+
+    async def extract_fields_async(self, image_path, limiter, fields, known):
+        """fields 만 필요할 때 호출 (known: 이미 읽은 필드). 기본은 전체 추출"""
+        return await self.extract_async(image_path, limiter)
+
+    def extract(self, image_path):
+        """동기 코드용 extract_async 래퍼"""
+        return asyncio.run(self.extract_async(image_path, async_engine.TokenBucket()))
+
+
+_BACKENDS = {}
+
+
+def register(cls):
+    """백엔드 클래스 등록 (이름으로 create)"""
+    _BACKENDS[cls.name] = cls
+    return cls
+
+
+def create(name, **kwargs):
+    if name not in _BACKENDS:
+        raise ValueError(f"지원하지 않는 OCR 백엔드: {name} ({', '.join(_BACKENDS)})")
+    return _BACKENDS[name](**kwargs)
+
+
+def available():
+    return list(_BACKENDS)
+
+
+@register
+class GeminiBackend(OCRBackend):
+    name = "gemini"
+
+    def __init__(self, api_key, mode=None):
+        self.api_key = api_key
+        self.mode = mode
+        self.module = importlib.import_module("gemini_epc_demo-multi-gui")
+
+    async def extract_async(self, image_path, limiter):
+        front, handwritten = await self.module.extract_front_info_gemini_async(
+            self.api_key, image_path, limiter, mode=self.mode
+        )
+        return ReceiptFields(front, handwritten)
+
+    async def extract_fields_async(self, image_path, limiter, fields, known):
+        # 2회 호출 모드에서 프린트 정보를 이미 다 알면 손글씨 프롬프트 1회만 (첫 호출 생략)
+        if set(fields) <= set(HANDWRITTEN_FIELDS) and self.module._image_mode(self.mode) == "two_pass":
+            handwritten = await self.module.extract_handwritten_gemini_async(
+                self.api_key, image_path, dict(known.front), limiter
+            )
+            return ReceiptFields(dict(known.front), handwritten)
+        return await self.extract_async(image_path, limiter)
+
+
+@register
+class OpenAIBackend(OCRBackend):
+    name = "openai"
+
+    def __init__(self, api_key, mode=None):
+        self.api_key = api_key
+        self.mode = mode or "single"  # Gemini 1장 단위 모드와 같은 프롬프트 (two_pass / single)
+        self.module = importlib.import_module("gpt_receipt_ocr_250721")
+
+    async def extract_async(self, image_path, limiter):
+        front, handwritten = await self.module.extract_fields_openai_async(self.api_key, image_path, limiter,
+                                                                            mode=self.mode)
+        return ReceiptFields(front, handwritten)
+
+    async def extract_fields_async(self, image_path, limiter, fields, known):
+        # GeminiBackend 와 같이 2회 호출 모드에서 프린트 정보를 이미 알면 손글씨 프롬프트 1회만
+        if set(fields) <= set(HANDWRITTEN_FIELDS) and self.mode == "two_pass":
+            handwritten = await self.module.extract_handwritten_openai_async(
+                self.api_key, image_path, dict(known.front), limiter
+            )
+            return ReceiptFields(dict(known.front), handwritten)
+        return await self.extract_async(image_path, limiter)
+
+
+@register
+class TesseractBackend(OCRBackend):
+    name = "tesseract"
+    network = False
+
+    def __init__(self, **_):
+        import local_ocr
+
+        self.local_ocr = local_ocr
+
+    async def extract_async(self, image_path, limiter):
+        text = await asyncio.to_thread(self.local_ocr.image_to_text, image_path)
+        return ReceiptFields(self.local_ocr.parse_front_fields(text), ReceiptFields.empty().handwritten)
+
+
+def parse_routing(text):
+    """'a,b,c=local;d,e,f=cloud' → {필드: 경로} (적지 않은 필드는 cloud)"""
+    routing = {key: CLOUD for key in FIELDS}
+    for part in filter(None, (p.strip() for p in text.split(";"))):
+        keys, _, route = part.partition("=")
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError(f"필드 경로는 {', '.join(ROUTES)} 중 하나: {part}")
+        for key in filter(None, (k.strip() for k in keys.split(","))):
+            if key not in FIELDS:
+                raise ValueError(f"알 수 없는 필드: {key} ({', '.join(FIELDS)})")
+            routing[key] = route
+    return routing
+
+
+class RoutedBackend(OCRBackend):
+    """로컬 백엔드로 먼저 읽고, 클라우드 경로 필드와 로컬에서 못 읽은 필드만 클라우드 백엔드로 요청"""
+    name = "routed"
+
+    def __init__(self, local, cloud, routing=None):
+        self.local = local
+        self.cloud = cloud
+        self.routing = parse_routing(routing or FIELD_ROUTING) if not isinstance(routing, dict) else routing
+        self.local_only_count = 0   # 클라우드 호출 없이 끝난 영수증 수
+        self.cloud_count = 0
+
+    async def extract_async(self, image_path, limiter):
+        result = ReceiptFields.empty()
+        if any(route != CLOUD for route in self.routing.values()):
+            try:
+                local = await self.local.extract_async(image_path, limiter)
+            except Exception as e:  # 로컬 OCR 실패는 클라우드로 처리
+                print(f"로컬 OCR 실패 (클라우드 사용) {os.path.basename(image_path)}: {e}")
+                local = ReceiptFields.empty()
+            for key, route in self.routing.items():
+                if route != CLOUD:
+                    result.set(key, local.get(key))
+
+        missing = [key for key, route in self.routing.items()
+                   if route == CLOUD or (route == LOCAL and result.get(key) in ("", None))]
+        if not missing:
+            self.local_only_count += 1
+            return result
+        self.cloud_count += 1
+        cloud = await self.cloud.extract_fields_async(image_path, limiter, missing, result)
+        for key in missing:
+            result.set(key, cloud.get(key))
+        return result
+
+    def summary(self):
+        return f"로컬 OCR: {self.local_only_count}장은 API 호출 없이 처리, {self.cloud_count}장은 클라우드 사용"
+
+
+class PooledBackend(OCRBackend):
+    """key_pool.KeyPool 의 키를 요청마다 빌려서 해당 공급자 백엔드로 추출
+    (엔진이 넘겨 주는 limiter 대신 키별 TokenBucket 사용 → 키마다 RPM/TPM 한도)"""
+    name = "pooled"
+
+    def __init__(self, pool, mode=None):
+        self.pool = pool
+        self.mode = mode
+        self._backends = {}  # API 키 → 공급자 백엔드
+
+    def backend_for(self, key):
+        backend = self._backends.get(key.api_key)
+        if backend is None:
+            backend = self._backends[key.api_key] = create(key.provider, api_key=key.api_key, mode=self.mode)
+        return backend
+
+    async def extract_async(self, image_path, limiter):
+        async with self.pool.lease() as key:
+            return await self.backend_for(key).extract_async(image_path, key.bucket)
+
+    async def extract_fields_async(self, image_path, limiter, fields, known):
+        async with self.pool.lease() as key:
+            return await self.backend_for(key).extract_fields_async(image_path, key.bucket, fields, known)
+
+    def summary(self):
+        return self.pool.summary()
+
+
+def pipeline_for_key(api_key):
+    """API 키 접두어 → (클라우드 백엔드 이름, 파이프라인 모듈 이름), 모르는 키면 None"""
+    for prefix, backend, module in PIPELINES:
+        if api_key.startswith(prefix):
+            return backend, module
+    return None
+
+
+def default_backend(api_key, mode=None, pool=None):
+    """API 키에 맞는 클라우드 백엔드 (pool 에 키가 여러 개면 PooledBackend),
+    RECEIPTS_LOCAL_OCR 이 설정되어 있으면 필드별 로컬/클라우드 라우팅"""
+    if pool is not None and len(pool) > 1:
+        cloud = PooledBackend(pool, mode)
+    else:
+        pipeline = pipeline_for_key(api_key)
+        if pipeline is None:
+            raise ValueError("API 키 형식을 알 수 없습니다 (sk-... 또는 AIza...).")
+        cloud = create(pipeline[0], api_key=api_key, mode=mode)
+    if not LOCAL_ENGINE:
+        return cloud
+    try:
+        local = create(LOCAL_ENGINE)
+        if LOCAL_ENGINE == TesseractBackend.name and not local.local_ocr.is_available():
+            raise RuntimeError("pytesseract / tesseract 실행파일을 찾을 수 없습니다")
+    except Exception as e:
+        print(f"로컬 OCR 을 사용할 수 없어 클라우드만 사용: {e}")
+        return cloud
+    return RoutedBackend(local, cloud)
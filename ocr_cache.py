@@ -0,0 +1,181 @@
+# === 모듈: ocr_cache.py ===
+# OCR 결과 디스크 캐시 (SQLite)
+# - 키: 이미지 바이트 SHA-256 + (모델명 + 프롬프트) 해시
+# - 같은 영수증을 다시 넣으면 API 호출 없이 바로 결과 반환
+# - 용량 기준 LRU 삭제, 프롬프트 변경 시 전체 무효화 지원
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "RECEIPTS_OCR_CACHE",
+    os.path.join(os.path.expanduser("~"), ".receipts-auto", "ocr_cache.sqlite3"),
+)
+DEFAULT_MAX_BYTES = int(os.getenv("RECEIPTS_OCR_CACHE_MB", "200")) * 1024 * 1024
+
+
+def hash_bytes(data: bytes) -> str:
+    """이미지 바이트의 SHA-256 (hex)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def prompt_hash(model: str, *prompts: str) -> str:
+    """모델명 + 프롬프트 문자열들로 프롬프트 버전 해시 생성"""
+    h = hashlib.sha256(model.encode("utf-8"))
+    for prompt in prompts:
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class OCRCache:
+    """스레드 안전한 SQLite 기반 OCR 결과 캐시"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    image_hash  TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    value       TEXT NOT NULL,
+                    size        INTEGER NOT NULL,
+                    last_used   REAL NOT NULL,
+                    PRIMARY KEY (image_hash, prompt_hash)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache(last_used)"
+            )
+            self._conn.commit()
+            self._total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM ocr_cache"
+            ).fetchone()[0]
+
+    def get(self, image_hash, prompt_key):
+        """캐시 조회. 없으면 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM ocr_cache WHERE image_hash=? AND prompt_hash=?",
+                (image_hash, prompt_key),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE ocr_cache SET last_used=? WHERE image_hash=? AND prompt_hash=?",
+                (time.time(), image_hash, prompt_key),
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, image_hash, prompt_key, value):
+        """결과 저장 후 용량 초과 시 오래된 항목부터 삭제"""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8")) + len(image_hash) + len(prompt_key)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM ocr_cache WHERE image_hash=? AND prompt_hash=?",
+                (image_hash, prompt_key),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache VALUES (?, ?, ?, ?, ?)",
+                (image_hash, prompt_key, data, size, time.time()),
+            )
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """max_bytes 이하가 될 때까지 LRU 순서로 삭제 (lock 안에서 호출)"""
+        while self._total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT image_hash, prompt_hash, size FROM ocr_cache ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total = 0
+                return
+            for image_hash, prompt_key, size in rows:
+                self._conn.execute(
+                    "DELETE FROM ocr_cache WHERE image_hash=? AND prompt_hash=?",
+                    (image_hash, prompt_key),
+                )
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    return
+
+    def invalidate(self, prompt_key=None):
+        """prompt_key 항목만 삭제. None이면 전체 삭제"""
+        with self._lock:
+            if prompt_key is None:
+                self._conn.execute("DELETE FROM ocr_cache")
+            else:
+                self._conn.execute("DELETE FROM ocr_cache WHERE prompt_hash=?", (prompt_key,))
+            self._conn.commit()
+            self._total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM ocr_cache"
+            ).fetchone()[0]
+
+    def invalidate_except(self, current_prompt_keys):
+        """현재 프롬프트 버전이 아닌 항목 전체 삭제 (프롬프트 수정 후 정리용)"""
+        keys = list(current_prompt_keys)
+        with self._lock:
+            if keys:
+                marks = ",".join("?" for _ in keys)
+                self._conn.execute(f"DELETE FROM ocr_cache WHERE prompt_hash NOT IN ({marks})", keys)
+            else:
+                self._conn.execute("DELETE FROM ocr_cache")
+            self._conn.commit()
+            self._total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM ocr_cache"
+            ).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        return {"entries": count, "bytes": self._total, "max_bytes": self.max_bytes, "path": self.path}
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_cache():
+    """프로세스 공용 캐시 인스턴스
+    RECEIPTS_OCR_CACHE=off 이거나 파일을 열 수 없으면 메모리 캐시 사용
+    (디스크에는 남기지 않지만 한 번 실행 중 같은 이미지를 두 번 보내지는 않음)"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            if DEFAULT_CACHE_PATH.lower() in ("off", "0", "none"):
+                _shared_cache = OCRCache(":memory:")
+            else:
+                try:
+                    _shared_cache = OCRCache()
+                except (sqlite3.Error, OSError) as e:
+                    print(f"OCR 캐시 파일을 열 수 없습니다 (메모리 캐시 사용): {e}")
+                    _shared_cache = OCRCache(":memory:")
+        return _shared_cache
+
+
+if __name__ == "__main__":
+    # python ocr_cache.py [--stats | --clear]
+    cache = get_cache()
+    if cache.path == ":memory:":
+        print("OCR 디스크 캐시가 비활성화되어 있습니다.")
+    elif "--clear" in sys.argv:
+        cache.invalidate()
+        print(f"OCR 캐시를 비웠습니다: {cache.path}")
+    else:
+        print(cache.stats())
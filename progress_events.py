@@ -0,0 +1,135 @@
+# === 모듈: progress_events.py ===
+# 진행 상황 이벤트: 완료/전체 영수증 수, 처리 중(API 호출 중) 건수, 최근 처리 속도(장/초), 남은 시간, API 오류 수
+# - OCR 엔진(async_engine)이 영수증이 끝날 때, API 호출이 시작·종료될 때, API 오류가 날 때 ProgressTracker 갱신
+# - 리스너 호출은 interval 초에 한 번으로 합침 (단계가 바뀔 때와 마지막 상태는 바로 전달)
+# - 단계: 준비(중복 검사·사전 분류, 전체 수 모름) → OCR → 엑셀 → 완료
+import os
+import time
+import threading
+from collections import deque
+from typing import NamedTuple
+
+PREPARE = "prepare"
+OCR = "ocr"
+EXCEL = "excel"
+DONE = "done"
+PHASE_NAMES = {PREPARE: "이미지 확인 중", OCR: "영수증 인식 중", EXCEL: "엑셀 파일 작성 중", DONE: "완료"}
+
+INTERVAL = float(os.getenv("RECEIPTS_PROGRESS_INTERVAL", "0.25"))  # 리스너 최소 호출 간격(초)
+RATE_WINDOW = 30.0  # 처리 속도 계산 구간(초) — 최근 속도로 남은 시간 추정
+
+
+def units(item):
+    """작업 항목 1개의 영수증 장 수 (묶음 호출의 ReceiptPack 등 tuple 은 장 수)"""
+    return len(item) if isinstance(item, tuple) else 1
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}초"
+    if seconds < 3600:
+        return f"{seconds // 60}분 {seconds % 60:02d}초"
+    return f"{seconds // 3600}시간 {seconds % 3600 // 60:02d}분"
+
+
+class ProgressEvent(NamedTuple):
+    phase: str
+    completed: int      # 끝난 영수증 (실패 포함)
+    total: int          # 이번 배치에서 처리할 영수증 (0 이면 아직 모름)
+    in_flight: int      # API 호출 중인 작업 수
+    rate: float         # 최근 처리 속도 (장/초)
+    eta: float          # 남은 시간(초), 속도를 아직 모르면 None
+    errors: int         # API 오류 (재시도된 호출 포함)
+    failed: int         # 끝내 실패한 영수증
+    elapsed: float
+
+    @property
+    def fraction(self):
+        return self.completed / self.total if self.total else 0.0
+
+    def text(self):
+        """한 줄 요약 (GUI 진행 화면·CLI 출력)"""
+        if self.phase != OCR:
+            return PHASE_NAMES.get(self.phase, self.phase)
+        parts = [f"{self.completed}/{self.total}장", f"처리 중 {self.in_flight}건"]
+        if self.rate:
+            parts.append(f"{self.rate:.1f}장/초")
+        parts.append(f"남은 시간 약 {format_duration(self.eta)}" if self.eta is not None else "남은 시간 계산 중")
+        if self.errors:
+            parts.append(f"API 오류 {self.errors}건")
+        if self.failed:
+            parts.append(f"실패 {self.failed}장")
+        return " · ".join(parts)
+
+
+class ProgressTracker:
+    """진행 상황 집계 (스레드 안전). listener(ProgressEvent) 는 interval 초에 최대 1번 + 단계 변경·flush 때"""
+
+    def __init__(self, listener=None, interval=INTERVAL):
+        self.listener = listener
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_emit = 0.0
+        self.phase = PREPARE
+        self.completed = 0
+        self.total = 0
+        self.in_flight = 0
+        self.errors = 0
+        self.failed = 0
+        self._done_times = deque()  # (시각, 장 수) — 최근 RATE_WINDOW 초
+
+    def set_phase(self, phase, total=None):
+        with self._lock:
+            self.phase = phase
+            if total is not None:
+                self.total, self.completed, self.failed = total, 0, 0
+                self._done_times.clear()
+                self._started = time.monotonic()
+        self.flush()
+
+    def done(self, item, ok=True):
+        now = time.monotonic()
+        count = units(item)
+        with self._lock:
+            self.completed += count
+            if not ok:
+                self.failed += count
+            self._done_times.append((now, count))
+        self._maybe_emit(now)
+
+    def set_in_flight(self, count):
+        with self._lock:
+            self.in_flight = count
+        self._maybe_emit(time.monotonic())
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+        self._maybe_emit(time.monotonic())
+
+    def event(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._done_times and now - self._done_times[0][0] > RATE_WINDOW:
+                self._done_times.popleft()
+            window = min(RATE_WINDOW, now - self._started)
+            done = sum(count for _, count in self._done_times)
+            rate = done / window if done and window > 0 else 0.0
+            remaining = max(0, self.total - self.completed)
+            eta = remaining / rate if rate else (0.0 if self.total and not remaining else None)
+            return ProgressEvent(self.phase, self.completed, self.total, self.in_flight, rate, eta,
+                                 self.errors, self.failed, now - self._started)
+
+    def flush(self):
+        """합쳐 둔 변경을 바로 전달"""
+        self._last_emit = time.monotonic()
+        if self.listener:
+            self.listener(self.event())
+
+    def _maybe_emit(self, now):
+        if self.listener is None or now - self._last_emit < self.interval:
+            return
+        self._last_emit = now
+        self.listener(self.event())
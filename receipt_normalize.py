@@ -0,0 +1,124 @@
+# === 모듈: receipt_normalize.py ===
+# OCR 원문(영수증에 인쇄된 그대로의 문자열) → 정규화된 값 (로컬, 미리 컴파일한 정규식)
+# - 거래일시: '거래일시:25-07-22(화) 15:06:04', '[일시] 2025/07/14 11:43', '2025년 7월 22일 오후 3:06',
+#   '20250722 150604', '14:32 2025/07/01'(시간이 앞) 등 → 'YYYY-MM-DD HH:MM' (초는 버림, 시간이 없으면 "")
+#   모델 응답을 읽지 못하면 원문을 한 번 출력 (warn=True, 엑셀에서 빠지는 행을 알 수 있게)
+# - 금액: '12,700원', '₩ 12,700', '합계 12,700', 7500 → 7500 (정수, 숫자가 없으면 "")
+#   숫자가 여럿이면 합계·결제금액 등의 뒤 숫자, 없으면 마지막 쉼표 숫자 (카드번호·부가세·공급가액은 제외)
+# - 모델은 원문만 돌려주고 형식 변환은 여기서 → 프롬프트의 변환 예시·출력 토큰 절약
+# - 예시: test_receipt_normalize.py (python -m pytest), 속도: python bench_normalize.py
+import re
+
+# 날짜: 구분자(- / . 년월일) 형식, 또는 붙여 쓴 YYYYMMDD (뒤에 붙여 쓴 HHMM[SS] 시간 허용)
+# 요일 '(화)' / '화요일', 시간 '15:06[:04]' / '15시 06분', 오전·오후·AM·PM 은 선택
+_DATE = (
+    r"(?<!\d)(?:(?P<y>(?:19|20)?\d{2})\s*[-./년]\s*(?P<m>\d{1,2})\s*[-./월]\s*(?P<d>\d{1,2})(?!\d)\s*[.일]?"
+    r"|(?P<cy>20\d{2})(?P<cm>\d{2})(?P<cd>\d{2})(?:[\sT]*(?P<cH>\d{2})(?P<cM>\d{2})(?:\d{2})?)?(?!\d))"
+    r"(?:\s*[(\[]?\s*[월화수목금토일](?:요일)?\s*[)\]]?)?"
+)
+_TIME = (
+    r"(?P<ap>오전|오후|AM|PM|am|pm)?\s*"
+    r"(?<!\d)(?P<H>\d{1,2})\s*(?::|시)\s*(?P<M>\d{2})\s*분?(?:\s*:\s*\d{2}|\s*\d{2}\s*초)?"
+    r"(?:\s*(?P<ap2>AM|PM|am|pm)(?![A-Za-z]))?"
+)
+_DATETIME = re.compile(_DATE + r"(?:[\sT,]*" + _TIME + ")?")
+# 시간이 날짜 앞에 오는 영수증 ('14:32 2025/07/01'), 날짜 뒤에 시간이 없을 때만 사용
+_TIME_DATE = re.compile(_TIME + r"[\s,]*" + _DATE)
+_AMOUNT = re.compile(r"-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d+(?:\.\d+)?")
+# 합계 금액 앞에 오는 말 (local_ocr 의 합계 줄 찾기에도 사용)
+TOTAL_KEYWORD = re.compile(r"(합\s*계|결제\s*금액|승인\s*금액|받을\s*금액|총\s*액|총\s*금액|결제\s*요금|판매\s*금액)")
+# 합계가 아닌 금액(세액·공급가액) 앞에 오는 말
+_PART_KEYWORD = re.compile(r"부가\s*세|부가가치세|공급\s*가액|과\s*세|면\s*세|봉사료|VAT", re.IGNORECASE)
+# 카드번호·승인번호처럼 숫자가 '-'·'*' 로 이어진 토큰 ('4518-44**-****-1234', '4518-44')
+_CARD_NUMBER = re.compile(r"[\d*]+(?:-[\d*]+)+|\d*\*[\d*]*")
+_PM = ("오후", "PM", "pm")
+_AM = ("오전", "AM", "am")
+
+
+def _parts(match):
+    """정규식 결과 → (년, 월, 일, 시, 분) (시간이 없으면 시·분 None), 없는 날짜·시간이면 None"""
+    if match["cy"]:
+        year, month, day = int(match["cy"]), int(match["cm"]), int(match["cd"])
+    else:
+        year, month, day = int(match["y"]), int(match["m"]), int(match["d"])
+    if year < 100:
+        year += 2000
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    if match["cH"] is not None:
+        hour, minute = int(match["cH"]), int(match["cM"])
+    elif match["H"] is not None:
+        hour, minute = int(match["H"]), int(match["M"])
+    else:
+        return year, month, day, None, None
+    meridiem = match["ap"] or match["ap2"]
+    if meridiem in _PM and hour < 12:
+        hour += 12
+    elif meridiem in _AM and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return year, month, day, hour, minute
+
+
+def parse_datetime_parts(text):
+    """문자열의 첫 날짜 → (년, 월, 일, 시, 분). 시간이 있는 날짜를 우선 (날짜 뒤 → 날짜 앞 시간 순),
+    시간이 없으면 시·분 None, 날짜가 없으면 None"""
+    text = str(text or "")
+    date_only = None
+    for match in _DATETIME.finditer(text):
+        parts = _parts(match)
+        if parts is None:
+            continue
+        if parts[3] is not None:
+            return parts
+        date_only = date_only or parts
+    if date_only is not None:
+        for match in _TIME_DATE.finditer(text):
+            parts = _parts(match)
+            if parts is not None:
+                return parts
+    return date_only
+
+
+_unparsed = set()
+
+
+def normalize_datetime(text, warn=False):
+    """거래일시 원문 → 'YYYY-MM-DD HH:MM' (시간까지 있어야 함, 없으면 "")
+    warn: 비어 있지 않은 원문을 읽지 못하면 원문을 출력 (같은 원문은 한 번만, 모델 응답 변환용)"""
+    parts = parse_datetime_parts(text)
+    if parts is None or parts[3] is None:
+        raw = str(text or "").strip()
+        if warn and raw and raw not in _unparsed:
+            _unparsed.add(raw)
+            print(f"거래일시 형식을 읽지 못함 (엑셀 일자 없음): {raw!r}")
+        return ""
+    return "%04d-%02d-%02d %02d:%02d" % parts
+
+
+def normalize_amount(value):
+    """금액 원문 → 정수 (쉼표·'원'·'₩' 무시, 소수점 이하 버림), 숫자가 없으면 빈 문자열
+    숫자가 여럿이면: 합계·결제금액 등의 뒤 숫자(여럿이면 마지막) → 세액·공급가액이 아닌 마지막 쉼표 숫자 → 첫 숫자
+    카드번호처럼 '-'·'*' 로 이어진 숫자는 금액으로 보지 않음"""
+    if isinstance(value, bool):
+        return ""
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = _CARD_NUMBER.sub(" ", str(value or ""))
+    first = total = grouped = None
+    start = 0
+    for match in _AMOUNT.finditer(text):
+        amount = match.group()
+        before = text[start:match.start()]  # 앞 숫자와 이 숫자 사이의 말
+        start = match.end()
+        if first is None:
+            first = amount
+        if TOTAL_KEYWORD.search(before):
+            total = amount
+        elif "," in amount and not _PART_KEYWORD.search(before):
+            grouped = amount
+    amount = total or grouped or first
+    if amount is None:
+        return ""
+    return int(float(amount.replace(",", "")))
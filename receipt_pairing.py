@@ -0,0 +1,57 @@
+# === 모듈: receipt_pairing.py ===
+# 앞면(인쇄된 영수증) / 뒷면(손글씨 직원명·경로) 이미지 짝짓기
+# 모든 이미지를 한 번씩 분류한 뒤, 파일명 순서 + 촬영시각 근접도로 한 번에 매칭
+import os
+import re
+import bisect
+from datetime import datetime
+
+FRONT = "front"
+BACK = "back"
+UNKNOWN = "unknown"
+
+PAIR_WINDOW_SEC = 30 * 60  # 앞면-뒷면 촬영시각 차이 허용 범위
+
+_FILENAME_TS = re.compile(r"(\d{8})_(\d{6})(\d{3})?")  # KakaoTalk_20250725_085027180_01.jpg
+
+
+def capture_time(path):
+    """파일명 타임스탬프(YYYYMMDD_HHMMSSmmm) → 없으면 None
+    (파일 수정시각은 복사/다운로드 시 바뀌므로 사용하지 않음)"""
+    match = _FILENAME_TS.search(os.path.basename(path))
+    if match:
+        try:
+            ts = datetime.strptime(match.group(1) + match.group(2), "%Y%m%d%H%M%S").timestamp()
+            return ts + int(match.group(3) or 0) / 1000.0
+        except ValueError:
+            pass
+    return None
+
+
+def pair_front_back(files, kinds, window=PAIR_WINDOW_SEC):
+    """files: 파일명 순으로 정렬된 경로, kinds: 각 이미지의 FRONT/BACK/UNKNOWN
+    각 앞면에 그 뒤에 오는 첫 번째 미사용 뒷면을 짝지음 (촬영시각 차이가 window 초과면 짝 없음)
+    → {앞면 인덱스: 뒷면 인덱스 또는 None} (앞면 순서대로)"""
+    backs = [i for i, kind in enumerate(kinds) if kind == BACK]  # 아직 짝이 없는 뒷면 (정렬 상태 유지)
+    times = {}
+
+    def time_of(i):
+        if i not in times:
+            times[i] = capture_time(files[i])
+        return times[i]
+
+    pairs = {}
+    for i, kind in enumerate(kinds):
+        if kind != FRONT:
+            continue
+        pairs[i] = None
+        pos = bisect.bisect_right(backs, i)
+        if pos == len(backs):
+            continue
+        j = backs[pos]
+        front_time, back_time = time_of(i), time_of(j)
+        if front_time is not None and back_time is not None and abs(back_time - front_time) > window:
+            continue
+        pairs[i] = j
+        del backs[pos]
+    return pairs
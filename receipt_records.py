@@ -0,0 +1,296 @@
+# === 모듈: receipt_records.py ===
+# OCR 단계 → 엑셀 단계로 바로 넘기는 영수증 레코드
+# - OCR 모듈은 Receipt 리스트를 반환하고, generate_excel 은 이를 그대로 받아 저장
+# - ReceiptBatch: 열 단위 배열로 직원별/용도별/일자별 합계를 한 번에 계산
+# - 교통비내역.txt / 직원별합계.txt / results_*.csv 는 선택적인 부가 출력 (백그라운드 스레드에서 기록)
+import os
+import csv
+import threading
+from array import array
+from enum import Enum
+from typing import NamedTuple
+from datetime import datetime
+
+try:  # 있으면 집계에 사용 (없어도 array 로 동작)
+    import numpy as np
+except ImportError:
+    np = None
+
+DETAILS_TXT = "교통비내역.txt"
+SUMMARY_TXT = "직원별합계.txt"
+DETAIL_HEADER = ["영수증번호", "사용일자", "직원명", "업무내용", "출발-도착", "사용요금", "비고"]
+CSV_HEADER = ["filename", "date", "purpose", "company", "price", "worker", "note"]
+
+SIDE_OUTPUT_FORMATS = ("txt", "csv")
+# 부가 출력 형식: "txt,csv" / "none" (없으면 OCR 모듈별 기본값)
+SIDE_OUTPUTS_ENV = os.getenv("RECEIPTS_SIDE_OUTPUTS")
+
+
+class Purpose(Enum):
+    """업무내용 / 용도구분 (GPT 교통비: 외근·야근, Gemini 식대: 용도구분 9종)"""
+    OUTSIDE = "외근"
+    NIGHT = "야근"
+    OUTSIDE_MEAL = "외근식대"
+    NIGHT_MEAL = "야근식대"
+    FUEL = "유류대"
+    TOLL = "통행료"
+    DAY_MEAL = "주간식대"
+    TRANSPORT = "교통비"
+    LODGING = "숙박비"
+    DINNER = "회식비"
+    SNACK = "부서간식대"
+    OTHER = "기타"
+
+    @classmethod
+    def parse(cls, text):
+        text = (text or "").strip()
+        return _PURPOSES.get(text, cls.OTHER)
+
+
+_PURPOSES = {p.value: p for p in Purpose}
+_PURPOSES["숙박료"] = Purpose.LODGING  # 프롬프트 본문 표기
+
+
+def parse_amount(text):
+    """'12,000원' / 12000 → 12000 (숫자가 아니면 None)"""
+    if isinstance(text, int):
+        return text
+    try:
+        return int(str(text).replace(",", "").replace("원", "").strip())
+    except ValueError:
+        return None
+
+
+def parse_datetime(text):
+    """OCR 거래일시 'YYYY-MM-DD HH:MM' (또는 날짜만) → datetime, 실패 시 None"""
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(text).strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class Receipt:
+    """영수증 1건 = 교통비내역 한 줄
+    파싱된 값(when/amount/purpose)과 OCR 원문(*_text)을 함께 보관
+    (엑셀은 파싱된 값, 텍스트/CSV 부가 출력은 원문 사용)"""
+    __slots__ = ("source", "receipt_no", "when", "date_text", "employee", "purpose", "purpose_text",
+                 "route", "amount", "amount_text", "note", "duplicate_of")
+
+    def __init__(self, source="", receipt_no="", when=None, date_text="", employee="", purpose_text="",
+                 route="", amount_text="", note=""):
+        self.source = source            # 이미지 파일명
+        self.receipt_no = receipt_no    # 영수증번호
+        self.when = when                # 거래일시 (datetime 또는 None)
+        self.date_text = date_text      # 사용일자 표시용 원문
+        self.employee = employee        # 직원명 / 야근자
+        self.purpose_text = purpose_text
+        self.purpose = Purpose.parse(purpose_text)
+        self.route = route              # 출발-도착 (Gemini 식대 모드는 업체명)
+        self.amount_text = str(amount_text)
+        self.amount = parse_amount(amount_text)  # 원 단위 정수 또는 None
+        self.note = note                # 비고
+        self.duplicate_of = None        # 같은 거래로 의심되는 기존 영수증 (transaction_index.Match)
+
+    def __repr__(self):
+        return (f"Receipt({self.receipt_no!r}, {self.when}, {self.employee!r}, {self.purpose.value}, "
+                f"{self.amount})")
+
+    def detail_row(self):
+        """엑셀 교통비내역 한 줄 (날짜는 date, 금액은 int → 템플릿 서식·합계 수식 적용)"""
+        purpose = self.purpose_text if self.purpose is Purpose.OTHER else self.purpose.value
+        return [self.receipt_no,
+                self.when.date() if self.when else self.date_text,
+                self.employee, purpose, self.route,
+                self.amount if self.amount is not None else self.amount_text,
+                self.note]
+
+    def text_row(self):
+        """교통비내역.txt 한 줄 (기존 형식)"""
+        return [self.receipt_no, self.date_text, self.employee, self.purpose_text, self.route,
+                self.amount_text, self.note]
+
+    def csv_row(self):
+        return [self.source, self.date_text, self.purpose_text, self.route, self.amount_text,
+                self.employee, self.note]
+
+
+def transport_record(front_path, front_info, back_info):
+    """앞면(거래일시·결제요금) + 뒷면(직원명·경로) → 교통비 레코드
+    17:30 이전 결제는 외근, 이후는 야근"""
+    when = parse_datetime(front_info.get("date", ""))
+    month_day, task = "", ""
+    if when:
+        month_day = f"{when.month}월 {when.day}일"
+        task = "외근" if when.hour < 17 or (when.hour == 17 and when.minute <= 30) else "야근"
+    name = os.path.basename(front_path)
+    return Receipt(
+        source=name,
+        receipt_no=os.path.splitext(name)[0],
+        when=when,
+        date_text=month_day,
+        employee=back_info["employee"],
+        purpose_text=task,
+        route=back_info["route"],
+        amount_text=front_info["price"],
+    )
+
+
+# ===== 열 단위 집계 =====
+class Totals(NamedTuple):
+    employee: dict   # {직원명: 금액}
+    purpose: dict    # {Purpose: 금액}
+    day: dict        # {date: 금액}
+
+
+class ReceiptBatch:
+    """Receipt 리스트를 열 단위 배열(array, numpy 있으면 numpy)로 보관하고 한 번에 집계
+    직원명·날짜는 사전 인코딩(코드 배열 + 값 목록), 값이 없으면 코드 -1"""
+
+    def __init__(self, records):
+        self.records = records
+        self.employees, self.days = [], []
+        employee_codes, day_codes = {}, {}
+        purposes = list(Purpose)
+        purpose_codes = {p: i for i, p in enumerate(purposes)}
+        self.purposes = purposes
+        self.employee = array("l")
+        self.purpose = array("b")
+        self.day = array("l")
+        self.amount = array("q")
+        self.valid = array("b")  # 금액 파싱 성공 여부
+
+        for record in records:
+            self.employee.append(self._code(record.employee, employee_codes, self.employees))
+            self.day.append(self._code(record.when.date() if record.when else None, day_codes, self.days))
+            self.purpose.append(purpose_codes[record.purpose])
+            self.amount.append(record.amount or 0)
+            self.valid.append(record.amount is not None)
+
+    @staticmethod
+    def _code(value, codes, values):
+        if not value:
+            return -1
+        if value not in codes:
+            codes[value] = len(values)
+            values.append(value)
+        return codes[value]
+
+    def __len__(self):
+        return len(self.records)
+
+    def totals(self):
+        """직원별 / 용도별 / 일자별 합계를 한 번에 계산 (금액을 읽은 건만, 한 건이라도 있는 항목만)"""
+        sums = self._sums_numpy() if np is not None else self._sums_python()
+        (emp, emp_n), (pur, pur_n), (day, day_n) = sums
+        return Totals(
+            employee={name: int(emp[i]) for i, name in enumerate(self.employees) if emp_n[i]},
+            purpose={p: int(pur[i]) for i, p in enumerate(self.purposes) if pur_n[i]},
+            day={d: int(day[i]) for i, d in enumerate(self.days) if day_n[i]},
+        )
+
+    def _sums_numpy(self):
+        """코드별 (합계, 건수) — np.bincount 로 열마다 한 번씩"""
+        amount = np.frombuffer(self.amount, dtype=np.int64)
+        valid = np.frombuffer(self.valid, dtype=np.int8).astype(bool)
+        out = []
+        for codes, size in ((self.employee, len(self.employees)), (self.purpose, len(self.purposes)),
+                            (self.day, len(self.days))):
+            codes = np.frombuffer(codes, dtype=np.dtype(f"i{codes.itemsize}")).astype(np.intp)
+            mask = valid & (codes >= 0)
+            # 금액 합계는 정수로 (bincount weights 는 float64 라 2^53 이하에서 정확)
+            total = np.bincount(codes[mask], weights=amount[mask], minlength=size).astype(np.int64)
+            out.append((total, np.bincount(codes[mask], minlength=size)))
+        return out
+
+    def _sums_python(self):
+        """numpy 가 없을 때: 배열을 한 번 훑으면서 세 가지 합계를 동시에"""
+        emp, emp_n = [0] * len(self.employees), [0] * len(self.employees)
+        pur, pur_n = [0] * len(self.purposes), [0] * len(self.purposes)
+        day, day_n = [0] * len(self.days), [0] * len(self.days)
+        for e, p, d, a, ok in zip(self.employee, self.purpose, self.day, self.amount, self.valid):
+            if not ok:
+                continue
+            pur[p] += a
+            pur_n[p] += 1
+            if e >= 0:
+                emp[e] += a
+                emp_n[e] += 1
+            if d >= 0:
+                day[d] += a
+                day_n[d] += 1
+        return [(emp, emp_n), (pur, pur_n), (day, day_n)]
+
+
+def employee_totals(records):
+    """{직원명: 합계금액(int)} (직원명·금액이 있는 레코드만, 처음 나온 순서)"""
+    return ReceiptBatch(records).totals().employee
+
+
+def format_won(amount):
+    return f"{amount:,}원"
+
+
+# ===== 부가 출력 =====
+def write_text_files(output_text_folder, records):
+    """기존 형식의 교통비내역.txt / 직원별합계.txt"""
+    with open(os.path.join(output_text_folder, DETAILS_TXT), "w", encoding="utf-8") as f:
+        f.write("\t".join(DETAIL_HEADER) + "\n")
+        for record in records:
+            f.write("\t".join(str(item) for item in record.text_row()) + "\n")
+    with open(os.path.join(output_text_folder, SUMMARY_TXT), "w", encoding="utf-8") as f:
+        f.write("직원명\t총액\n")
+        for name, total in employee_totals(records).items():
+            f.write(f"{name}\t{format_won(total)}\n")
+
+
+def write_csv(path, records):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for record in records:
+            writer.writerow(record.csv_row())
+
+
+def side_output_formats(default):
+    """RECEIPTS_SIDE_OUTPUTS 환경변수가 있으면 우선, 없으면 default"""
+    value = SIDE_OUTPUTS_ENV if SIDE_OUTPUTS_ENV is not None else ",".join(default)
+    return tuple(f for f in (v.strip().lower() for v in value.split(",")) if f in SIDE_OUTPUT_FORMATS)
+
+
+def write_side_outputs(output_text_folder, records, formats):
+    """부가 출력을 백그라운드 스레드에서 기록 (엑셀 저장과 동시에 진행)
+    → 시작된 Thread 반환 (formats 가 비어 있으면 None)"""
+    if not formats:
+        return None
+    records = list(records)
+
+    def work():
+        try:
+            if "txt" in formats:
+                write_text_files(output_text_folder, records)
+            if "csv" in formats:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                path = os.path.join(output_text_folder, f"results_{timestamp}.csv")
+                write_csv(path, records)
+                print(f"{path}에 저장완료!")
+        except Exception as e:
+            print(f"❌ 부가 출력 저장 중 오류 발생: {e}")
+
+    thread = threading.Thread(target=work, name="side-outputs")
+    thread.start()
+    return thread
+
+
+def read_text_files(output_text_folder):
+    """이전 버전이 남긴 교통비내역.txt → 레코드 리스트 (텍스트 결과 폴더로 엑셀 다시 만들기용)"""
+    records = []
+    with open(os.path.join(output_text_folder, DETAILS_TXT), "r", encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            fields = (line.rstrip("\n").split("\t") + [""] * len(DETAIL_HEADER))[:len(DETAIL_HEADER)]
+            receipt_no, date, employee, purpose, route, amount, note = fields
+            records.append(Receipt(source=receipt_no, receipt_no=receipt_no, date_text=date, employee=employee,
+                                   purpose_text=purpose, route=route, amount_text=amount, note=note))
+    return records
@@ -0,0 +1,264 @@
+# === 모듈: receipt_schema.py ===
+# 영수증 a~i 필드 구조화 출력 (pydantic 모델 1곳에서 정의)
+# - Gemini: gemini_schema(모델) → response_schema (response_mime_type="application/json" 과 함께)
+# - OpenAI: openai_response_format(모델) → response_format json_schema (strict)
+# - parse_fields(응답, 모델): json.loads → 실패하면 json_repair 로 복구 → 모델 검증 (숫자·null·목록은 문자열로)
+#   복구할 수 없거나 잘린 응답에서 필드가 빠지면 json.JSONDecodeError → async_engine 이 파싱 오류로 재시도
+# - 응답마다 정상/복구/실패를 api_metrics 에 기록 (배치 요약·엑셀 'API 사용량' 시트의 파싱 실패율)
+# - FRONT_PROMPT / HANDWRITTEN_PROMPT (2회 호출), FIELDS_PROMPT (1회 호출): 식대 영수증 필드 설명
+#   (Gemini·OpenAI 가 같은 문구로 같은 뜻의 필드를 추출)
+# - RECEIPTS_RESPONSE_SCHEMA=off 이면 스키마 없이 프롬프트의 JSON 예시만 사용 (파싱·복구는 그대로)
+import os
+import json
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+import api_metrics
+import json_repair
+
+ENABLED = os.getenv("RECEIPTS_RESPONSE_SCHEMA", "on").lower() not in ("off", "0", "false")
+
+
+class _Fields(BaseModel):
+    """모든 필드는 문자열 (모델이 숫자·null·목록으로 줘도 문자열로 맞춤), 모르는 키는 무시"""
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _to_text(cls, value):
+        if value is None:
+            return ""
+        if isinstance(value, list):
+            return ", ".join(str(v) for v in value if v not in (None, ""))
+        return value
+
+
+class FrontFields(_Fields):
+    """프린트된 영수증 정보"""
+    a: str = Field("", description="거래일시 원문")
+    b: str = Field("", description="업체명")
+    c: str = Field("", description="금액 원문")
+    h: str = Field("", description="결제카드 정보")
+    i: str = Field("", description="결제주소 정보")
+
+
+class HandwrittenFields(_Fields):
+    """최상단 손글씨 정보"""
+    d: str = Field("", description="용도구분")
+    e: str = Field("", description="야근자")
+    f: str = Field("", description="비고")
+
+
+class ReceiptFields(_Fields):
+    """1회 호출(single)·묶음(packed) 응답: 프린트 + 손글씨 전체"""
+    a: str = Field("", description="거래일시 원문")
+    b: str = Field("", description="업체명")
+    c: str = Field("", description="금액 원문")
+    d: str = Field("", description="용도구분")
+    e: str = Field("", description="야근자")
+    f: str = Field("", description="비고")
+    h: str = Field("", description="결제카드 정보")
+    i: str = Field("", description="결제주소 정보")
+
+
+
+# ===== 식대 영수증 프롬프트 (Gemini·OpenAI 공용, 어느 공급자 키로 호출해도 필드 뜻이 같도록 1곳에서 정의) =====
+# 2회 호출(two_pass) 1단계: 프린트 정보 a/b/c/h/i
+FRONT_PROMPT = """
+                영수증에 최상단에는 hand-written 손글씨로 여러 정보가 있습니다.당신은 손글씨를 무시하고, 출력된 영수증에서만 여러 정보를 추출해야합니다.
+                a) 날짜 및 시간
+                b) 업체명
+                c) 금액
+                h) 결제카드 정보
+
+                ## a) 날짜 및 시간
+                - 거래(승인)일시를 영수증에 인쇄된 그대로 옮겨 적으세요. 형식은 바꾸지 마세요.
+
+                ## b) 업체명
+                - 영수증에 프린트되어있는 업체명(가맹점 등)을 추출해주세요. 최상단 손글씨를 보지 마세요.
+                - 업체명은 [날짜 및 시간] 근처에 있습니다. 예를 들어 2025-07-22 15:06 근처에 있습니다.
+                - '엔에이치엔케이씨피 주식회사', '양상관' 은 업체명이 아닙니다.
+                - 실제 사용처인 식당 등 가게이름으로 추출하세요.
+                ex) 청원, 남원전통추어탕, 탐앤탐스, 오토김밥, GS25 등
+
+                ## c) 금액
+                - 결제 금액(합계)을 인쇄된 그대로 옮겨 적으세요.
+                
+                ## h) 결제카드 정보
+                - 영수증의 카드정보를 불러오세요. 카드회사명과 카드소유주 이름, 카드번호를 추출하세요.
+                - ex)신한카드법인 451844*** 등입니다.
+
+                ## i) 결제주소 정보
+                - 영수증의 결제된 장소의 주소 정보를 불러오세요.
+                - ex)서울시 영등포구 버드나루로19길 6 등입니다.
+                
+                다음 JSON 형식으로 정확히 반환해주세요:
+                {"a": "...", "b": "...", "c": "...", "h": "...", "i": "..."}
+                """
+
+# 2회 호출 2단계: 손글씨 정보 d/e/f (front_info, card_info 를 format으로 채움)
+HANDWRITTEN_PROMPT = """영수증에 최상단에는 hand-written 손글씨로 여러 정보가 있습니다. 당신은 손글씨에서 정보를 추출해야합니다. 
+                프린터로 출력되어있는 영수증의 내용을 참고하여 d), f)를 작성하세요. 영수증의 내용은 {front_info} 입니다.
+                
+                ## 추출해야할 3가지 정보
+                - d) 용도구분 (외근식대, 야근식대, 유류대, 통행료, 주간식대, 교통비, 숙박비, 회식비, 부서간식대 중 1개)
+                - e) 야근자 (사람이름) - d)가 "야근식대"인경우만 작성해주세요. 야근식대가 아니면 없습니다.
+                - f) 비고 (법인카드 혹은 개인카드)
+
+                ## d) 용도구분 
+                - 외근식대, 야근식대, 유류대, 통행료, 주간식대, 교통비, 숙박비, 회식비, 부서간식대 중 1개입니다. 만약 본인이 분류할수 없다고 판단이 된다면(그럴일은 적겠지만) 손글씨 씌여진대로 작성하세요. 
+                - 영수증 최상단에 한글 손글씨로 써있습니다.
+                - 프린트된 영수증의 내용 를 참고하세요.
+                - 외근식대 : "외근" 혹은 "출장" "접대비" 써있습니다.
+                - 주간식대 : "주간식대"라고 써있습니다.
+                - 야근식대 : "야근식대"라고 써있습니다. 결제시간이 17시30분 이후이고 주소가 서울시 영등포구이면 야근식대입니다.
+                - 유류대 : "유류대"라고 써있습니다. 혹은 상호명이 주유소 등입니다.
+                - 통행료 : 하이플러스충전, 한국도로공사 등 써있습니다
+                - 숙박료 : 무인텔, 모텔 등 써있습니다.
+                - 교통비 : 동화운수, 콜택시, 택시 등 써있습니다.
+
+                ## e) 야근자 (사람이름) - 없을 수 있습니다. 없는 경우 빈칸("")으로 반환하세요
+                - b)가 "야근식대"인경우만 작성해주세요. 야근식대가 아니면 없습니다. 없는 경우 빈칸("")으로 반환하세요
+                - 사람이름 혹은 영어 이니셜 2글자로 되어있습니다. 
+                - 사람이름은 그대로 추출해주세요
+                    ```사람이름
+                    이인호
+                    이동혁
+                    양상관
+                    조준호
+                    안형범
+                    손근영
+                    오형석
+                    석영진
+                    이관희
+                    박주연
+                    ```
+                - 영어이니셜 2글자인 경우에는 아래를 참고해서 사람이름 3글자로 출력해주세요.
+                    ```영어 이니셜과 사람이름 매칭
+                    이인호 - IH
+                    이동혁 - DH
+                    양상관 - SK
+                    조준호 - JH
+                    안형범 - HB
+                    손근영 - KY
+                    오형석 - HS
+                    석영진 - YJ
+                    이관희 - GH
+                    박주연 - JY
+                    ```
+
+                ## f) 비고
+                - 영수증 최상단에 법인카드 혹은 개인카드 써있습니다. 
+                - {card_info}를 참고하세요.
+                - 추가정보로는 법인카드는 신한카드법인 법카라고 써있습니다.
+                - 신한카드법인 카드번호 451844로 시작하니 참고하세요. 
+                - 개인카드는 사람이름과 함께 아웃풋해주세요 ex) 개인카드(손근영) 
+                - 개인카드인 경우 영어 이니셜 2글자일 수 있습니다. 영어 이니셜과 사람이름 매칭을 참고해서 사람이름 3글자로 추출해주세요.
+                
+                어떤 상황에서도 아래 JSON 형식으로 정확히 반환해주세요:
+                {{"d": "...", "e": "...", "f": "..."}}
+                """
+
+# 1회 호출(single/packed): a~i 전체, d/e/f 규칙은 HANDWRITTEN_PROMPT 와 같음
+# (용도구분 9종, 야근자 이름·이니셜 표, 법인카드(451844)/개인카드(이름))
+FIELDS_PROMPT = """
+                영수증에는 프린터로 출력된 내용과, 최상단의 hand-written 손글씨가 함께 있습니다.
+                프린트된 내용에서 a), b), c), h), i)를, 손글씨에서 d), e), f)를 추출하세요.
+
+                ## 프린트된 영수증 (손글씨는 무시)
+                a) 날짜 및 시간 : 거래(승인)일시를 인쇄된 그대로 (형식 변환 없이)
+                b) 업체명
+                - 실제 사용처인 식당 등 가게이름 (ex. 청원, 남원전통추어탕, 탐앤탐스, 오토김밥, GS25)
+                - '엔에이치엔케이씨피 주식회사', '양상관' 은 업체명이 아닙니다.
+                c) 금액 : 결제 금액(합계)을 인쇄된 그대로
+                h) 결제카드 정보 (카드회사명, 카드소유주 이름, 카드번호 ex. 신한카드법인 451844***)
+                i) 결제주소 정보 (ex. 서울시 영등포구 버드나루로19길 6)
+
+                ## 손글씨 (프린트된 내용 참고)
+                d) 용도구분 : 외근식대, 야근식대, 유류대, 통행료, 주간식대, 교통비, 숙박비, 회식비, 부서간식대 중 1개
+                - 분류할 수 없으면 손글씨 씌여진대로 작성하세요.
+                - 외근식대 : "외근" 혹은 "출장" "접대비"
+                - 주간식대 : "주간식대"
+                - 야근식대 : "야근식대". 결제시간이 17시30분 이후이고 주소가 서울시 영등포구이면 야근식대입니다.
+                - 유류대 : "유류대" 혹은 상호명이 주유소 등
+                - 통행료 : 하이플러스충전, 한국도로공사 등
+                - 숙박비 : 무인텔, 모텔 등
+                - 교통비 : 동화운수, 콜택시, 택시 등
+                e) 야근자 : d)가 "야근식대"인 경우만 사람이름을 작성, 아니면 빈칸("")
+                f) 비고 : 법인카드 혹은 개인카드
+                - 신한카드법인(카드번호 451844로 시작)은 법인카드입니다. "법카"라고 써있을 수 있습니다.
+                - 개인카드는 사람이름과 함께 작성하세요 ex) 개인카드(손근영)
+
+                ## 사람이름 (e, f)
+                - 사람이름은 그대로, 영어 이니셜 2글자는 아래 표를 참고해 사람이름 3글자로 출력하세요.
+                    이인호 - IH, 이동혁 - DH, 양상관 - SK, 조준호 - JH, 안형범 - HB,
+                    손근영 - KY, 오형석 - HS, 석영진 - YJ, 이관희 - GH, 박주연 - JY
+                """
+
+def gemini_schema(model):
+    """pydantic 모델 → Gemini types.Schema (모든 필드 필수 문자열)"""
+    from google.genai import types
+
+    return types.Schema(
+        type="OBJECT",
+        properties={name: types.Schema(type="STRING", description=field.description)
+                    for name, field in model.model_fields.items()},
+        required=list(model.model_fields),
+    )
+
+
+def openai_response_format(model, name):
+    """pydantic 모델 → OpenAI response_format (json_schema strict: 모든 필드 필수, 추가 키 없음)"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {field_name: {"type": "string", "description": field.description}
+                               for field_name, field in model.model_fields.items()},
+                "required": list(model.model_fields),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_json(text, stage=""):
+    """응답 텍스트 → JSON 값 (필요하면 복구). 결과를 api_metrics 에 기록, 복구 못 하면 json.JSONDecodeError"""
+    value, repaired = _loads(text, stage)
+    api_metrics.batch.record_parse(stage, api_metrics.PARSE_REPAIRED if repaired else api_metrics.PARSE_OK)
+    return value
+
+
+def _loads(text, stage):
+    try:
+        return json_repair.loads(text)
+    except json.JSONDecodeError:
+        api_metrics.batch.record_parse(stage, api_metrics.PARSE_FAILED)
+        raise
+
+
+def validate(value, model):
+    """JSON 값 1개 → 필드 dict, 객체가 아니거나 맞지 않으면 None (묶음 응답 항목 검사용)"""
+    if not isinstance(value, dict):
+        return None
+    try:
+        return model.model_validate(value).model_dump()
+    except ValidationError:
+        return None
+
+
+def parse_fields(text, model, stage=""):
+    """응답 텍스트 → model 필드 dict (빠진 필드는 빈 문자열)
+    복구한 응답에서 필드가 빠졌으면 잘린 응답이므로 json.JSONDecodeError (빈 값으로 저장하지 않고 다시 호출)"""
+    value, repaired = _loads(text, stage)
+    fields = validate(value, model)
+    missing = [name for name in model.model_fields if isinstance(value, dict) and name not in value]
+    if fields is None or (repaired and missing):
+        api_metrics.batch.record_parse(stage, api_metrics.PARSE_INVALID)
+        reason = f"필드 누락 {', '.join(missing)}" if fields is not None else f"{type(value).__name__} 응답"
+        raise json.JSONDecodeError(f"응답이 {model.__name__} 형식이 아님 ({reason})", str(text), 0)
+    api_metrics.batch.record_parse(stage, api_metrics.PARSE_REPAIRED if repaired else api_metrics.PARSE_OK)
+    return fields
@@ -0,0 +1,286 @@
+# === 모듈: receipts_cli.py ===
+# 화면 없이 실행하는 일괄 처리 CLI (PyQt5 를 가져오지 않음 → 서버/작업 스케줄러에서 사용)
+#   python receipts_cli.py run   <폴더|glob> [...]  : 한 번 처리하고 엑셀/CSV 저장
+#   python receipts_cli.py watch <폴더>             : 폴더를 지켜보다가 새 영수증이 들어오면 이어서 처리
+# API 키: --api-key 또는 환경변수 RECEIPTS_API_KEY / GEMINI_API_KEY / OPENAI_API_KEY
+# 직원명 목록(GPT 교통비 프롬프트): --employees 또는 환경변수 RECEIPTS_EMPLOYEE_NAMES (쉼표로 구분)
+#         (sk- 로 시작하면 GPT-4o, AIza 로 시작하면 Gemini, 여러 개는 쉼표로 구분 → 키마다 한도를 두고 나눠 보냄)
+# 실행 중 Ctrl+C 1번: 대기 중인 영수증은 건너뛰고 끝난 결과까지 저장 (--resume 으로 이어서), 2번: 바로 종료
+import os
+import sys
+import glob
+import time
+import signal
+import inspect
+import argparse
+import importlib
+
+import async_engine
+import progress_events
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff')
+base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_PATH = os.path.join(base_path, "reciept_format", "영수증계산기.xlsx")
+EXCEL_NAME = "교통비_결과.xlsx"
+TEXT_FOLDER_NAME = "텍스트결과"
+
+WATCH_INTERVAL_SEC = 10   # 폴더 확인 주기
+SETTLE_SEC = 5            # 파일 크기가 이 시간 동안 변하지 않아야 복사가 끝난 것으로 판단
+PRINT_INTERVAL = 2.0      # 진행 상황 출력 간격(초)
+RETRY_MAX_SEC = 600       # 저널에 기록되지 않은 영수증 재시도 간격 상한 (감시 주기부터 2배씩 늘림)
+
+
+def load_ocr_module(api_key):
+    """API 키 유형에 맞는 OCR 모듈 (잘못된 키가 하나라도 있으면 None, 키 접두어 → 모듈은 ocr_backends.PIPELINES)
+    키가 여러 개면 첫 번째 키 기준"""
+    import key_pool
+    import ocr_backends
+
+    try:
+        pool = key_pool.KeyPool.from_text(api_key)
+    except ValueError:
+        return None
+    return importlib.import_module(ocr_backends.pipeline_for_key(pool.keys[0].api_key)[1])
+
+
+def takes_employee_names(ocr_module):
+    """직원명 목록을 프롬프트에 넣는 파이프라인인지 (GPT 교통비 process_receipts 의 employee_names)"""
+    return "employee_names" in inspect.signature(ocr_module.process_receipts).parameters
+
+
+def split_names(text):
+    """'홍길동, 김철수' → ['홍길동', '김철수'] (빈 값이면 None)"""
+    names = [name.strip() for name in (text or "").split(",") if name.strip()]
+    return names or None
+
+
+def find_images(sources):
+    """폴더 또는 glob 패턴 목록 → 이미지 파일 경로 (중복 제거, 정렬)"""
+    files = set()
+    for source in sources:
+        if os.path.isdir(source):
+            candidates = (os.path.join(source, name) for name in os.listdir(source))
+        else:
+            candidates = glob.glob(source, recursive=True)
+        files.update(os.path.abspath(p) for p in candidates
+                     if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(files)
+
+
+def unique_path(path):
+    """경로 중복 시 _01, _02 추가 (GUI와 같은 규칙)"""
+    base, ext = os.path.splitext(path)
+    counter = 1
+    new_path = path
+    while os.path.exists(new_path):
+        new_path = f"{base}_{counter:02d}{ext}"
+        counter += 1
+    return new_path
+
+
+def process(api_key, image_files, output_text_folder, output_excel, template_path=TEMPLATE_PATH,
+            mode=None, side_outputs=None, progress_callback=None, progress_tracker=None, control=None,
+            employee_names=None):
+    """OCR → 엑셀 저장. 처리한 영수증 건수 반환 (output_text_folder 의 저널로 이어서 처리)
+    employee_names: GPT 교통비 프롬프트의 직원명 목록 (Gemini 파이프라인에서는 무시)
+    progress_tracker: progress_events.ProgressTracker (OCR 단계 진행 이벤트 + 엑셀·완료 단계 표시)
+    control: async_engine.BatchControl (중지하면 그때까지 끝난 영수증만 엑셀에 저장)"""
+    ocr_module = load_ocr_module(api_key)
+    if ocr_module is None:
+        raise ValueError("API 키 형식을 알 수 없습니다 (sk-... 또는 AIza...).")
+
+    kwargs = {"progress_callback": progress_callback, "progress_tracker": progress_tracker, "control": control}
+    if mode and hasattr(ocr_module, "OCR_MODES"):
+        kwargs["mode"] = mode
+    if side_outputs is not None:
+        kwargs["side_outputs"] = side_outputs
+    if employee_names and takes_employee_names(ocr_module):
+        kwargs["employee_names"] = employee_names
+    records = ocr_module.process_receipts(api_key, image_files, output_text_folder, **kwargs)
+
+    import api_metrics
+    from excel_writer_250722 import generate_excel  # openpyxl 은 엑셀 저장 직전에
+    # 감시 모드에서는 같은 파일을 덮어쓰므로, 다른 프로그램이 읽는 중에도 깨진 파일이 보이지 않게 교체
+    tmp_excel = output_excel + ".tmp.xlsx"
+    if progress_tracker:
+        progress_tracker.set_phase(progress_events.EXCEL)
+    generate_excel(records, template_path, tmp_excel, progress_callback=progress_callback,
+                   metrics=api_metrics.batch.sheet_sections())
+    os.replace(tmp_excel, output_excel)
+    if progress_tracker:
+        progress_tracker.set_phase(progress_events.DONE)
+    return len(records)
+
+
+def _print_event(event):
+    print(f"[{progress_events.PHASE_NAMES[event.phase]}] {event.text()}" if event.phase == progress_events.OCR
+          else f"[{event.text()}]", flush=True)
+
+
+def _stop_on_interrupt(control):
+    """Ctrl+C 1번 → control.cancel() (끝난 결과는 저장), 2번 → KeyboardInterrupt. 이전 핸들러 반환"""
+    def handler(signum, frame):
+        if control.cancelled:
+            raise KeyboardInterrupt
+        print("\n중지 요청 — 처리 중인 영수증을 마무리하고 저장합니다 (바로 종료: Ctrl+C 한 번 더)", flush=True)
+        control.cancel()
+
+    return signal.signal(signal.SIGINT, handler)
+
+
+def run_once(args, api_key):
+    files = find_images(args.sources)
+    if not files:
+        print("처리할 이미지가 없습니다.")
+        return 1
+    out_dir = os.path.abspath(args.out or os.getcwd())
+    output_text_folder = os.path.abspath(args.resume) if args.resume else unique_path(os.path.join(out_dir, TEXT_FOLDER_NAME))
+    output_excel = unique_path(os.path.join(out_dir, EXCEL_NAME))
+    print(f"{len(files)}장 처리 시작 → {output_excel}")
+    started = time.perf_counter()
+    tracker = None if args.quiet else progress_events.ProgressTracker(_print_event, interval=PRINT_INTERVAL)
+    control = async_engine.BatchControl()
+    previous = _stop_on_interrupt(control)
+    try:
+        total = process(api_key, files, output_text_folder, output_excel, args.template, args.mode,
+                        args.side_outputs, progress_tracker=tracker, control=control,
+                        employee_names=args.employees)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+    print(f"완료: 영수증 {total}건, {time.perf_counter() - started:.1f}초 → {output_excel}")
+    if control.cancelled:
+        print(f"중지됨 — 남은 영수증 이어서 처리: --resume \"{output_text_folder}\"")
+        return 130
+    return 0
+
+
+def _stable_files(folder, sizes, settle):
+    """크기가 settle 초 이상 변하지 않은 이미지만 (복사 중인 파일 제외)
+    sizes: {경로: (크기, 처음 이 크기로 본 시각)} — 호출 사이에 유지"""
+    now = time.monotonic()
+    stable = []
+    current = find_images([folder])
+    for path in current:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        last = sizes.get(path)
+        if last is None or last[0] != size:
+            sizes[path] = (size, now)
+        elif now - last[1] >= settle:
+            stable.append(path)
+    for path in set(sizes) - set(current):
+        del sizes[path]
+    return stable
+
+
+def _retry_delay(interval, attempts):
+    return min(interval * 2 ** attempts, RETRY_MAX_SEC)
+
+
+def watch(args, api_key):
+    """폴더를 주기적으로 확인해서 새 영수증이 생기면 처리
+    - 결과 폴더/저널은 하나를 계속 사용 → 이미 처리한 이미지는 API 호출 없이 건너뜀
+    - 처리할 때마다 엑셀(교통비_결과.xlsx)을 전체 내용으로 다시 저장
+    - 저널에 결과가 기록된 이미지만 처리 완료로 보고, 나머지(API 오류·사전 분류 제외 등)는
+      감시 주기부터 2배씩 늘린 간격(최대 RETRY_MAX_SEC)으로 다시 시도"""
+    import results_journal
+
+    folder = os.path.abspath(args.sources[0])
+    out_dir = os.path.abspath(args.out or folder)
+    output_text_folder = os.path.join(out_dir, TEXT_FOLDER_NAME)
+    output_excel = os.path.join(out_dir, EXCEL_NAME)
+    journal_path = os.path.join(output_text_folder, results_journal.JOURNAL_NAME)
+    sizes, processed = {}, set()
+    retries = {}  # 경로: (실패 횟수, 다음 시도 시각)
+    print(f"폴더 감시 시작: {folder} ({args.interval}초마다 확인, 종료: Ctrl+C)")
+    try:
+        while True:
+            stable = _stable_files(folder, sizes, args.settle)
+            now = time.monotonic()
+            new = [p for p in stable if p not in processed and retries.get(p, (0, now))[1] <= now]
+            if new:
+                print(f"새 영수증 {len(new)}장 발견 → 처리 시작")
+                try:
+                    total = process(api_key, stable, output_text_folder, output_excel, args.template,
+                                    args.mode, args.side_outputs, None, employee_names=args.employees)
+                    print(f"엑셀 갱신: 영수증 {total}건 → {output_excel}")
+                except Exception as e:  # 아래에서 저널에 없는 영수증만 다시 시도
+                    print(f"❌ 처리 중 오류 발생: {e}")
+                done = results_journal.load_done(journal_path)
+                hashes = results_journal.hash_files([p for p in stable if p not in processed])
+                failed = []
+                for path, image_hash in hashes.items():
+                    if image_hash in done:
+                        processed.add(path)
+                        retries.pop(path, None)
+                    elif path in new:
+                        attempts = retries.get(path, (0, 0))[0] + 1
+                        retries[path] = (attempts, time.monotonic() + _retry_delay(args.interval, attempts))
+                        failed.append(path)
+                if failed:
+                    delay = min(_retry_delay(args.interval, retries[p][0]) for p in failed)
+                    print(f"저널에 기록되지 않은 영수증 {len(failed)}장 → {delay:.0f}초 뒤 다시 시도")
+            for path in set(retries) - set(sizes):  # 폴더에서 사라진 파일
+                del retries[path]
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("폴더 감시 종료")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="receipts_cli", description="영수증 OCR → 엑셀 일괄 처리 (화면 없이 실행)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("--api-key", help="OpenAI(sk-...) 또는 Gemini(AIza...) API 키 (여러 개는 쉼표로 구분)")
+        p.add_argument("--out", help="결과 저장 폴더 (run 기본: 현재 폴더, watch 기본: 감시 폴더)")
+        p.add_argument("--template", default=TEMPLATE_PATH, help="엑셀 서식 파일")
+        p.add_argument("--mode", choices=("two_pass", "single", "packed"), help="Gemini 호출 모드")
+        p.add_argument("--side-outputs", type=lambda v: tuple(x for x in v.split(",") if x and x != "none"),
+                       help="부가 출력 형식: txt,csv / none (기본: OCR 모듈별)")
+        p.add_argument("--employees", type=split_names, default=split_names(os.getenv("RECEIPTS_EMPLOYEE_NAMES")),
+                       help="GPT 교통비 프롬프트의 직원명 목록, 쉼표로 구분 (기본: RECEIPTS_EMPLOYEE_NAMES)")
+
+    run_p = sub.add_parser("run", help="폴더 또는 glob 패턴의 이미지를 한 번 처리")
+    run_p.add_argument("sources", nargs="+", help="이미지 폴더 또는 glob (예: 'scans/2025-07/*.jpg')")
+    run_p.add_argument("--resume", help="이어서 처리할 기존 텍스트결과 폴더")
+    run_p.add_argument("--quiet", action="store_true", help="진행률 출력 안 함")
+    common(run_p)
+
+    watch_p = sub.add_parser("watch", help="폴더를 감시하며 새 영수증을 이어서 처리")
+    watch_p.add_argument("sources", nargs=1, metavar="folder", help="감시할 폴더")
+    watch_p.add_argument("--interval", type=float, default=WATCH_INTERVAL_SEC, help="확인 주기(초)")
+    watch_p.add_argument("--settle", type=float, default=SETTLE_SEC, help="파일 복사 완료 판단 시간(초)")
+    common(watch_p)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    api_key = (args.api_key or os.getenv("RECEIPTS_API_KEY") or os.getenv("GEMINI_API_KEY")
+               or os.getenv("OPENAI_API_KEY") or "").strip()
+    if not api_key:
+        print("API 키가 필요합니다 (--api-key 또는 RECEIPTS_API_KEY 환경변수).")
+        return 2
+    import key_pool
+
+    try:
+        key_pool.KeyPool.from_text(api_key)
+    except ValueError as e:
+        print(e)
+        return 2
+    if args.command == "watch":
+        if not os.path.isdir(args.sources[0]):
+            print(f"폴더가 없습니다: {args.sources[0]}")
+            return 2
+        return watch(args, api_key)
+    return run_once(args, api_key)
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # image_prep 프로세스 풀 (PyInstaller 빌드 대비)
+    sys.exit(main())
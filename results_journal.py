@@ -0,0 +1,140 @@
+# === 모듈: results_journal.py ===
+# 영수증 처리 결과 저널 (JSONL)
+# - 영수증 1장이 끝날 때마다 한 줄씩 추가, 몇 건마다 fsync → 중간에 꺼져도 이미 낸 API 비용은 보존
+#   (추가가 뜸해져도 마지막 기록 후 fsync_interval 초 안에 타이머가 fsync, 중지·완료·닫기 때도 바로 fsync)
+# - 같은 출력 폴더로 다시 실행하면 저널에 있는 이미지(내용 해시 기준)는 건너뜀
+# - 최종 CSV/엑셀은 저널을 한 줄씩 읽어서 생성
+import os
+import glob
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+def file_hash(path):
+    """파일 내용 SHA-256 (ocr_cache.hash_bytes 와 같은 값)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_files(paths, max_workers=4):
+    """{경로: 내용 해시} (hashlib은 GIL을 풀기 때문에 스레드로 병렬 계산)"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(paths, executor.map(file_hash, paths)))
+
+
+class ResultJournal:
+    """추가 전용 결과 저널. fsync_every건마다, 확정 안 된 기록은 늦어도 fsync_interval초 안에 디스크에 확정"""
+
+    def __init__(self, path, fsync_every=20, fsync_interval=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer = None  # 확정 안 된 기록이 있을 때 fsync_interval 초 뒤 fsync
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, image_hash, filename, result):
+        line = json.dumps({"hash": image_hash, "file": filename, "result": result}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.fsync_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self):
+        """확정 안 된 기록을 바로 디스크에 (타이머·중지 시, 다른 스레드에서 호출해도 안전)"""
+        with self._lock:
+            if not self._file.closed and self._pending:
+                self._file.flush()
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def mark_complete(self):
+        """배치 전체 완료 표시 (find_incomplete 에서 제외됨)"""
+        with self._lock:
+            self._file.write(json.dumps({"event": "complete"}) + "\n")
+            self._file.flush()
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._sync()
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_journal(path):
+    """저널 레코드를 한 줄씩 (비정상 종료로 잘린 마지막 줄은 무시)"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_results(path, hashes=None):
+    """결과 레코드만 한 줄씩. hashes 가 주어지면 해당 이미지만, 같은 이미지는 처음 1건만"""
+    seen = set()
+    for record in iter_journal(path):
+        image_hash = record.get("hash")
+        if image_hash is None or image_hash in seen:
+            continue
+        if hashes is not None and image_hash not in hashes:
+            continue
+        seen.add(image_hash)
+        yield record
+
+
+def load_done(path):
+    """이미 처리된 이미지 해시 집합 (resume 시 건너뛸 대상)"""
+    return {record["hash"] for record in iter_journal(path) if "hash" in record}
+
+
+def is_complete(path):
+    last = None
+    for record in iter_journal(path):
+        last = record
+    return bool(last) and last.get("event") == "complete"
+
+
+def find_incomplete(save_folder, pattern="텍스트결과*"):
+    """save_folder 아래에서 완료되지 않은 저널이 있는 가장 최근 결과 폴더 (없으면 None)"""
+    candidates = []
+    for folder in glob.glob(os.path.join(save_folder, pattern)):
+        path = os.path.join(folder, JOURNAL_NAME)
+        if os.path.isfile(path) and not is_complete(path):
+            candidates.append((os.path.getmtime(path), folder))
+    return max(candidates)[1] if candidates else None
@@ -0,0 +1,95 @@
+# === 테스트: image_classifier 로컬 사전 분류 ===
+# 합성 이미지로 조명이 다른 영수증(흰 조명·어두운 조명·노란 조명)이 제외되지 않는지,
+# 영수증이 아닌 사진만 IRRELEVANT 로 빠지는지 확인
+# 실행: python -m pytest test_image_classifier.py
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+import image_classifier
+import receipt_pairing
+
+DESK = (70, 60, 50)
+
+
+def _receipt(path, paper, ink, lines=30, line_width=(8, 30), step=22):
+    """책상 위 영수증: paper 색 종이에 ink 색 글자 줄 (인쇄 앞면은 가는 줄이 촘촘히)"""
+    r = random.Random(1)
+    img = Image.new("RGB", (600, 900), DESK)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([120, 40, 480, 860], fill=paper)
+    y = 70
+    for _ in range(lines):
+        x = 140
+        for _ in range(r.randint(*line_width)):
+            if x > 450:
+                break
+            if r.random() < 0.8:
+                draw.rectangle([x, y, x + 6, y + 9], fill=ink)
+            x += 10
+        y += step
+    img.save(path, quality=90)
+    return path
+
+
+def _handwritten(path, paper, ink):
+    """손글씨 뒷면: 굵은 글씨 3줄"""
+    img = Image.new("RGB", (600, 900), DESK)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([60, 40, 540, 860], fill=paper)
+    for y in (200, 400, 600):
+        draw.rectangle([120, y, 460, y + 40], fill=ink)
+    img.save(path, quality=90)
+    return path
+
+
+LIGHTING = {
+    "white": ((245, 245, 242), (30, 30, 30)),
+    "dim": ((140, 140, 138), (35, 35, 35)),
+    "warm": ((245, 205, 150), (70, 50, 30)),
+}
+
+
+@pytest.mark.parametrize("lighting", LIGHTING)
+def test_printed_receipt_is_front_in_any_lighting(tmp_path, lighting):
+    paper, ink = LIGHTING[lighting]
+    path = _receipt(tmp_path / f"{lighting}.jpg", paper, ink)
+    assert image_classifier.classify(str(path)) == receipt_pairing.FRONT
+
+
+@pytest.mark.parametrize("lighting", LIGHTING)
+def test_handwritten_back_is_never_irrelevant(tmp_path, lighting):
+    paper, ink = LIGHTING[lighting]
+    path = _handwritten(tmp_path / f"{lighting}.jpg", paper, ink)
+    assert image_classifier.classify(str(path)) in (receipt_pairing.BACK, None)
+
+
+def test_very_dark_receipt_goes_to_api(tmp_path):
+    # 종이를 찾지 못해도 제외하지 않고 API 분류 프롬프트로
+    path = _receipt(tmp_path / "dark.jpg", (60, 58, 55), (20, 20, 20))
+    assert image_classifier.classify(str(path)) != image_classifier.IRRELEVANT
+
+
+def test_blank_or_flat_images_go_to_api(tmp_path):
+    for name, color in (("blank.jpg", (250, 250, 250)), ("red.jpg", (200, 30, 30))):
+        Image.new("RGB", (400, 600), color).save(tmp_path / name)
+        assert image_classifier.classify(str(tmp_path / name)) is None
+
+
+def test_colourful_textured_photo_is_irrelevant(tmp_path):
+    r = random.Random(2)
+    img = Image.new("RGB", (600, 400))
+    draw = ImageDraw.Draw(img)
+    for _ in range(400):
+        x, y = r.randint(0, 600), r.randint(0, 400)
+        color = r.choice([(220, 40, 40), (40, 160, 60), (30, 80, 200), (240, 180, 20)])
+        draw.ellipse([x, y, x + r.randint(10, 60), y + r.randint(10, 60)], fill=color)
+    img.save(tmp_path / "photo.jpg", quality=90)
+    assert image_classifier.classify(str(tmp_path / "photo.jpg")) == image_classifier.IRRELEVANT
+
+
+def test_unreadable_file_goes_to_api(tmp_path):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+    assert image_classifier.classify(str(path)) is None
@@ -0,0 +1,75 @@
+# === 테스트: receipt_normalize 거래일시·금액 정규화 ===
+# 프롬프트의 예시 맵핑과 실제 영수증에서 본 형식을 표로 두고 기대값으로 정규화되는지 확인
+# (표는 bench_normalize.py 속도 측정에도 사용)
+# 실행: python -m pytest test_receipt_normalize.py
+import pytest
+
+import receipt_normalize
+
+# (원문, 기대값) — 앞 7개는 기존 FRONT_PROMPT 의 예시 맵핑
+DATETIME_CASES = [
+    ("승인일시 2025-07-22 18:34:23", "2025-07-22 18:34"),
+    ("거래일시:25-07-22(화) 15:06:04", "2025-07-22 15:06"),
+    ("2025/07/17 15:26:23", "2025-07-17 15:26"),
+    ("[일시] 2025/07/14 11:43", "2025-07-14 11:43"),
+    ("발행일시: 2025-07-16 12:45:47", "2025-07-16 12:45"),
+    ("[등록] 2025-07-24 13:56", "2025-07-24 13:56"),
+    ("2025-07-23 22:21:51", "2025-07-23 22:21"),
+    ("2025-07-22 15:06", "2025-07-22 15:06"),              # 이미 정규화된 값 (캐시·이전 결과)
+    ("2025.07.21 12:34", "2025-07-21 12:34"),
+    ("25.07.21 (월) 09:05", "2025-07-21 09:05"),
+    ("2025. 7. 3. 8:15", "2025-07-03 08:15"),
+    ("2025년 07월 22일 15시 06분", "2025-07-22 15:06"),
+    ("2025년 7월 22일 화요일 오후 3:06", "2025-07-22 15:06"),
+    ("2025-07-22 오전 12:10", "2025-07-22 00:10"),
+    ("07/22/2025", ""),                                   # 미국식 날짜는 지원 안 함 (영수증에 없음)
+    ("2025-07-22 03:06 PM", "2025-07-22 15:06"),
+    ("20250722 15:06:04", "2025-07-22 15:06"),
+    ("20250722 150604", "2025-07-22 15:06"),              # 붙여 쓴 날짜·시간 (POS 전표)
+    ("20250722150604", "2025-07-22 15:06"),
+    ("거래일시 20250722 1506", "2025-07-22 15:06"),
+    ("14:32 2025/07/01", "2025-07-01 14:32"),             # 시간이 날짜 앞
+    ("15:06:04 25-07-22(화)", "2025-07-22 15:06"),
+    ("오후 3:06 2025.07.22", "2025-07-22 15:06"),
+    ("거래일자 2025-07-22", ""),                           # 시간 없음 → 빈 문자열
+    ("유효기간 25/12  거래일시 2025-07-22 15:06", "2025-07-22 15:06"),
+    ("카드번호 4518-44**-****-1234 2025-07-22 15:06", "2025-07-22 15:06"),
+    ("", ""),
+]
+
+AMOUNT_CASES = [
+    ("12,700원", 12700),
+    ("12700", 12700),
+    (7500, 7500),
+    ("₩ 12,700", 12700),
+    ("합계 12,700", 12700),
+    ("결제금액: 1,234,500 원", 1234500),
+    ("9,000.00", 9000),
+    ("-4,500", -4500),                                    # 취소 전표
+    ("KRW12,700", 12700),
+    ("공급가액 11,545 부가세 1,155 합계 12,700", 12700),  # 합계 뒤 숫자
+    ("합계 13,000 할인 -300 결제금액 12,700", 12700),     # 합계 말이 여럿이면 마지막
+    ("공급가액 11545 부가세 1155 합계 12700", 12700),
+    ("카드 4518-44 금액 7,500", 7500),                    # 카드번호 제외
+    ("4518-44**-****-1234 12,700원", 12700),
+    ("12,700원 (부가세 1,155 포함)", 12700),              # 세액은 합계가 아님
+    ("11,545 1,155 12,700", 12700),                       # 말이 없으면 마지막 쉼표 숫자
+    ("", ""),
+    ("없음", ""),
+]
+
+
+@pytest.mark.parametrize("raw, expected", DATETIME_CASES)
+def test_normalize_datetime(raw, expected):
+    assert receipt_normalize.normalize_datetime(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", AMOUNT_CASES)
+def test_normalize_amount(raw, expected):
+    assert receipt_normalize.normalize_amount(raw) == expected
+
+
+def test_unparsed_datetime_is_reported_once(capsys):
+    receipt_normalize.normalize_datetime("시간 미상 07/23/2025", warn=True)
+    receipt_normalize.normalize_datetime("시간 미상 07/23/2025", warn=True)
+    assert capsys.readouterr().out.count("07/23/2025") == 1
@@ -0,0 +1,158 @@
+# === 모듈: transaction_index.py ===
+# OCR 이후 같은 거래가 두 번 들어왔는지 확인하는 색인 (사진은 다르지만 같은 결제)
+# - 예: 카드전표 + 인쇄 영수증, 같은 영수증의 앞/뒷면을 각각 촬영
+# - 키: (거래일시 분 단위, 금액) → 메모리 dict 에서 O(1) 조회, 같은 칸 안에서만 업체명 유사도 비교
+# - 결제 단말기/전표 시각이 1분 정도 어긋날 수 있어 앞뒤 TIME_WINDOW_MIN 분까지 확인
+# - SQLite 에 저장해서 실행 사이에도 유지 (지난달에 낸 영수증을 다시 내는 경우도 찾음)
+import os
+import re
+import sys
+import time
+import sqlite3
+import threading
+from difflib import SequenceMatcher
+from typing import NamedTuple
+from datetime import datetime
+
+DEFAULT_INDEX_PATH = os.getenv(
+    "RECEIPTS_TXN_INDEX",
+    os.path.join(os.path.expanduser("~"), ".receipts-auto", "transactions.sqlite3"),
+)
+TIME_WINDOW_MIN = 1
+MERCHANT_SIMILARITY = 0.6   # 업체명 유사도 기준 (0~1, 한쪽이 다른 쪽을 포함하면 1)
+
+_MERCHANT_NOISE = re.compile(r"\(주\)|㈜|주식회사|\(유\)|유한회사|[\s\W_]+")
+
+
+def merchant_key(name):
+    """업체명 정규화: 법인 표기·공백·기호 제거, 소문자 ('(주)탐앤탐스 여의도점' → '탐앤탐스여의도점')"""
+    return _MERCHANT_NOISE.sub("", str(name or "")).lower()
+
+
+def merchant_similarity(a, b):
+    """정규화된 업체명 유사도. 한쪽이 비어 있으면(OCR 누락) 일시·금액만으로 판단해 1"""
+    if not a or not b or a in b or b in a:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _minute(when):
+    """datetime → 분 단위 정수 (시간대 변환 없이 비교용)"""
+    return when.toordinal() * 1440 + when.hour * 60 + when.minute
+
+
+class Match(NamedTuple):
+    """먼저 등록된 같은 거래로 의심되는 영수증"""
+    file: str           # 기존 영수증 파일명
+    merchant: str       # 기존 업체명 (OCR 원문)
+    added: datetime     # 기존 영수증 등록 시각
+    similarity: float   # 업체명 유사도
+
+
+class TransactionIndex:
+    """스레드 안전한 거래 색인. 시작 시 전체를 메모리 dict 로 읽고, 새 거래는 SQLite 에 추가"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._buckets = {}   # {(분, 금액): [(id, 파일명, 업체명, 정규화 업체명, 등록시각)]}
+        self._ids = {}       # {이미지 해시: id}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id          INTEGER PRIMARY KEY,
+                    image_hash  TEXT NOT NULL UNIQUE,
+                    file        TEXT NOT NULL,
+                    minute      INTEGER NOT NULL,
+                    amount      INTEGER NOT NULL,
+                    merchant    TEXT NOT NULL,
+                    added       REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+            for row in self._conn.execute("SELECT id, image_hash, file, minute, amount, merchant, added FROM transactions"):
+                self._remember(*row)
+
+    def _remember(self, row_id, image_hash, file, minute, amount, merchant, added):
+        self._ids[image_hash] = row_id
+        self._buckets.setdefault((minute, amount), []).append(
+            (row_id, file, merchant, merchant_key(merchant), added)
+        )
+
+    def check(self, image_hash, file, when, amount, merchant):
+        """거래 등록 + 먼저 등록된 같은 거래 검색 → Match 또는 None
+        같은 이미지(해시)는 한 번만 등록되고, 자신보다 먼저 등록된 거래와만 비교하므로
+        이어서 처리·재실행 때 다시 호출해도 결과가 같음"""
+        if when is None or amount is None:
+            return None
+        minute, key = _minute(when), merchant_key(merchant)
+        with self._lock:
+            own_id = self._ids.get(image_hash)
+            if own_id is None:
+                added = time.time()
+                cursor = self._conn.execute(
+                    "INSERT INTO transactions (image_hash, file, minute, amount, merchant, added) VALUES (?, ?, ?, ?, ?, ?)",
+                    (image_hash, file, minute, amount, merchant or "", added),
+                )
+                self._conn.commit()
+                own_id = cursor.lastrowid
+                self._remember(own_id, image_hash, file, minute, amount, merchant or "", added)
+
+            best = None
+            for m in range(minute - TIME_WINDOW_MIN, minute + TIME_WINDOW_MIN + 1):
+                for row_id, other_file, other_merchant, other_key, added in self._buckets.get((m, amount), ()):
+                    if row_id >= own_id:
+                        continue
+                    similarity = merchant_similarity(key, other_key)
+                    if similarity >= MERCHANT_SIMILARITY and (best is None or similarity > best.similarity):
+                        best = Match(other_file, other_merchant, datetime.fromtimestamp(added), similarity)
+        return best
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM transactions")
+            self._conn.commit()
+            self._buckets.clear()
+            self._ids.clear()
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def get_index():
+    """프로세스 공용 색인
+    RECEIPTS_TXN_INDEX=off 이거나 파일을 열 수 없으면 메모리 색인 (이번 실행 안에서만 비교)"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            if DEFAULT_INDEX_PATH.lower() in ("off", "0", "none"):
+                _shared_index = TransactionIndex(":memory:")
+            else:
+                try:
+                    _shared_index = TransactionIndex()
+                except (sqlite3.Error, OSError) as e:
+                    print(f"거래 색인 파일을 열 수 없습니다 (메모리 색인 사용): {e}")
+                    _shared_index = TransactionIndex(":memory:")
+        return _shared_index
+
+
+if __name__ == "__main__":
+    # python transaction_index.py [--clear]
+    index = get_index()
+    if "--clear" in sys.argv:
+        index.clear()
+        print(f"거래 색인을 비웠습니다: {index.path}")
+    else:
+        print({"entries": len(index), "path": index.path})